@@ -13,6 +13,8 @@ def action_to_pyautogui(action: AgentAction) -> str:
         return action.raw_code
 
     t = action.action_type.value
+    if t == "batch":
+        return "\n".join(action_to_pyautogui(a) for a in action.actions or [])
     if t == "click":
         sub = action.key  # "double_click" / "right_click" / None
         if sub == "double_click":
@@ -44,16 +46,33 @@ class ActionRetryManager:
         self.max_retries = max_retries
         self.change_threshold = change_threshold
 
-    def check_action_effect(self, before: bytes, after: bytes, action: AgentAction) -> dict:
+    def check_action_effect(self, before: bytes, after: bytes, action: AgentAction,
+                            element_diff=None) -> dict:
+        """截图像素变化 + 元素跟踪变化
+
+        element_diff: som_converter.ElementDiff，或返回它的无参可调用对象
+        （只在像素变化不足时才求值，预取解析未完成时不必等待）
+        """
         ratio = self._compute_change_ratio(before, after)
         changed = ratio > self.change_threshold
+        # 像素变化很小但有元素出现/消失/移动（如弹出小菜单、按钮文字变化）也算生效
+        element_changes = 0
+        if callable(element_diff):
+            element_diff = None if changed else element_diff()
+        if element_diff is not None and not element_diff.first_frame:
+            element_changes = (len(element_diff.appeared) + len(element_diff.disappeared)
+                               + len(element_diff.moved) + len(element_diff.changed))
+            if not changed and element_changes:
+                logger.info(f"Pixel change {ratio:.4f} below threshold, but {element_changes} element changes")
+                changed = True
         suggestion = "none"
         if not changed:
             if action.action_type.value == "click":
                 suggestion = "retry"
             elif action.action_type.value == "scroll":
                 suggestion = "scroll_down"
-        return {"changed": changed, "change_ratio": ratio, "suggestion": suggestion}
+        return {"changed": changed, "change_ratio": ratio, "element_changes": element_changes,
+                "suggestion": suggestion}
 
     def _compute_change_ratio(self, img1_bytes: bytes, img2_bytes: bytes) -> float:
         img1 = np.array(Image.open(io.BytesIO(img1_bytes)).convert("L"))
@@ -2,13 +2,13 @@
 OpenCUA Agent（基于官方改造）
 """
 import re
-import time
 import httpx
 import traceback
 from typing import Dict, List, Tuple
 from loguru import logger
 
 from utils import encode_image, project_coordinate_to_absolute_scale
+from cancellation import NEVER, TaskCancelled
 from prompts import (
     build_sys_prompt,
     INSTRUTION_TEMPLATE,
@@ -181,7 +181,7 @@ class OpenCUAAgent:
         Args:
             instruction: 任务指令
             obs: 观察（包含 screenshot 字段）
-            **kwargs: app_hints, step_idx, recovery_hint
+            **kwargs: app_hints, step_idx, recovery_hint, cancel（CancelToken，取消时抛 TaskCancelled 且不写入历史）
 
         Returns:
             (response, pyautogui_actions, other_cot)
@@ -189,6 +189,7 @@ class OpenCUAAgent:
         step_idx = kwargs.get('step_idx', len(self.actions) + 1)
         app_hints = kwargs.get('app_hints', '')
         recovery_hint = kwargs.get('recovery_hint', '')
+        cancel = kwargs.get('cancel') or NEVER
         logger.info(f"========= Step {step_idx} =======")
         logger.info(f"Instruction: {instruction[:200]}{'...(truncated)' if len(instruction) > 200 else ''}")
 
@@ -284,7 +285,7 @@ class OpenCUAAgent:
                     "max_tokens": self.max_tokens,
                     "top_p": self.top_p,
                     "temperature": self.temperature if retry_count == 0 else max(0.2, self.temperature)
-                })
+                }, cancel=cancel)
 
                 logger.info(f"Model Output:\n{response[:500]}{'...(truncated)' if len(response) > 500 else ''}")
                 if not response:
@@ -302,6 +303,8 @@ class OpenCUAAgent:
 
                 break
 
+            except TaskCancelled:
+                raise
             except Exception as e:
                 logger.error(f"Error during prediction: {e}")
                 retry_count += 1
@@ -327,25 +330,36 @@ class OpenCUAAgent:
 
         return response, pyautogui_actions, other_cot
 
-    def call_llm(self, payload: dict) -> str:
-        """调用 LLM API，支持 anthropic 和 vllm 两种 provider"""
+    def call_llm(self, payload: dict, cancel=NEVER) -> str:
+        """调用 LLM API，支持 anthropic 和 vllm 两种 provider；退避等待可被 cancel 打断。
+        cancel 带截止时间时，请求超时不超过剩余预算，剩余预算不够退避时不再重试"""
         provider = config.LLM_PROVIDER
         max_retries = 5
 
         for attempt in range(max_retries):
+            cancel.raise_if_cancelled()
             try:
                 if provider == "anthropic":
-                    return self._call_anthropic(payload)
+                    result = self._call_anthropic(payload, timeout=cancel.timeout(120, floor=5))
                 else:
-                    return self._call_vllm(payload)
+                    result = self._call_vllm(payload, timeout=cancel.timeout(60, floor=5))
+                # 请求期间任务被停止：丢弃响应
+                cancel.raise_if_cancelled()
+                return result
+            except TaskCancelled:
+                raise
             except Exception as e:
                 logger.error(f"LLM call failed (attempt {attempt+1}/{max_retries}): {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(min(2 ** attempt, 30))
+                    backoff = min(2 ** attempt, 30)
+                    remaining = cancel.remaining()
+                    if remaining is not None and remaining < backoff:
+                        raise RuntimeError(f"LLM call failed, step budget exhausted after {attempt+1} attempts: {e}")
+                    cancel.sleep(backoff)
 
         raise RuntimeError(f"Failed to call LLM API after {max_retries} retries")
 
-    def _call_anthropic(self, payload: dict) -> str:
+    def _call_anthropic(self, payload: dict, timeout: float = 120) -> str:
         """调用 Anthropic Messages API"""
         url = f"{config.LLM_BASE_URL}/v1/messages"
         messages = payload["messages"]
@@ -407,7 +421,7 @@ class OpenCUAAgent:
             "content-type": "application/json",
         }
 
-        response = httpx.post(url, json=body, headers=headers, timeout=120)
+        response = httpx.post(url, json=body, headers=headers, timeout=timeout)
         if response.status_code != 200:
             raise RuntimeError(f"Anthropic API error {response.status_code}: {response.text[:300]}")
 
@@ -420,10 +434,10 @@ class OpenCUAAgent:
             raise ValueError(f"Empty response from Anthropic: {data}")
         return result
 
-    def _call_vllm(self, payload: dict) -> str:
+    def _call_vllm(self, payload: dict, timeout: float = 60) -> str:
         """调用 vLLM API（OpenAI 兼容）"""
         url = f"{config.VLLM_BASE_URL}/v1/chat/completions"
-        response = httpx.post(url, json=payload, timeout=60)
+        response = httpx.post(url, json=payload, timeout=timeout)
 
         if response.status_code != 200:
             raise RuntimeError(f"vLLM API error: {response.text[:200]}")
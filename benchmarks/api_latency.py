@@ -0,0 +1,118 @@
+"""任务运行期间的 API 延迟 — 持续轮询 GET /task/{id}，验证执行线程不拖慢 API
+
+起完整 FastAPI 服务（回放帧 + 模拟 LLM + RecordingBackend，可选 OmniParser 替身），
+通过 HTTP 创建任务，任务运行期间不停请求 GET /task/{id}，统计延迟分位数；
+p95 超过 --budget-ms 时以非零状态退出（模拟 LLM、替身服务和压测客户端同进程，p99 受 GIL 抖动影响）。
+--delta 时轮询带 since_step、fields 和 If-None-Match，只取新增步骤，未变化返回 304。
+--events 时改为订阅 GET /task/{id}/events（SSE），统计事件送达延迟和传输字节数，与轮询对比（不做预算检查）。
+
+用法: python -m benchmarks.api_latency [--tasks 2] [--steps 5] [--llm-latency-ms 300]
+      [--omniparser] [--budget-ms 5] [--delta | --events]
+"""
+import argparse
+import json
+import sys
+import time
+
+import httpx
+
+import config
+from benchmarks.servers import format_stats, free_port, percentiles, serve_in_thread
+from benchmarks.task_loop import setup_headless
+
+
+def _poll_task(client: httpx.Client, task_id: str, delta: bool = False) -> tuple:
+    samples, status, nbytes = [], "pending", 0
+    since_step, etag = 0, None
+    while status in ("queued", "pending", "running", "awaiting_confirm"):
+        params, headers = {}, {}
+        if delta:
+            params = {"since_step": since_step, "fields": "step,action,thought"}
+            headers = {"If-None-Match": etag} if etag else {}
+        start = time.perf_counter()
+        resp = client.get(f"/task/{task_id}", params=params, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        nbytes += len(resp.content)
+        if resp.status_code == 304:
+            continue
+        resp.raise_for_status()
+        data = resp.json()
+        status, etag = data["status"], resp.headers.get("etag")
+        if data["history"]:
+            since_step = data["history"][-1]["step"]
+    return samples, status, nbytes
+
+
+def _stream_task(client: httpx.Client, task_id: str) -> tuple:
+    """订阅 SSE 直到任务结束；样本为事件发布到客户端收到的延迟（同进程，时钟一致）"""
+    samples, status, nbytes = [], "pending", 0
+    with client.stream("GET", f"/task/{task_id}/events") as resp:
+        resp.raise_for_status()
+        for line in resp.iter_lines():
+            nbytes += len(line) + 1
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            samples.append((time.time() - event["ts"]) * 1000)
+            if event["type"] == "status":
+                status = event["status"]
+    return samples, status, nbytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="任务运行期间 GET /task/{id} 延迟")
+    parser.add_argument("--tasks", type=int, default=2)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--omniparser", action="store_true")
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="p95 上限（毫秒）")
+    parser.add_argument("--delta", action="store_true", help="增量轮询（since_step + ETag）")
+    parser.add_argument("--events", action="store_true", help="订阅 SSE 事件流代替轮询")
+    args = parser.parse_args()
+
+    _, servers = setup_headless(args.steps, args.llm_latency_ms, omniparser=args.omniparser)
+
+    import main as main_mod
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level="ERROR")
+
+    port = free_port()
+    servers.append(serve_in_thread(main_mod.app, port))
+    headers = {"Authorization": f"Bearer {config.API_KEY}"}
+    with httpx.Client(base_url=f"http://127.0.0.1:{port}", headers=headers, timeout=10) as client:
+        idle = []
+        for _ in range(200):
+            start = time.perf_counter()
+            client.get("/")
+            idle.append((time.perf_counter() - start) * 1000)
+
+        busy = []
+        if args.events:
+            watch = _stream_task
+        else:
+            watch = lambda c, tid: _poll_task(c, tid, delta=args.delta)
+        for i in range(args.tasks):
+            resp = client.post("/task", json={"prompt": f"延迟测试 {i}", "max_steps": args.steps + 2})
+            resp.raise_for_status()
+            task_id = resp.json()["task_id"]
+            samples, status, nbytes = watch(client, task_id)
+            busy.extend(samples)
+            kind = "events" if args.events else "polls"
+            print(f"task {task_id[:8]} {status:<10} {kind}={len(samples)} bytes={nbytes}")
+
+    idle_stats, busy_stats = percentiles(idle), percentiles(busy)
+    print(format_stats("GET / (idle)", idle_stats))
+    print(format_stats("event delivery lag" if args.events else "GET /task/{id} (task running)", busy_stats))
+    for server in servers:
+        server.should_exit = True
+    if args.events:
+        return  # 连接前已发布的事件是补发的，延迟不计入预算
+    if busy_stats.get("n") and busy_stats["p95"] > args.budget_ms:
+        print(f"FAIL: p95 {busy_stats['p95']:.1f}ms > budget {args.budget_ms:.1f}ms")
+        sys.exit(1)
+    print(f"OK: p95 within {args.budget_ms:.1f}ms budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""剪贴板预加载基准 — 每次启动 PowerShell vs 常驻 PowerShell vs 进程内 win32clipboard
+
+非 Windows 上只有 memory 引擎可测（只验证调用路径）。会覆盖当前剪贴板内容。
+
+用法: python -m benchmarks.clipboard [--rounds 10] [--file 路径]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.servers import format_stats, percentiles
+from clipboard_engine import PS_SCRIPT_PATH, create_clipboard
+
+
+def legacy_copy(path: str, as_image: bool):
+    """原实现：每次写入都启动一个 PowerShell 进程"""
+    cmd = ['powershell', '-ExecutionPolicy', 'Bypass', '-File', PS_SCRIPT_PATH, '-FilePath', path]
+    if as_image:
+        cmd.append('-AsImage')
+    result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+
+def _sample_image() -> str:
+    from PIL import Image
+    path = os.path.join(tempfile.gettempdir(), "cua_clipboard_bench.png")
+    Image.new("RGB", (800, 600), (30, 120, 200)).save(path)
+    return path
+
+
+def _measure(fn, rounds: int) -> list:
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="剪贴板预加载基准")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--file", default=None, help="测试文件（默认生成一张 800x600 PNG）")
+    args = parser.parse_args()
+
+    path = args.file or _sample_image()
+    cases = []
+    if sys.platform == "win32":
+        cases.append(("legacy spawn / image", lambda: legacy_copy(path, True)))
+        cases.append(("legacy spawn / file", lambda: legacy_copy(path, False)))
+        engines = ["powershell", "native"]
+    else:
+        engines = ["memory"]
+    for name in engines:
+        engine = create_clipboard(name)
+        engine.set_text("warmup")  # 常驻进程的启动开销不计入
+        cases.append((f"{name} / text", lambda e=engine: e.set_text("你好，这是预加载文本")))
+        cases.append((f"{name} / image", lambda e=engine: e.set_image(path)))
+        cases.append((f"{name} / file", lambda e=engine: e.set_files(path)))
+
+    for name, fn in cases:
+        print(format_stats(f"{name:<22}", percentiles(_measure(fn, args.rounds))))
+
+
+if __name__ == "__main__":
+    main()
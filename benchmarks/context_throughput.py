@@ -0,0 +1,82 @@
+"""ContextManager.get_context 吞吐/延迟基准（OmniParser 指向本地替身服务）
+
+--mode context  完整 get_context（截图 + 窗口 + OmniParser + SoM），需要桌面会话
+--mode parse    只测 OmniParserService.parse + SoM 转换，用 --frames 目录里的 PNG（或合成帧），任意平台可跑
+
+用法: python -m benchmarks.context_throughput [--mode context|parse] [--iterations 50]
+      [--frames DIR] [--recordings DIR] [--latency-ms 0] [--url http://127.0.0.1:8001]
+"""
+import argparse
+import glob
+import os
+import time
+
+import config
+from benchmarks.servers import format_stats, free_port, percentiles, serve_in_thread, synthetic_frames
+
+
+def _load_frames(frames_dir: str) -> list:
+    if frames_dir:
+        paths = sorted(glob.glob(os.path.join(frames_dir, "*.png")))
+        if not paths:
+            raise SystemExit(f"No PNG frames in {frames_dir}")
+        return [open(p, "rb").read() for p in paths]
+    return synthetic_frames()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="get_context 吞吐/延迟基准")
+    parser.add_argument("--mode", choices=["context", "parse"], default="context")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--frames", default=None, help="parse 模式使用的 PNG 目录")
+    parser.add_argument("--recordings", default=None, help="替身服务的录制响应目录")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="替身服务模拟推理延迟")
+    parser.add_argument("--url", default=None, help="使用已运行的 OmniParser（不启动替身）")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        from omniparser_stub import OmniParserStub, create_app
+        port = free_port()
+        server = serve_in_thread(create_app(OmniParserStub(args.recordings, latency_ms=args.latency_ms)), port)
+        url = f"http://127.0.0.1:{port}"
+    config.OMNIPARSER_URL = url
+    config.OMNIPARSER_ENABLED = True
+
+    if args.mode == "context":
+        from context_manager import ContextManager
+        mgr = ContextManager(use_omniparser=True)
+        run = lambda i: mgr.get_context()
+    else:
+        from omniparser_service import OmniParserService
+        from som_converter import SoMConverter
+        svc = OmniParserService(base_url=url)
+        conv = SoMConverter(config.SCREEN_WIDTH, config.SCREEN_HEIGHT, track=config.SOM_TRACKING)
+        frames = _load_frames(args.frames)
+
+        def run(i):
+            table = conv.convert_table(svc.parse(frames[i % len(frames)]), max_elements=config.SOM_MAX_ELEMENTS)
+            conv.track(table)
+            return conv.format_for_claude(table)
+
+    for i in range(args.warmup):
+        run(i)
+    samples = []
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        t0 = time.perf_counter()
+        run(i)
+        samples.append((time.perf_counter() - t0) * 1000)
+    total = time.perf_counter() - start
+
+    print(f"mode={args.mode} omniparser={url}")
+    print(f"throughput: {args.iterations / total:.2f} contexts/s")
+    print(format_stats("latency", percentiles(samples)))
+    if server:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
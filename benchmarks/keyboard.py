@@ -0,0 +1,61 @@
+"""键盘吞吐基准 — 当前配置的间隔（默认 50ms+50ms）vs 更短的候选间隔，以及批量投递
+
+默认用 NullEngine（不发消息，只保留间隔逻辑），Linux 可运行；
+Windows 上 --engine postmessage/sendinput 会真实发送到前台窗口，先切到记事本等无害窗口。
+候选间隔只有在 VM 上用 --engine postmessage 验证可靠后，才应通过 CUA_INPUT_SETTLE_MS / CUA_INPUT_HOLD_MS 开启。
+
+用法: python -m benchmarks.keyboard [--engine null] [--hotkeys 20] [--text-len 200] [--candidate-ms 10]
+"""
+import argparse
+import time
+
+import config
+from input_engine import NullEngine, create_engine, key_to_vk
+
+HOTKEYS = [("ctrl", "a"), ("ctrl", "c"), ("ctrl", "v"), ("enter",), ("f2",), ("escape",)]
+
+
+def _run(engine, hotkeys: int, text: str, sequence: bool) -> dict:
+    chords = [[key_to_vk(k) for k in HOTKEYS[i % len(HOTKEYS)]] for i in range(hotkeys)]
+    start = time.perf_counter()
+    if sequence:
+        engine.send_sequence(chords)
+    else:
+        for chord in chords:
+            engine.send_keys(chord)
+    t_hotkeys = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.send_text(text)
+    t_text = time.perf_counter() - start
+    return {"hotkeys": hotkeys / t_hotkeys, "ms_per_hotkey": t_hotkeys / hotkeys * 1000,
+            "chars": len(text) / t_text if t_text else float("inf")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="键盘吞吐基准")
+    parser.add_argument("--engine", default="null", choices=["null", "postmessage", "sendinput"])
+    parser.add_argument("--hotkeys", type=int, default=20)
+    parser.add_argument("--text-len", type=int, default=200)
+    parser.add_argument("--candidate-ms", type=float, default=10, help="候选 settle/hold 间隔（毫秒）")
+    args = parser.parse_args()
+
+    text = ("你好 hello " * args.text_len)[:args.text_len]
+    if args.engine == "null":
+        engine = NullEngine(config.INPUT_SETTLE_MS, config.INPUT_HOLD_MS, config.INPUT_SPACING_MS)
+    else:
+        engine = create_engine(args.engine)
+    candidate = NullEngine(settle_ms=args.candidate_ms, hold_ms=args.candidate_ms)
+    cases = [
+        (f"{engine.name} / hotkey", engine, False),
+        (f"{engine.name} / sequence", engine, True),
+        (f"candidate {args.candidate_ms:g}ms / hotkey", candidate, False),
+    ]
+    print(f"{'case':<30} {'hotkeys/s':>10} {'ms/hotkey':>10} {'chars/s':>12}")
+    for name, eng, sequence in cases:
+        r = _run(eng, args.hotkeys, text, sequence)
+        print(f"{name:<30} {r['hotkeys']:>10.1f} {r['ms_per_hotkey']:>10.2f} {r['chars']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
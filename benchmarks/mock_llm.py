@@ -0,0 +1,86 @@
+"""模拟 Anthropic Messages API — 按脚本循环返回动作，第 N 步返回 done
+
+ClaudeBackend 的 CUA_LLM_BASE_URL 指向它即可在无 API Key、无网络的环境跑完整任务循环。
+步号从 user prompt 的 "# Step N" 读取，所以服务本身无状态，可同时服务多个任务。
+给出 responses（录制会话的原始响应文本，按步号）时第 N 步原样返回第 N 条，超出后返回 done。
+
+用法: python -m benchmarks.mock_llm --port 8300 [--steps 5] [--latency-ms 800]
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from typing import List, Optional
+
+from fastapi import FastAPI, Request
+
+# 坐标基于缩放后的截图（1600 宽以内）
+DEFAULT_SCRIPT = [
+    {"thought": "点击输入框", "action": "click", "x": 400, "y": 300},
+    {"thought": "输入文字", "action": "type", "x": 400, "y": 300, "text": "hello 你好"},
+    {"thought": "全选", "action": "hotkey", "keys": ["ctrl", "a"]},
+    {"thought": "向下滚动", "action": "scroll", "direction": "down", "amount": 3},
+]
+
+_STEP_RE = re.compile(r"# Step (\d+)")
+
+
+def create_app(steps: int = 5, latency_ms: float = 0.0, script: Optional[List[dict]] = None,
+               responses: Optional[List[str]] = None, latencies_ms: Optional[List[float]] = None) -> FastAPI:
+    """latencies_ms 按步号给出每步的模拟延迟（覆盖 latency_ms）"""
+    app = FastAPI(title="Mock Anthropic", version="1.0.0")
+    script = script or DEFAULT_SCRIPT
+    app.state.stats = {"requests": 0, "done": 0}
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        start = time.time()
+        body = await request.json()
+        app.state.stats["requests"] += 1
+        text = " ".join(block.get("text", "") for msg in body.get("messages", [])
+                        for block in msg.get("content", []) if isinstance(block, dict))
+        m = _STEP_RE.search(text)
+        step = int(m.group(1)) if m else 1
+        if responses is not None and step <= len(responses) and responses[step - 1] is not None:
+            reply = responses[step - 1]
+        elif responses is not None or step >= steps:
+            reply = json.dumps({"thought": "任务已完成", "action": "done"}, ensure_ascii=False)
+            app.state.stats["done"] += 1
+        else:
+            reply = json.dumps(script[(step - 1) % len(script)], ensure_ascii=False)
+        delay_ms = latencies_ms[step - 1] if latencies_ms and step <= len(latencies_ms) else latency_ms
+        remaining = delay_ms / 1000 - (time.time() - start)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+        return {
+            "id": f"msg_mock_{app.state.stats['requests']}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "mock"),
+            "content": [{"type": "text", "text": reply}],
+            "stop_reason": "end_turn",
+            "usage": {"input_tokens": len(text) // 4, "output_tokens": 20},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟 Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8300)
+    parser.add_argument("--steps", type=int, default=5, help="第几步返回 done")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟模型延迟（毫秒）")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.steps, args.latency_ms), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
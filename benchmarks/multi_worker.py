@@ -0,0 +1,131 @@
+"""协调器 + 多 worker 本地压测 — N 个 main.py 子进程（RecordingBackend + 回放帧）由 coordinator 分发
+
+每个 worker 是独立的 `python main.py` 进程（CUA_EXECUTOR_BACKEND=recording、CUA_REPLAY_FRAMES、
+LLM 指向本地模拟 Messages API），协调器在本进程里运行。一次性提交 --tasks 个普通任务和
+--sticky 个“微信”任务（应按应用粘到同一台 worker），统计各 worker 分到的任务数和总吞吐。
+
+用法: python -m benchmarks.multi_worker [--workers 3] [--tasks 9] [--sticky 3] [--steps 3]
+      [--llm-latency-ms 300]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+import config
+from benchmarks.servers import free_port, serve_in_thread
+from benchmarks.task_loop import write_frames
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TERMINAL = ("completed", "failed", "error", "timeout", "stopped", "cancelled", "skipped")
+
+
+def _spawn_worker(port: int, llm_url: str, frames_dir: str, log_dir: str) -> subprocess.Popen:
+    env = dict(os.environ,
+               CUA_PORT=str(port), CUA_API_KEY=config.API_KEY,
+               CUA_LLM_PROVIDER="anthropic", CUA_LLM_BASE_URL=llm_url, CUA_LLM_API_KEY="mock",
+               CUA_EXECUTOR_BACKEND="recording", CUA_REPLAY_FRAMES=frames_dir,
+               CUA_OMNIPARSER_ENABLED="false",
+               CUA_SETTLE_DELAY_PATH=os.path.join(log_dir, f"settle_{port}.json"),
+               CUA_TASK_STORE=os.path.join(log_dir, f"tasks_{port}.db"))
+    log = open(os.path.join(log_dir, f"worker_{port}.log"), "w")
+    return subprocess.Popen([sys.executable, "main.py"], cwd=_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def _wait_ready(url: str, timeout: float = 60):
+    headers = {"Authorization": f"Bearer {config.API_KEY}"}
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{url}/queue", headers=headers, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Worker {url} failed to start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="协调器 + 多 worker 本地压测")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--tasks", type=int, default=9, help="普通任务数")
+    parser.add_argument("--sticky", type=int, default=3, help="微信任务数（应粘到同一 worker）")
+    parser.add_argument("--steps", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    from benchmarks.mock_llm import create_app as create_llm_app
+    llm_port = free_port()
+    servers = [serve_in_thread(create_llm_app(steps=args.steps, latency_ms=args.llm_latency_ms), llm_port)]
+    frames_dir = write_frames(None)
+    log_dir = tempfile.mkdtemp(prefix="cua_workers_")
+
+    ports = [free_port() for _ in range(args.workers)]
+    procs = [_spawn_worker(p, f"http://127.0.0.1:{llm_port}", frames_dir, log_dir) for p in ports]
+    try:
+        for p in ports:
+            _wait_ready(f"http://127.0.0.1:{p}")
+
+        # coordinator 在 import 时读取配置
+        config.WORKERS = [f"w{i}=http://127.0.0.1:{p}" for i, p in enumerate(ports)]
+        config.WORKER_HEALTH_INTERVAL = 0.5
+        import coordinator
+        from loguru import logger
+        logger.remove()
+        logger.add(sys.stderr, level="ERROR")
+        coord_port = free_port()
+        servers.append(serve_in_thread(coordinator.app, coord_port))
+
+        headers = {"Authorization": f"Bearer {config.API_KEY}"}
+        with httpx.Client(base_url=f"http://127.0.0.1:{coord_port}", headers=headers, timeout=30) as client:
+            start = time.perf_counter()
+            # 微信任务均匀穿插在普通任务之间
+            kinds = sorted([(i / args.tasks, False) for i in range(args.tasks)] +
+                           [(i / args.sticky, True) for i in range(args.sticky)])
+            submitted = []
+            for i, (_, sticky) in enumerate(kinds):
+                prompt = f"在微信里发送消息 {i}" if sticky else f"压测任务 {i}"
+                resp = client.post("/task", json={"prompt": prompt, "max_steps": args.steps + 2,
+                                                  "client_id": f"client-{i % 3}"})
+                resp.raise_for_status()
+                data = resp.json()
+                submitted.append((data["task_id"], data["worker"], sticky))
+
+            statuses = {}
+            while len(statuses) < len(submitted):
+                for task_id, _, _ in submitted:
+                    if task_id in statuses:
+                        continue
+                    data = client.get(f"/task/{task_id}").json()
+                    if data["status"] in _TERMINAL:
+                        statuses[task_id] = (data["status"], data["steps"])
+                time.sleep(0.1)
+            elapsed = time.perf_counter() - start
+            workers = client.get("/workers").json()
+
+        per_worker = Counter(w for _, w, _ in submitted)
+        sticky_workers = {w for _, w, s in submitted if s}
+        total_steps = sum(steps for _, steps in statuses.values())
+        ok = sum(1 for status, _ in statuses.values() if status == "completed")
+        for w in workers:
+            print(f"{w['name']:<4} tasks={per_worker.get(w['name'], 0):<3} healthy={w['healthy']} "
+                  f"latency={w['latency_ms']}ms")
+        print(f"sticky (微信) tasks -> {sorted(sticky_workers)} {'OK' if len(sticky_workers) <= 1 else 'SPLIT'}")
+        print(f"workers={args.workers} tasks={len(submitted)} completed={ok} steps={total_steps} "
+              f"elapsed={elapsed:.2f}s steps/s={total_steps / elapsed:.2f}")
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(10)
+        for server in servers:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
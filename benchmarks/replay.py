@@ -0,0 +1,216 @@
+"""录制会话回放压测 — 用 CUA_RECORD_DIR 录下的会话无桌面重跑 execute_task，在相同负载上比较改动前后的性能
+
+- 截图：按录制顺序回放会话的帧
+- 模拟 LLM：第 N 步原样返回录制的第 N 条响应（--recorded-latency 时按录制的模型耗时延迟）
+- OmniParser 替身：按帧哈希返回录制的元素（会话没有元素时不启用 OmniParser）
+- 执行器：RecordingBackend（只校验、计时，不操作桌面）
+
+报告 steps/s、各阶段耗时（步骤历史的 spans）、内存（RSS 峰值，--tracemalloc 时另报 Python 分配峰值）；
+--json 保存报告，--baseline 与之前保存的报告逐项对比。
+回放帧与步骤一一对应；效果检测触发重试时会多截一帧，之后的帧与录制错位（每次回放结果仍然一致）。
+
+用法: python -m benchmarks.replay SESSION_DIR [--repeat 3] [--llm-latency-ms 0 | --recorded-latency]
+      [--omniparser-latency-ms 0] [--action-latency-ms 0] [--tracemalloc] [--json out.json] [--baseline before.json]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import psutil
+from PIL import Image
+
+import config
+from recorder import load_session
+
+_MB = 1024 * 1024
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def write_omniparser_recordings(session_dir: str, steps: list) -> str:
+    """按回放时截图流水线产生的帧字节计算哈希，写成 OmniParser 替身的录制目录"""
+    from screenshot import _encode
+    recordings = tempfile.mkdtemp(prefix="cua_replay_omni_")
+    for step in steps:
+        with Image.open(os.path.join(session_dir, step["frame"])) as img:
+            png, _ = _encode(img.convert("RGB"), config.SCREENSHOT_MAX_WIDTH)
+        with open(os.path.join(recordings, f"{hashlib.sha1(png).hexdigest()}.json"), "w", encoding="utf-8") as f:
+            json.dump({"parsed_content_list": step["context"]["omniparser_elements"] or []}, f, ensure_ascii=False)
+    return recordings
+
+
+class RssSampler:
+    """后台线程采样进程 RSS，记录峰值"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start_rss = self.peak_rss = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        end_rss = self.process.memory_info().rss
+        self.peak_rss = max(self.peak_rss, end_rss)
+        return {"rss_start_mb": round(self.start_rss / _MB, 1), "rss_peak_mb": round(self.peak_rss / _MB, 1),
+                "rss_end_mb": round(end_rss / _MB, 1)}
+
+
+def phase_report(histories: list) -> dict:
+    """各阶段耗时（毫秒）：次数、均值、p50、p95"""
+    samples = {}
+    for history in histories:
+        for record in history:
+            for name, ms in (record.get("spans") or {}).items():
+                samples.setdefault(name, []).append(ms)
+    from metrics import PHASES
+    order = {name: i for i, name in enumerate(PHASES)}
+    return {name: {"count": len(values), "mean_ms": round(sum(values) / len(values), 1),
+                   "p50_ms": round(_percentile(values, 0.5), 1), "p95_ms": round(_percentile(values, 0.95), 1)}
+            for name, values in sorted(samples.items(), key=lambda kv: order.get(kv[0], len(order)))}
+
+
+def print_report(report: dict, baseline: dict = None):
+    def delta(new, old):
+        if old in (None, 0) or new is None:
+            return ""
+        return f" ({(new - old) / old * 100:+.1f}%)"
+
+    base = baseline or {}
+    print(f"session={report['session']} runs={report['runs']} statuses={report['statuses']}")
+    print(f"steps={report['steps']} elapsed={report['elapsed']:.2f}s "
+          f"steps/s={report['steps_per_sec']:.2f}{delta(report['steps_per_sec'], base.get('steps_per_sec'))}")
+    print(f"{'phase':<12}{'count':>6}{'mean_ms':>10}{'p50_ms':>10}{'p95_ms':>10}")
+    base_phases = base.get("phases", {})
+    for name, p in report["phases"].items():
+        old = base_phases.get(name, {})
+        print(f"{name:<12}{p['count']:>6}{p['mean_ms']:>10.1f}{p['p50_ms']:>10.1f}{p['p95_ms']:>10.1f}"
+              f"{delta(p['mean_ms'], old.get('mean_ms'))}")
+    mem = report["memory"]
+    base_mem = base.get("memory", {})
+    print("memory: " + " ".join(f"{k}={v}{delta(v, base_mem.get(k))}" for k, v in mem.items()))
+    if report.get("omniparser"):
+        print(f"omniparser stub: {report['omniparser']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制会话回放压测")
+    parser.add_argument("session", help="会话目录（CUA_RECORD_DIR 下的子目录）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复回放次数")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="模拟模型固定延迟")
+    parser.add_argument("--recorded-latency", action="store_true", help="按录制的每步模型耗时延迟")
+    parser.add_argument("--omniparser-latency-ms", type=float, default=0.0, help="OmniParser 替身模拟推理延迟")
+    parser.add_argument("--action-latency-ms", type=float, default=0.0, help="RecordingBackend 每个动作的模拟耗时")
+    parser.add_argument("--tracemalloc", action="store_true", help="统计 Python 分配峰值（有额外开销）")
+    parser.add_argument("--json", default=None, help="报告保存路径")
+    parser.add_argument("--baseline", default=None, help="之前保存的报告，逐项对比")
+    args = parser.parse_args()
+
+    session = load_session(args.session)
+    task_meta, steps = session["task"], session["steps"]
+    if not steps:
+        sys.exit(f"No recorded steps in {args.session}")
+    if any(s["llm"]["backend"] != "claude" for s in steps):
+        print("warning: session has non-Claude responses; replay always goes through ClaudeBackend")
+
+    # 录制时的屏幕/截图配置（坐标校验、提示词里的分辨率与录制一致）
+    config.SCREEN_WIDTH, config.SCREEN_HEIGHT = task_meta["screen"]
+    config.SCREENSHOT_MAX_WIDTH = task_meta["screenshot_max_width"]
+    config.REPLAY_APP = steps[0]["context"].get("active_app") or "unknown"
+    config.RECORD_DIR = ""
+
+    from benchmarks.mock_llm import create_app as create_llm_app
+    from benchmarks.task_loop import setup_headless
+    from omniparser_stub import OmniParserStub
+    responses = [None] * max(s["step"] for s in steps)
+    latencies = [0.0] * len(responses)
+    for s in steps:
+        responses[s["step"] - 1] = s["llm"]["response"]
+        latencies[s["step"] - 1] = (s["llm"]["seconds"] or 0.0) * 1000
+    llm_app = create_llm_app(latency_ms=args.llm_latency_ms, responses=responses,
+                             latencies_ms=latencies if args.recorded_latency else None)
+    use_omniparser = any(s["context"].get("omniparser_elements") for s in steps)
+    stub = None
+    if use_omniparser:
+        stub = OmniParserStub(write_omniparser_recordings(args.session, steps), latency_ms=args.omniparser_latency_ms)
+    _, servers = setup_headless(len(steps), action_latency_ms=args.action_latency_ms,
+                                frames=os.path.join(args.session, "frames"), omniparser=use_omniparser,
+                                llm_app=llm_app, omniparser_stub=stub)
+
+    import main as main_mod
+    from screenshot import rewind_replay
+    from loguru import logger
+    logger.remove()  # 压测只看汇总和错误
+    logger.add(sys.stderr, level="ERROR")
+
+    async def _run() -> list:
+        await main_mod.startup_event()
+        task_ids = []
+        for _ in range(args.repeat):
+            rewind_replay()
+            request = main_mod.TaskRequest(
+                prompt=task_meta["prompt"], max_steps=task_meta.get("max_steps") or config.MAX_STEPS,
+                clipboard_preload=task_meta.get("clipboard_preload"), file_preload=task_meta.get("file_preload"))
+            resp = await main_mod.create_task(request, api_key=config.API_KEY)
+            await main_mod.task_runner.wait(resp.task_id)
+            task_ids.append(resp.task_id)
+        return task_ids
+
+    if args.tracemalloc:
+        import tracemalloc
+        tracemalloc.start()
+    sampler = RssSampler()
+    start = time.perf_counter()
+    task_ids = asyncio.run(_run())
+    elapsed = time.perf_counter() - start
+    memory = sampler.stop()
+    if args.tracemalloc:
+        memory["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / _MB, 1)
+        tracemalloc.stop()
+
+    runs = [main_mod.tasks[tid] for tid in task_ids]
+    total_steps = sum(t["steps"] for t in runs)
+    statuses = {}
+    for t in runs:
+        statuses[t["status"]] = statuses.get(t["status"], 0) + 1
+    report = {
+        "session": os.path.basename(os.path.normpath(args.session)),
+        "runs": len(runs),
+        "statuses": statuses,
+        "steps": total_steps,
+        "elapsed": round(elapsed, 3),
+        "steps_per_sec": round(total_steps / elapsed, 3),
+        "phases": phase_report([t["history"] for t in runs]),
+        "memory": memory,
+        "omniparser": stub.stats if stub else None,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    for server in servers:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
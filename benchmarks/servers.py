@@ -0,0 +1,69 @@
+"""基准脚本共用：在后台线程里起 uvicorn 服务、统计延迟分位数、合成截图帧"""
+import io
+import socket
+import threading
+import time
+from typing import List, Tuple
+
+import uvicorn
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """后台线程启动 uvicorn，返回 server（server.should_exit = True 停止）"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError(f"Server on port {port} failed to start")
+        time.sleep(0.02)
+    return server
+
+
+def percentiles(samples_ms: List[float]) -> dict:
+    if not samples_ms:
+        return {"n": 0}
+    s = sorted(samples_ms)
+
+    def pct(p: float) -> float:
+        return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
+
+    return {
+        "n": len(s),
+        "mean": sum(s) / len(s),
+        "p50": pct(50),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": s[-1],
+    }
+
+
+def format_stats(name: str, stats: dict) -> str:
+    if not stats.get("n"):
+        return f"{name}: no samples"
+    return (f"{name}: n={stats['n']} mean={stats['mean']:.1f}ms p50={stats['p50']:.1f}ms "
+            f"p95={stats['p95']:.1f}ms p99={stats['p99']:.1f}ms max={stats['max']:.1f}ms")
+
+
+def synthetic_frames(count: int = 4, size: Tuple[int, int] = (1600, 900)) -> List[bytes]:
+    """合成 PNG 帧：白底 + 若干色块/文字行，帧间略有位移"""
+    from PIL import Image, ImageDraw
+    frames = []
+    for k in range(count):
+        img = Image.new("RGB", size, "white")
+        draw = ImageDraw.Draw(img)
+        for i in range(30):
+            x, y = 40 + (i % 5) * 300, 40 + (i // 5) * 130 + k * 7
+            draw.rectangle([x, y, x + 36, y + 36], fill=(30, 120, 200))
+            draw.text((x + 50, y + 10), f"item {i} frame {k}", fill="black")
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        frames.append(buf.getvalue())
+    return frames
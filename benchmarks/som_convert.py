@@ -0,0 +1,96 @@
+"""SoM 转换基准 — 逐元素 dataclass 实现 vs SoMTable 向量化实现
+
+用法: python -m benchmarks.som_convert [--sizes 200 350 500] [--rounds 200]
+"""
+import argparse
+import random
+import time
+
+from som_converter import SoMConverter, SoMElement
+
+RAW_TYPES = ["text", "icon", "button", "input", "link", "image"]
+WORDS = ["搜索", "发送(S)", "文件", "设置", "OK", "Cancel", "微信", "聊天", "", ""]
+
+
+def make_frame(n: int, seed: int = 0) -> list:
+    """生成 n 个 OmniParser 风格的元素"""
+    rng = random.Random(seed)
+    frame = []
+    for _ in range(n):
+        x1, y1 = rng.random() * 0.95, rng.random() * 0.95
+        w, h = rng.uniform(0.01, 0.05), rng.uniform(0.01, 0.04)
+        frame.append({
+            "type": rng.choice(RAW_TYPES),
+            "bbox": [x1, y1, min(x1 + w, 1.0), min(y1 + h, 1.0)],
+            "interactivity": rng.random() < 0.6,
+            "content": f" {rng.choice(WORDS)} ",
+        })
+    return frame
+
+
+def legacy_convert(conv: SoMConverter, omniparser_elements: list, max_elements: int) -> list:
+    """原逐元素实现（对照组）"""
+    elements = []
+    for el in omniparser_elements:
+        if len(elements) >= max_elements:
+            break
+        bbox = el.get("bbox", [0, 0, 0, 0])
+        cx, cy = conv.bbox_to_pixel(bbox)
+        t = el.get("type", "").lower()
+        if "button" in t:
+            el_type = "button"
+        elif "input" in t or ("text" in t and el.get("interactivity")):
+            el_type = "text_field"
+        elif "link" in t:
+            el_type = "link"
+        elif "icon" in t or "image" in t:
+            el_type = "icon"
+        elif el.get("interactivity"):
+            el_type = "control"
+        else:
+            el_type = "label"
+        elements.append(SoMElement(
+            id=len(elements), type=el_type, content=el.get("content", "").strip(),
+            bbox=tuple(bbox), interactable=el.get("interactivity", False),
+            center_x=cx, center_y=cy,
+        ))
+    elements.sort(key=lambda e: (e.center_y // 50, e.center_x))
+    for i, el in enumerate(elements):
+        el.id = i
+    return elements
+
+
+def _time(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SoM 转换基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 350, 500])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    conv = SoMConverter(screen_w=1920, screen_h=1080, dpi_scale=1.25)
+    print(f"{'N':>5} {'legacy':>9} {'table':>9} {'view':>9} {'legacy+fmt':>11} {'table+fmt':>10} {'speedup':>8}  (ms/frame)")
+    for n in args.sizes:
+        frame = make_frame(n, seed=n)
+        legacy = legacy_convert(conv, frame, n)
+        table = conv.convert_table(frame, max_elements=n)
+        assert [(e.id, e.type, e.content, e.center_x, e.center_y, e.interactable) for e in legacy] == \
+               [(e.id, e.type, e.content, e.center_x, e.center_y, e.interactable) for e in table.to_elements()], "结果不一致"
+        assert conv.format_for_claude(legacy) == conv.format_for_claude(table), "清单文本不一致"
+
+        t_legacy = _time(lambda: legacy_convert(conv, frame, n), args.rounds)
+        t_table = _time(lambda: conv.convert_table(frame, max_elements=n), args.rounds)
+        t_view = _time(lambda: conv.convert(frame, max_elements=n), args.rounds)
+        t_legacy_fmt = _time(lambda: conv.format_for_claude(legacy_convert(conv, frame, n)), args.rounds)
+        t_table_fmt = _time(lambda: conv.format_for_claude(conv.convert_table(frame, max_elements=n)), args.rounds)
+        print(f"{n:>5} {t_legacy:>9.3f} {t_table:>9.3f} {t_view:>9.3f} {t_legacy_fmt:>11.3f} "
+              f"{t_table_fmt:>10.3f} {t_legacy_fmt / t_table_fmt:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""完整 execute_task 循环压测 — 回放帧 + 模拟 LLM + RecordingBackend，无桌面可跑
+
+截图来自 --frames 目录（默认合成帧），Claude 请求发到本地模拟 Messages API，
+执行器用 RecordingBackend（只校验、计时、记录），OmniParser 可选指向本地替身服务。
+
+--stop-after 秒数：任务启动后调用 /stop，统计从 stop 到 execute_task 协程退出的耗时（取消延迟）。
+--burst N：一次性提交全部任务（N 个客户端轮流），统计排队位置、排队等待和执行耗时。
+--speculative：开启投机规划（下一步预测与动作效果检测并行），统计采用了投机预测的步数。
+
+用法: python -m benchmarks.task_loop [--tasks 3] [--steps 4] [--llm-latency-ms 0]
+      [--frames DIR] [--omniparser] [--action-latency-ms 0] [--stop-after 0.5] [--burst 2]
+      [--speculative]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+import config
+from benchmarks.servers import free_port, serve_in_thread, synthetic_frames
+
+
+def write_frames(frames_dir: str) -> str:
+    if frames_dir:
+        return frames_dir
+    frames_dir = tempfile.mkdtemp(prefix="cua_replay_")
+    for i, png in enumerate(synthetic_frames(size=(config.SCREEN_WIDTH, config.SCREEN_HEIGHT))):
+        with open(os.path.join(frames_dir, f"{i:04d}.png"), "wb") as f:
+            f.write(png)
+    return frames_dir
+
+
+def setup_headless(steps: int, llm_latency_ms: float = 0.0, action_latency_ms: float = 0.0,
+                   frames: Optional[str] = None, omniparser: bool = False, llm_app=None, omniparser_stub=None):
+    """启动模拟 LLM（及可选 OmniParser 替身），把 config 切到无桌面回放模式。
+
+    main 在 import 时按 config 创建全局实例，必须在 import main 之前调用。
+    llm_app / omniparser_stub 给出时用它们代替默认的脚本化模拟 LLM / 启发式替身（录制回放用）。
+    返回 (模拟 LLM app, uvicorn server 列表)。
+    """
+    from benchmarks.mock_llm import create_app as create_llm_app
+    llm_app = llm_app or create_llm_app(steps=steps, latency_ms=llm_latency_ms)
+    llm_port = free_port()
+    servers = [serve_in_thread(llm_app, llm_port)]
+
+    config.LLM_PROVIDER = "anthropic"
+    config.LLM_BASE_URL = f"http://127.0.0.1:{llm_port}"
+    config.LLM_API_KEY = "mock"
+    config.EXECUTOR_BACKEND = "recording"
+    config.RECORDING_LATENCY_MS = action_latency_ms
+    config.REPLAY_FRAMES_DIR = write_frames(frames)
+    config.HEADLESS = True
+    data_dir = tempfile.mkdtemp(prefix="cua_data_")
+    config.SETTLE_DELAY_PATH = os.path.join(data_dir, "settle_delays.json")
+    config.TASK_STORE_PATH = os.path.join(data_dir, "tasks.db")
+    config.OMNIPARSER_ENABLED = omniparser
+    if omniparser:
+        from omniparser_stub import OmniParserStub, create_app as create_stub_app
+        stub_port = free_port()
+        servers.append(serve_in_thread(create_stub_app(omniparser_stub or OmniParserStub()), stub_port))
+        config.OMNIPARSER_URL = f"http://127.0.0.1:{stub_port}"
+    return llm_app, servers
+
+
+async def _run_tasks(main_mod, count: int, steps: int, stop_after: Optional[float] = None) -> list:
+    results = []
+    for i in range(count):
+        start = time.perf_counter()
+        resp = await main_mod.create_task(
+            main_mod.TaskRequest(prompt=f"压测任务 {i}", max_steps=steps + 2), api_key=config.API_KEY)
+        task = main_mod.tasks[resp.task_id]
+        result = {"task_id": resp.task_id}
+        if stop_after is not None:
+            await asyncio.sleep(stop_after)
+            stop_at = time.perf_counter()
+            await main_mod.stop_task(resp.task_id, api_key=config.API_KEY)
+            await main_mod.task_runner.wait(resp.task_id)
+            result["stop_ms"] = (time.perf_counter() - stop_at) * 1000
+        else:
+            await main_mod.task_runner.wait(resp.task_id)
+        result.update(status=task["status"], steps=task["steps"], seconds=time.perf_counter() - start)
+        results.append(result)
+    return results
+
+
+async def _run_burst(main_mod, count: int, steps: int, clients: int) -> list:
+    """一次性提交全部任务，等队列排空"""
+    submitted = []
+    for i in range(count):
+        resp = await main_mod.create_task(
+            main_mod.TaskRequest(prompt=f"压测任务 {i}", max_steps=steps + 2, client_id=f"client-{i % clients}"),
+            api_key=config.API_KEY)
+        submitted.append((resp, f"client-{i % clients}"))
+    while any(main_mod.tasks[r.task_id]["status"] in ("queued",) + main_mod.ACTIVE_STATUSES for r, _ in submitted):
+        await asyncio.sleep(0.05)
+    results = []
+    for resp, client in submitted:
+        task = main_mod.tasks[resp.task_id]
+        wait = (task["started_at"] or task["created_at"]) - task["created_at"]
+        results.append({"task_id": resp.task_id, "status": task["status"], "steps": task["steps"],
+                        "seconds": (task["finished_at"] or 0) - (task["started_at"] or 0),
+                        "queue": f" {client} position={resp.position or 0} wait={wait:.2f}s"})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="execute_task 无桌面压测")
+    parser.add_argument("--tasks", type=int, default=3)
+    parser.add_argument("--steps", type=int, default=4, help="模拟 LLM 第几步返回 done")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--action-latency-ms", type=float, default=0.0, help="RecordingBackend 每个动作的模拟耗时")
+    parser.add_argument("--frames", default=None, help="回放帧目录（默认生成合成帧）")
+    parser.add_argument("--omniparser", action="store_true", help="启动本地 OmniParser 替身并启用 SoM")
+    parser.add_argument("--stop-after", type=float, default=None, help="任务启动后多少秒调用 /stop")
+    parser.add_argument("--burst", type=int, default=0, help="一次性提交全部任务，按该数目的客户端轮流")
+    parser.add_argument("--speculative", action="store_true", help="开启投机规划")
+    args = parser.parse_args()
+    config.SPECULATIVE_PLANNING = args.speculative
+
+    llm_app, servers = setup_headless(args.steps, args.llm_latency_ms, args.action_latency_ms,
+                                      args.frames, args.omniparser)
+
+    import main as main_mod
+    from loguru import logger
+    logger.remove()  # 压测只看汇总和错误
+    logger.add(sys.stderr, level="ERROR")
+
+    async def _run():
+        await main_mod.startup_event()
+        if args.burst:
+            return await _run_burst(main_mod, args.tasks, args.steps, args.burst)
+        return await _run_tasks(main_mod, args.tasks, args.steps, args.stop_after)
+
+    start = time.perf_counter()
+    results = asyncio.run(_run())
+    elapsed = time.perf_counter() - start
+
+    total_steps = sum(r["steps"] for r in results)
+    for r in results:
+        stop = f" stop->exit={r['stop_ms']:.1f}ms" if "stop_ms" in r else ""
+        print(f"task {r['task_id'][:8]} {r['status']:<10} steps={r['steps']:<3} {r['seconds']:.2f}s{stop}"
+              f"{r.get('queue', '')}")
+    print(f"tasks={len(results)} steps={total_steps} elapsed={elapsed:.2f}s "
+          f"steps/s={total_steps / elapsed:.2f} llm_requests={llm_app.state.stats['requests']}")
+    print(f"executor actions: {main_mod.executor.backend.summary()}")
+    if args.speculative:
+        used = sum(1 for t in main_mod.tasks.values() for r in t["history"] if r.get("speculative"))
+        print(f"speculative steps used={used}/{total_steps}")
+    for server in servers:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""任务取消令牌 — /stop 立即打断进行中的 LLM 调用、截图解析、动作执行和等待
+
+CancelToken 可在任意线程 cancel()；等待方（线程里的 sleep / 协程里的 asleep / run）都会在毫秒级返回并抛出 TaskCancelled。
+阻塞调用用 run() 放到线程执行：取消时协程立即返回，线程里的调用结果被丢弃；
+被丢弃但仍在运行的线程调用记在令牌上，drain() 等它们结束（下一个任务开始前调用，避免两个任务同时操作桌面）。
+scoped(seconds) 得到带截止时间的视图（取消状态与原令牌共享），组件用 remaining()/timeout() 遵守剩余预算。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, wait
+from typing import Callable, List, Optional
+
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._abandoned: List[Future] = []  # 取消时仍在线程里运行的 run() 调用
+        self.reason: Optional[str] = None
+        self.cancelled_at: Optional[float] = None
+
+    deadline: Optional[float] = None  # time.monotonic() 截止时间，None 为不限
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def scoped(self, seconds: float) -> "CancelToken":
+        """带截止时间的视图：取消状态共享，截止时间不晚于本令牌的"""
+        return _ScopedToken(self, time.monotonic() + max(0.0, seconds))
+
+    def remaining(self) -> Optional[float]:
+        """距截止时间的秒数（可为负），无截止时间返回 None"""
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def timeout(self, default: float, floor: float = 1.0) -> float:
+        """网络请求超时：不超过 default 和剩余预算，但至少 floor 秒（预算已用完也给请求一次机会）"""
+        remaining = self.remaining()
+        return default if remaining is None else max(floor, min(default, remaining))
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self.cancelled_at = time.time()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for cb in callbacks:
+            try:
+                cb()
+            except Exception:
+                pass
+
+    def add_callback(self, cb: Callable[[], None]) -> Callable[[], None]:
+        """取消时调用 cb（已取消则立即调用）；返回注销函数"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(cb)
+                return lambda: self._remove_callback(cb)
+        cb()
+        return lambda: None
+
+    def _remove_callback(self, cb):
+        with self._lock:
+            if cb in self._callbacks:
+                self._callbacks.remove(cb)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TaskCancelled(self.reason)
+
+    def sleep(self, seconds: float):
+        """线程内等待；取消时立即抛 TaskCancelled"""
+        if self._event.wait(max(0.0, seconds)):
+            raise TaskCancelled(self.reason)
+
+    def wait_future(self, future: Future, timeout: Optional[float] = None):
+        """等待 concurrent Future 完成或被取消，返回其结果"""
+        done = threading.Event()
+        future.add_done_callback(lambda _: done.set())
+        unregister = self.add_callback(done.set)
+        try:
+            done.wait(timeout)
+        finally:
+            unregister()
+        self.raise_if_cancelled()
+        return future.result(timeout=0)
+
+    async def _cancelled_future(self) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def _wake():
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(None))
+        unregister = self.add_callback(_wake)
+        fut.add_done_callback(lambda _: unregister())
+        return fut
+
+    async def asleep(self, seconds: float):
+        """协程内等待；取消时立即抛 TaskCancelled"""
+        self.raise_if_cancelled()
+        cancelled = await self._cancelled_future()
+        try:
+            done, _ = await asyncio.wait({cancelled}, timeout=max(0.0, seconds))
+        finally:
+            cancelled.cancel()
+        if done:
+            raise TaskCancelled(self.reason)
+
+    async def wait_event(self, event: asyncio.Event, timeout: Optional[float] = None):
+        """等待 asyncio.Event 或取消（超时抛 asyncio.TimeoutError）"""
+        await self.run_coro(event.wait(), timeout=timeout)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """在线程里执行阻塞调用；取消时立即抛 TaskCancelled（线程继续跑完，结果丢弃，drain() 可等它结束）"""
+        self.raise_if_cancelled()
+        call = Future()
+
+        def _call():
+            if not call.set_running_or_notify_cancel():
+                return  # 取消时还没开始：不再执行
+            try:
+                call.set_result(fn(*args, **kwargs))
+            except BaseException as e:
+                call.set_exception(e)
+        try:
+            await self.run_coro(asyncio.to_thread(_call))
+        except (TaskCancelled, asyncio.CancelledError):
+            if not call.cancel():
+                self._abandon(call)
+            raise
+        return call.result()
+
+    def _abandon(self, call: Future):
+        with self._lock:
+            self._abandoned = [f for f in self._abandoned if not f.done()] + [call]
+
+    async def drain(self, timeout: float) -> int:
+        """等待取消时被丢弃、仍在线程里运行的调用结束（最多 timeout 秒），返回仍未结束的个数"""
+        with self._lock:
+            pending = [f for f in self._abandoned if not f.done()]
+        if pending:
+            await asyncio.to_thread(wait, pending, timeout)
+        return sum(not f.done() for f in pending)
+
+    async def run_coro(self, coro, timeout: Optional[float] = None):
+        self.raise_if_cancelled()
+        work = asyncio.ensure_future(coro)
+        cancelled = await self._cancelled_future()
+        try:
+            done, _ = await asyncio.wait({work, cancelled}, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancelled.cancel()
+        if work in done:
+            return work.result()
+        work.cancel()
+        if not done:
+            raise asyncio.TimeoutError()
+        raise TaskCancelled(self.reason)
+
+
+class _ScopedToken(CancelToken):
+    """父令牌的截止时间视图"""
+
+    def __init__(self, parent: CancelToken, deadline: float):
+        self._parent = parent
+        self._event = parent._event
+        self.deadline = deadline if parent.deadline is None else min(deadline, parent.deadline)
+
+    @property
+    def reason(self) -> Optional[str]:
+        return self._parent.reason
+
+    @property
+    def cancelled_at(self) -> Optional[float]:
+        return self._parent.cancelled_at
+
+    def cancel(self, reason: str = "cancelled"):
+        self._parent.cancel(reason)
+
+    def add_callback(self, cb: Callable[[], None]) -> Callable[[], None]:
+        return self._parent.add_callback(cb)
+
+    def _abandon(self, call: Future):
+        self._parent._abandon(call)
+
+    async def drain(self, timeout: float) -> int:
+        return await self._parent.drain(timeout)
+
+
+class _NeverCancelled(CancelToken):
+    """默认令牌：永不取消（调用方未传 cancel 时使用）"""
+
+    def cancel(self, reason: str = "cancelled"):
+        raise RuntimeError("NEVER token cannot be cancelled")
+
+
+NEVER = _NeverCancelled()
@@ -0,0 +1,241 @@
+"""剪贴板引擎 — 进程内 win32clipboard 写入，常驻 PowerShell 进程兜底
+
+- NativeClipboard（默认）：CF_UNICODETEXT / CF_HDROP（文件拖放列表）/ CF_DIB（图片，PIL 转 BMP）
+- PowerShellClipboard：常驻 copy_file_to_clipboard.ps1 -Serve 进程，只启动一次；
+  Native 写入失败（PIL 打不开的图片格式等）时兜底
+- MemoryClipboard：非 Windows 上只保存在内存，测试和基准用
+
+用法: get_clipboard().copy_file(path, as_image=True)  /  get_clipboard().set_text("你好")
+"""
+import io
+import json
+import os
+import queue
+import struct
+import subprocess
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from loguru import logger
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp')
+
+PS_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'copy_file_to_clipboard.ps1')
+
+
+class ClipboardEngine(ABC):
+    """剪贴板引擎基类：子类实现 _write(op, value)，op 为 "text" / "files" / "image" """
+
+    name = "base"
+
+    def __init__(self):
+        self.stats = {"writes": 0, "seconds": 0.0, "fallbacks": 0}
+        self._lock = threading.Lock()
+
+    def set_text(self, text: str) -> float:
+        return self._timed("text", text)
+
+    def set_files(self, path: str) -> float:
+        return self._timed("files", path)
+
+    def set_image(self, path: str) -> float:
+        return self._timed("image", path)
+
+    def copy_file(self, path: str, as_image: Optional[bool] = None) -> float:
+        """图片默认按位图写入（微信可直接粘贴），其余按文件拖放列表写入；返回耗时（秒）"""
+        if as_image is None:
+            as_image = path.lower().endswith(IMAGE_EXTS)
+        return self.set_image(path) if as_image else self.set_files(path)
+
+    def _timed(self, op: str, value: str) -> float:
+        start = time.perf_counter()
+        with self._lock:
+            self._write(op, value)
+        elapsed = time.perf_counter() - start
+        self.stats["writes"] += 1
+        self.stats["seconds"] += elapsed
+        return elapsed
+
+    @abstractmethod
+    def _write(self, op: str, value: str):
+        """写入剪贴板"""
+
+    def close(self):
+        pass
+
+
+class MemoryClipboard(ClipboardEngine):
+    """只记录最后一次写入的 (op, value)"""
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self.content = None
+
+    def _write(self, op: str, value: str):
+        if op != "text" and not os.path.isfile(value):
+            raise FileNotFoundError(value)
+        self.content = (op, value)
+
+
+class PowerShellClipboard(ClipboardEngine):
+    """常驻 PowerShell 进程：逐行发送 JSON 请求，进程挂掉或超时后下次写入时重启"""
+
+    name = "powershell"
+
+    def __init__(self, timeout: float = 10.0):
+        super().__init__()
+        self.timeout = timeout
+        self._proc: Optional[subprocess.Popen] = None
+        self._replies: "queue.Queue[str]" = queue.Queue()
+
+    def _ensure_started(self):
+        if self._proc is not None and self._proc.poll() is None:
+            return
+        start = time.perf_counter()
+        self._proc = subprocess.Popen(
+            ['powershell', '-NoProfile', '-STA', '-ExecutionPolicy', 'Bypass',
+             '-File', PS_SCRIPT_PATH, '-Serve'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8', bufsize=1,
+        )
+        self._replies = queue.Queue()
+        threading.Thread(target=self._read_replies, args=(self._proc, self._replies),
+                         daemon=True, name="clipboard-helper").start()
+        logger.info(f"Clipboard helper started (pid={self._proc.pid}, {time.perf_counter() - start:.3f}s)")
+
+    @staticmethod
+    def _read_replies(proc: subprocess.Popen, replies: "queue.Queue[str]"):
+        for line in proc.stdout:
+            replies.put(line.strip())
+
+    def _write(self, op: str, value: str):
+        self._ensure_started()
+        self._proc.stdin.write(json.dumps({"op": op, "value": value}, ensure_ascii=False) + "\n")
+        self._proc.stdin.flush()
+        try:
+            reply = self._replies.get(timeout=self.timeout)
+        except queue.Empty:
+            self.close()
+            raise TimeoutError(f"Clipboard helper timed out after {self.timeout}s")
+        if reply != "OK":
+            raise RuntimeError(f"Clipboard helper: {reply}")
+
+    def close(self):
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+                self._proc.wait(timeout=2)
+            except Exception:
+                self._proc.kill()
+            self._proc = None
+
+
+class NativeClipboard(ClipboardEngine):
+    """win32clipboard 进程内写入；失败时转交 PowerShellClipboard"""
+
+    name = "native"
+
+    def __init__(self, fallback: Optional[ClipboardEngine] = None, open_retries: int = 10):
+        super().__init__()
+        self.fallback = fallback
+        self.open_retries = open_retries
+        self._drop_effect_format = None
+
+    def _write(self, op: str, value: str):
+        try:
+            if op == "text":
+                payload = [(13, value)]  # CF_UNICODETEXT
+            elif op == "files":
+                payload = self._hdrop_payload(value)
+            else:
+                payload = [(8, _dib_bytes(value))]  # CF_DIB
+            self._set(payload)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            logger.warning(f"Native clipboard write failed ({op}: {e}), using helper process")
+            self.stats["fallbacks"] += 1
+            self.fallback._write(op, value)
+
+    def _hdrop_payload(self, path: str) -> list:
+        import win32clipboard
+        if not os.path.isfile(path):
+            raise FileNotFoundError(path)
+        if self._drop_effect_format is None:
+            self._drop_effect_format = win32clipboard.RegisterClipboardFormat("Preferred DropEffect")
+        # DROPFILES 头（pFiles=20, fWide=1）+ 双 \0 结尾的 UTF-16 路径列表
+        files = (os.path.abspath(path) + "\0\0").encode("utf-16-le")
+        dropfiles = struct.pack("<IiiII", 20, 0, 0, 0, 1) + files
+        return [(15, dropfiles),  # CF_HDROP
+                (self._drop_effect_format, struct.pack("<I", 1))]  # DROPEFFECT_COPY
+
+    def _set(self, payload: list):
+        import win32clipboard
+        # 其他进程占用剪贴板时 OpenClipboard 会失败，短暂重试
+        for attempt in range(self.open_retries):
+            try:
+                win32clipboard.OpenClipboard()
+                break
+            except Exception:
+                if attempt == self.open_retries - 1:
+                    raise
+                time.sleep(0.02)
+        try:
+            win32clipboard.EmptyClipboard()
+            for fmt, data in payload:
+                win32clipboard.SetClipboardData(fmt, data)
+        finally:
+            win32clipboard.CloseClipboard()
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+
+
+def _dib_bytes(path: str) -> bytes:
+    """图片 → CF_DIB 数据（BMP 去掉 14 字节文件头）"""
+    from PIL import Image
+    with Image.open(path) as img:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format="BMP")
+    return buf.getvalue()[14:]
+
+
+_clipboard: Optional[ClipboardEngine] = None
+
+
+def create_clipboard(name: str) -> ClipboardEngine:
+    """按名称创建引擎；非 Windows 一律用 MemoryClipboard"""
+    name = (name or "native").lower()
+    if sys.platform != "win32" and name != "memory":
+        logger.info(f"Clipboard engine '{name}' unavailable on {sys.platform}, using memory clipboard")
+        name = "memory"
+    if name == "memory":
+        return MemoryClipboard()
+    if name == "powershell":
+        return PowerShellClipboard()
+    if name != "native":
+        logger.warning(f"Unknown clipboard engine '{name}', using native")
+    try:
+        import win32clipboard  # noqa: F401
+    except ImportError:
+        logger.warning("win32clipboard not available, using PowerShell helper")
+        return PowerShellClipboard()
+    return NativeClipboard(fallback=PowerShellClipboard())
+
+
+def get_clipboard() -> ClipboardEngine:
+    """进程级单例（CUA_CLIPBOARD_ENGINE 选择）"""
+    global _clipboard
+    if _clipboard is None:
+        import config
+        _clipboard = create_clipboard(config.CLIPBOARD_ENGINE)
+        logger.info(f"Clipboard engine: {_clipboard.name}")
+    return _clipboard
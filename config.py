@@ -16,7 +16,7 @@ VLLM_MODEL_NAME = "opencua-7b"
 
 # FastAPI 配置
 FASTAPI_HOST = "0.0.0.0"
-FASTAPI_PORT = 8100
+FASTAPI_PORT = int(os.getenv("CUA_PORT", "8100"))
 
 # API 认证配置（必须从环境变量读取）
 API_KEY = os.getenv("CUA_API_KEY")
@@ -40,8 +40,12 @@ TOP_P = 0.9
 TEMPERATURE = 0.0
 
 # 超时配置
-STEP_TIMEOUT = 60  # 单步超时（秒）
+STEP_TIMEOUT = float(os.getenv("CUA_STEP_TIMEOUT", "60"))  # 单步预算（秒），按 STEP_BUDGET_SHARES 分给各阶段
+# 各阶段份额：进入阶段时按它与其后阶段的份额比例分配本步剩余时间
+STEP_BUDGET_SHARES = os.getenv("CUA_STEP_BUDGET_SHARES", "context=0.1,omniparser=0.2,llm=0.5,execute=0.2")
 TASK_TIMEOUT = 1800  # 任务总超时（秒）
+# /stop 后等待被丢弃的线程调用（截图解析、动作）结束的上限（秒），之后才开始下一个任务
+STOP_DRAIN_TIMEOUT = float(os.getenv("CUA_STOP_DRAIN_TIMEOUT", "10"))
 
 # OmniParser 配置
 OMNIPARSER_ENABLED = os.getenv("CUA_OMNIPARSER_ENABLED", "true").lower() == "true"
@@ -49,11 +53,83 @@ OMNIPARSER_URL = os.getenv("CUA_OMNIPARSER_URL", "http://10.0.0.1:8001")
 
 # SoM 配置
 SOM_MAX_ELEMENTS = int(os.getenv("CUA_SOM_MAX_ELEMENTS", "40"))
+SOM_TRACKING = os.getenv("CUA_SOM_TRACKING", "true").lower() == "true"  # 跨帧持久元素 id
+SOM_IN_PROMPT = os.getenv("CUA_SOM_IN_PROMPT", "true").lower() == "true"  # 元素清单写入 Claude prompt
+SOM_DELTA_ENABLED = os.getenv("CUA_SOM_DELTA", "true").lower() == "true"  # 增量元素清单
+SOM_DELTA_ANCHOR_EVERY = int(os.getenv("CUA_SOM_DELTA_ANCHOR_EVERY", "5"))  # 每 N 步重发完整清单
 
 # 动作重试配置
 ACTION_RETRY_ENABLED = os.getenv("CUA_ACTION_RETRY", "true").lower() == "true"
 ACTION_RETRY_MAX = int(os.getenv("CUA_ACTION_RETRY_MAX", "3"))
 ACTION_CHANGE_THRESHOLD = float(os.getenv("CUA_ACTION_CHANGE_THRESHOLD", "0.02"))
 
+# 动作后等待：按 (应用, 动作类型) 学习画面稳定时间（关闭时固定等 SETTLE_DEFAULT 秒）
+SETTLE_ADAPTIVE = os.getenv("CUA_SETTLE_ADAPTIVE", "true").lower() == "true"
+SETTLE_DEFAULT = float(os.getenv("CUA_SETTLE_DEFAULT", "1.0"))  # 样本不足时的等待
+SETTLE_MIN = float(os.getenv("CUA_SETTLE_MIN", "0.2"))
+SETTLE_MAX = float(os.getenv("CUA_SETTLE_MAX", "5.0"))
+SETTLE_PERCENTILE = float(os.getenv("CUA_SETTLE_PERCENTILE", "90"))
+SETTLE_DELAY_PATH = os.getenv("CUA_SETTLE_DELAY_PATH",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "settle_delays.json"))
+
+# 执行器：已校验+编译的动作代码 LRU 缓存大小
+EXECUTOR_CODE_CACHE_SIZE = int(os.getenv("CUA_EXECUTOR_CODE_CACHE_SIZE", "256"))
+
+# 执行器后端：desktop（pyautogui + Win32）/ recording（只校验、计时、记录，不操作桌面）
+EXECUTOR_BACKEND = os.getenv("CUA_EXECUTOR_BACKEND", "desktop")
+RECORDING_LATENCY_MS = float(os.getenv("CUA_RECORDING_LATENCY_MS", "0"))  # recording 模拟每个动作耗时
+
+# 无桌面回放：截图循环回放该目录下的 PNG，窗口信息为固定值，跳过任务前的窗口准备
+REPLAY_FRAMES_DIR = os.getenv("CUA_REPLAY_FRAMES", "")
+REPLAY_APP = os.getenv("CUA_REPLAY_APP", "unknown")  # 回放时上报的前台应用
+HEADLESS = bool(REPLAY_FRAMES_DIR)
+
+# 键盘输入引擎：postmessage（Hyper-V 唯一可靠）/ sendinput / null（非 Windows 自动使用）
+INPUT_ENGINE = os.getenv("CUA_INPUT_ENGINE", "postmessage")
+# settle/hold 默认保持 Hyper-V 上调好的 50ms；更短的间隔（如 10ms）需在 VM 上验证后再通过环境变量开启
+INPUT_SETTLE_MS = float(os.getenv("CUA_INPUT_SETTLE_MS", "50"))  # attach+聚焦后等待
+INPUT_HOLD_MS = float(os.getenv("CUA_INPUT_HOLD_MS", "50"))  # 组合键按下与抬起之间
+INPUT_SPACING_MS = float(os.getenv("CUA_INPUT_SPACING_MS", "0"))  # 相邻按键消息之间
+
+# 剪贴板引擎：native（win32clipboard，失败时常驻 PowerShell 兜底）/ powershell / memory（非 Windows 自动使用）
+CLIPBOARD_ENGINE = os.getenv("CUA_CLIPBOARD_ENGINE", "native")
+
+# 多动作宏：一次 LLM 调用输出动作数组，动作间用缩略图差异做稳定检查
+MACRO_MAX_ACTIONS = int(os.getenv("CUA_MACRO_MAX_ACTIONS", "4"))  # <=1 关闭
+MACRO_SETTLE_DELAY = float(os.getenv("CUA_MACRO_SETTLE_DELAY", "0.3"))  # 动作间等待（秒）
+MACRO_ABORT_THRESHOLD = float(os.getenv("CUA_MACRO_ABORT_THRESHOLD", "0.25"))  # 缩略图变化超过此比例中止
+
 # DPI 缩放（0 = 自动检测）
 DPI_SCALE = float(os.getenv("CUA_DPI_SCALE", "0"))
+
+# 任务队列：有任务运行时新任务排队（按优先级，同优先级按客户端轮转），队列满返回 429
+QUEUE_MAX_DEPTH = int(os.getenv("CUA_QUEUE_MAX_DEPTH", "20"))
+QUEUE_DEFAULT_TASK_SECONDS = float(os.getenv("CUA_QUEUE_DEFAULT_TASK_SECONDS", "60"))  # 无历史时的预计任务耗时
+
+# 运行模式：agent（驱动本机桌面）/ coordinator（把任务分发给多个 agent worker）
+MODE = os.getenv("CUA_MODE", "agent")
+# coordinator：worker 列表，逗号分隔，"名称=URL" 或直接 URL（也可运行时 POST /workers 注册）
+WORKERS = [w.strip() for w in os.getenv("CUA_WORKERS", "").split(",") if w.strip()]
+WORKER_API_KEY = os.getenv("CUA_WORKER_API_KEY", "") or API_KEY  # 调用 worker 的 Bearer key
+WORKER_HEALTH_INTERVAL = float(os.getenv("CUA_WORKER_HEALTH_INTERVAL", "5"))  # 健康检查间隔（秒）
+WORKER_UNHEALTHY_AFTER = int(os.getenv("CUA_WORKER_UNHEALTHY_AFTER", "2"))  # 连续失败几次标记不可用
+
+# 任务持久化：SQLite（WAL）任务库，内存只保留最近 MAX_TASKS 个任务（空字符串关闭持久化）
+TASK_STORE_PATH = os.getenv("CUA_TASK_STORE",
+                            os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tasks.db"))
+TASK_RETENTION_DAYS = float(os.getenv("CUA_TASK_RETENTION_DAYS", "30"))  # 已结束任务保留天数
+TASK_RETENTION_MAX = int(os.getenv("CUA_TASK_RETENTION_MAX", "10000"))  # 最多保留已结束任务数
+
+# 任务事件流（GET /task/{id}/events，SSE）：每个任务缓冲最近多少条事件供断线重连补发
+EVENT_BUFFER_SIZE = int(os.getenv("CUA_EVENT_BUFFER_SIZE", "256"))
+SSE_HEARTBEAT = float(os.getenv("CUA_SSE_HEARTBEAT", "15"))  # 无事件时 keep-alive 注释间隔（秒）
+
+# 截图接口：直接返回截图流水线的最新帧；空闲时比 FRAME_MAX_AGE 秒更旧才重新截图（请求可用 max_age 覆盖）
+FRAME_MAX_AGE = float(os.getenv("CUA_FRAME_MAX_AGE", "2.0"))
+FRAME_JPEG_QUALITY = int(os.getenv("CUA_FRAME_JPEG_QUALITY", "80"))
+
+# 投机规划：点击/滚动后画面稳定即并行发起下一步 LLM 预测和动作效果检测，效果检测触发重试时丢弃预测（仅 Claude 后端）
+SPECULATIVE_PLANNING = os.getenv("CUA_SPECULATIVE_PLANNING", "false").lower() == "true"
+
+# 会话录制：每步的帧、上下文、LLM 请求/响应和动作写到该目录下的会话子目录（空为关闭），供 benchmarks.replay 回放
+RECORD_DIR = os.getenv("CUA_RECORD_DIR", "")
@@ -1,62 +1,182 @@
 """上下文管理器 - 整合窗口管理+截图+OmniParser+SoM"""
 import time
 import base64
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
 from loguru import logger
-from window_manager import WindowManager
+from window_manager import create_window_manager
 from screenshot import capture_screenshot
 from omniparser_service import OmniParserService
 from som_converter import SoMConverter, detect_dpi_scale
+from cancellation import NEVER, CancelToken, TaskCancelled
+from frame_cache import FrameCache
+from metrics import timed
 import config
 
 
 class ContextManager:
-    def __init__(self, use_omniparser: bool = False):
-        self.wm = WindowManager()
-        self.omniparser = OmniParserService() if use_omniparser else None
+    def __init__(self, use_omniparser: bool = False, frame_cache: Optional[FrameCache] = None):
+        self.wm = create_window_manager()
+        self.frame_cache = frame_cache  # 每次截图都放进最新帧缓存，供截图接口直接返回
+        anchor_every = config.SOM_DELTA_ANCHOR_EVERY if config.SOM_DELTA_ENABLED else 0
+        self.omniparser = OmniParserService(base_url=config.OMNIPARSER_URL) if use_omniparser else None
         self.som_converter = SoMConverter(
             screen_w=config.SCREEN_WIDTH,
             screen_h=config.SCREEN_HEIGHT,
             dpi_scale=config.DPI_SCALE if config.DPI_SCALE > 0 else detect_dpi_scale(),
+            track=config.SOM_TRACKING,
+            delta_anchor_every=anchor_every,
         ) if use_omniparser else None
+        # 动作后预取用的后台解析线程（单线程：一次只解析一帧）
+        self._parse_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="omniparser")
 
-    def get_context(self) -> dict:
+    def reset(self):
+        """新任务开始时清空跨帧状态（元素跟踪、增量清单锚点）"""
+        if self.som_converter:
+            self.som_converter.reset()
+
+    def get_context(self, track: bool = True, cancel: Optional[CancelToken] = None) -> dict:
+        """track=False 时只计算元素变化、不推进跟踪/增量清单状态（动作效果检测用）；
+        cancel 被取消时抛 TaskCancelled，且不推进跟踪状态"""
+        cancel = cancel or NEVER
+        frame = self.capture()
+        cancel.raise_if_cancelled()
+        elements = self._parse(frame, timeout=cancel.timeout(self.omniparser.timeout)) if self.omniparser else []
+        cancel.raise_if_cancelled()
+        return self._build_context(frame, elements, track)
+
+    def capture(self) -> dict:
+        """截图 + 窗口信息（不含 OmniParser）；各阶段耗时记在 frame["_timings"]"""
         start = time.time()
+        timings = {}
 
         # 截图
-        screenshot_bytes, screenshot_scale = capture_screenshot(max_width=config.SCREENSHOT_MAX_WIDTH)
-        screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
+        screenshot_bytes, screenshot_scale = capture_screenshot(max_width=config.SCREENSHOT_MAX_WIDTH,
+                                                                timings=timings)
+        if self.frame_cache is not None:
+            self.frame_cache.put(screenshot_bytes, screenshot_scale, start)
+        with timed(timings, "encode"):
+            screenshot_b64 = base64.b64encode(screenshot_bytes).decode()
 
         # 窗口信息
-        active_window = self.wm.get_active_window()
-        active_app = self.wm.detect_app()
+        with timed(timings, "windows"):
+            active_window = self.wm.get_active_window()
+            active_app = self.wm.detect_app()
+            window_list = self.wm.list_windows()
+
+        return {
+            "screenshot_bytes": screenshot_bytes,
+            "screenshot_base64": screenshot_b64,
+            "active_window": active_window,
+            "active_app": active_app,
+            "window_list": window_list,
+            "screenshot_scale": screenshot_scale,
+            "_captured_at": start,
+            "_timings": timings,
+        }
+
+    def _parse(self, frame: dict, timeout: Optional[float] = None) -> list:
+        """OmniParser 解析，耗时计入帧的 omniparser 阶段（后台线程调用时也记在同一帧上）"""
+        with timed(frame["_timings"], "omniparser"):
+            return self.omniparser.parse(frame["screenshot_bytes"], timeout=timeout)
+
+    def prefetch(self) -> "PendingContext":
+        """动作后预取：立即截图，OmniParser 在后台线程解析；
+        调用方先用 pending.frame 做效果检测，再用 resolve() 得到下一步的上下文"""
+        frame = self.capture()
+        future = None
+        if self.omniparser:
+            future = self._parse_pool.submit(self._parse, frame)
+        return PendingContext(frame, future)
+
+    def resolve(self, pending: "PendingContext", track: bool = True,
+                cancel: Optional[CancelToken] = None) -> dict:
+        """等待后台解析完成，生成完整上下文（SoM 转换/跟踪在调用线程做，保证跟踪状态顺序）；
+        cancel 被取消时抛 TaskCancelled，且不推进跟踪状态"""
+        cancel = cancel or NEVER
+        elements = pending.elements(cancel)
+        cancel.raise_if_cancelled()
+        return self._build_context(pending.frame, elements, track)
+
+    def peek_element_diff(self, pending: "PendingContext", cancel: Optional[CancelToken] = None):
+        """预取帧相对上一步的元素变化（等待解析，但不推进跟踪状态）"""
+        elements = pending.elements(cancel)
+        if not self.som_converter or not elements:
+            return None
+        table = self.som_converter.convert_table(elements, max_elements=config.SOM_MAX_ELEMENTS)
+        return self.som_converter.track(table, commit=False)
+
+    def _build_context(self, frame: dict, omniparser_elements: list, track: bool) -> dict:
+        timings = dict(frame["_timings"])  # 同一帧可能先做效果检测再定稿，各自计 SoM 耗时
+        som_start = time.perf_counter()
 
         # OmniParser UI元素检测
-        omniparser_elements = []
         omniparser_text = ""
-        if self.omniparser:
-            omniparser_elements = self.omniparser.parse(screenshot_bytes)
+        if self.omniparser and omniparser_elements:
             omniparser_text = self.omniparser.format_for_prompt(omniparser_elements)
 
         # SoM 转换
+        # SoMTable 按行访问即 SoMElement，不预先实例化整张列表
         som_elements = []
         som_text = ""
+        som_anchor_text = ""
+        som_text_mode = "full"
+        som_diff = None
         if self.som_converter and omniparser_elements:
-            som_elements = self.som_converter.convert(omniparser_elements, max_elements=config.SOM_MAX_ELEMENTS)
-            som_text = self.som_converter.format_for_claude(som_elements)
+            som_elements = self.som_converter.convert_table(omniparser_elements, max_elements=config.SOM_MAX_ELEMENTS)
+            som_diff = self.som_converter.track(som_elements, commit=track)
+            som_text = self.som_converter.format_for_claude(som_elements, delta=track)
+            som_text_mode = self.som_converter.last_format_mode
+            if track and self.som_converter.delta_enabled:
+                som_anchor_text = self.som_converter.anchor_text
 
-        ctx = {
-            "screenshot_bytes": screenshot_bytes,
-            "screenshot_base64": screenshot_b64,
-            "active_window": active_window,
-            "active_app": active_app,
-            "window_list": self.wm.list_windows(),
+        ctx = {k: v for k, v in frame.items() if not k.startswith("_")}
+        ctx.update({
             "omniparser_elements": omniparser_elements,
             "omniparser_text": omniparser_text,
-            "screenshot_scale": screenshot_scale,
             "som_elements": som_elements,
             "som_text": som_text,
-        }
+            "som_text_mode": som_text_mode,
+            "som_anchor_text": som_anchor_text,
+            "som_diff": som_diff,
+        })
+        if self.som_converter and omniparser_elements:
+            timings["som"] = time.perf_counter() - som_start
+        ctx["timings"] = timings
 
-        elapsed = (time.time() - start) * 1000
-        logger.info(f"Context collected in {elapsed:.0f}ms | app={active_app} | elements={len(omniparser_elements)}")
+        elapsed = (time.time() - frame["_captured_at"]) * 1000
+        logger.info(f"Context collected in {elapsed:.0f}ms | app={ctx['active_app']} | elements={len(omniparser_elements)}")
         return ctx
+
+
+class PendingContext:
+    """已截图、OmniParser 仍在后台解析中的上下文"""
+
+    def __init__(self, frame: dict, future: Optional[Future] = None):
+        self.frame = frame
+        self._future = future
+
+    def elements(self, cancel: Optional[CancelToken] = None) -> list:
+        """等待解析结果；cancel 被取消时立即抛 TaskCancelled 并放弃这一帧；
+        cancel 带截止时间时最多等到截止，超时按无元素处理"""
+        if self._future is None:
+            return []
+        cancel = cancel or NEVER
+        remaining = cancel.remaining()
+        try:
+            return cancel.wait_future(self._future, timeout=None if remaining is None else max(0.0, remaining))
+        except TaskCancelled:
+            self.discard()
+            raise
+        except FutureTimeout:
+            logger.warning("OmniParser parse exceeded step budget, continuing without elements")
+            self.discard()
+            return []
+        except Exception as e:
+            logger.warning(f"Prefetched OmniParser parse failed: {e}")
+            return []
+
+    def discard(self):
+        """帧已过期（例如效果检测触发了重试）：尽量取消后台解析"""
+        if self._future is not None:
+            self._future.cancel()
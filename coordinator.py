@@ -0,0 +1,379 @@
+"""协调器模式 — 把任务分发给多个 agent worker（每个是跑在独立桌面上的 main.py）
+
+- worker 注册：CUA_WORKERS 启动时注册，或运行时 POST /workers
+- 健康检查：定期请求 worker 的 GET /queue，得到运行中任务和排队深度；连续失败标记不可用
+- 调度：会话粘滞优先（session_id，或从 prompt 推断的应用，例如微信登录在固定 VM 上），
+  否则选负载（运行中 + 排队 + 上次检查后已分发）最小的健康 worker；worker 返回 429 或不可达时换下一个
+- 代理：/task/{id} 相关请求按 task_id 转发到创建它的 worker（/events 的 SSE 流逐块转发）
+- 批次：POST /tasks/batch 整批发给同一个 worker（在同一桌面会话上连续执行），批次和其中每个任务都记路由
+
+用法: CUA_MODE=coordinator CUA_WORKERS=vm1=http://10.0.0.11:8100,vm2=http://10.0.0.12:8100 python main.py
+"""
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, Security
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from loguru import logger
+from pydantic import BaseModel, Field
+
+import config
+
+# prompt 关键词 → 绑定登录会话的应用（同一应用的任务粘到同一台 worker，复用其登录会话）；
+# 浏览器等不依赖登录的应用不粘滞，按负载分发
+APP_KEYWORDS = {
+    "wechat": ("微信", "wechat"),
+}
+
+
+def _keyword_pattern(keyword: str) -> str:
+    """英文关键词按词边界匹配（"edge" 不匹配 "knowledge"），中文关键词按子串匹配"""
+    if keyword.isascii():
+        return rf"(?<![a-z0-9_]){re.escape(keyword)}(?![a-z0-9_])"
+    return re.escape(keyword)
+
+
+APP_PATTERNS = {app_name: re.compile("|".join(_keyword_pattern(k) for k in keywords))
+                for app_name, keywords in APP_KEYWORDS.items()}
+
+MAX_ROUTES = 1000  # 记住最近多少个 task_id / batch_id → worker 映射
+RELAY_HEADERS = ("etag", "cache-control", "x-captured-at", "x-task-status")  # 转发 worker 响应时保留的头
+
+
+@dataclass
+class Worker:
+    name: str
+    url: str
+    healthy: bool = False
+    running: Optional[str] = None  # worker 上正在运行的 task_id
+    depth: int = 0  # worker 排队深度
+    pending: int = 0  # 上次健康检查后分发过去的任务数
+    failures: int = 0
+    dispatched: int = 0
+    last_check: float = 0.0
+    latency_ms: Optional[float] = None
+
+    @property
+    def load(self) -> int:
+        return (1 if self.running else 0) + self.depth + self.pending
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "url": self.url, "healthy": self.healthy, "load": self.load,
+            "running": self.running, "depth": self.depth, "dispatched": self.dispatched,
+            "failures": self.failures, "last_check": self.last_check, "latency_ms": self.latency_ms,
+        }
+
+
+class WorkerPool:
+    def __init__(self, api_key: str, unhealthy_after: int = 2):
+        self.api_key = api_key
+        self.unhealthy_after = unhealthy_after
+        self.workers: Dict[str, Worker] = {}
+        self.sticky: Dict[str, str] = {}  # 会话 key → worker 名称
+        self.routes: "OrderedDict[str, str]" = OrderedDict()  # task_id → worker 名称
+        self.client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def register(self, url: str, name: Optional[str] = None) -> Worker:
+        url = url.rstrip("/")
+        name = name or url.split("://", 1)[-1]
+        self.workers[name] = Worker(name=name, url=url)
+        logger.info(f"Worker registered: {name} -> {url}")
+        return self.workers[name]
+
+    def unregister(self, name: str) -> bool:
+        self.sticky = {k: v for k, v in self.sticky.items() if v != name}
+        return self.workers.pop(name, None) is not None
+
+    async def check(self, worker: Worker):
+        start = time.perf_counter()
+        try:
+            resp = await self.client.get(f"{worker.url}/queue", headers=self.headers, timeout=3)
+            resp.raise_for_status()
+            data = resp.json()
+            worker.running, worker.depth = data.get("running"), data.get("depth", 0)
+            worker.pending = 0
+            worker.failures = 0
+            if not worker.healthy:
+                logger.info(f"Worker {worker.name} is healthy")
+            worker.healthy = True
+            worker.latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        except Exception as e:
+            self.mark_failure(worker, e)
+        worker.last_check = time.time()
+
+    def mark_failure(self, worker: Worker, error):
+        worker.failures += 1
+        if worker.healthy and worker.failures >= self.unhealthy_after:
+            logger.warning(f"Worker {worker.name} marked unhealthy: {error}")
+            worker.healthy = False
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(w) for w in list(self.workers.values())))
+
+    async def health_loop(self, interval: float):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(interval)
+
+    def pick(self, session_key: Optional[str] = None, exclude: tuple = ()) -> Optional[Worker]:
+        """粘滞会话所在 worker 健康则用它，否则选负载最小的健康 worker"""
+        if session_key and session_key in self.sticky:
+            worker = self.workers.get(self.sticky[session_key])
+            if worker and worker.healthy and worker.name not in exclude:
+                return worker
+        candidates = [w for w in self.workers.values() if w.healthy and w.name not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda w: (w.load, w.dispatched, w.name))
+
+    def assign(self, task_id: str, worker: Worker, session_key: Optional[str], aliases: tuple = ()):
+        """记录分发；aliases 为同一条目下也要路由到该 worker 的 ID（批次里的各任务）"""
+        worker.pending += 1
+        worker.dispatched += 1
+        if session_key:
+            self.sticky[session_key] = worker.name
+        for key in (task_id, *aliases):
+            self.routes[key] = worker.name
+        while len(self.routes) > MAX_ROUTES:
+            self.routes.popitem(last=False)
+
+    def route(self, task_id: str) -> Worker:
+        name = self.routes.get(task_id)
+        if name is None or name not in self.workers:
+            raise HTTPException(status_code=404, detail="Task not found")
+        return self.workers[name]
+
+
+def session_key(body: dict) -> Optional[str]:
+    """粘滞 key：显式 session_id 优先，否则按 prompt（批次取第一个任务的）推断应用"""
+    if body.get("session_id"):
+        return f"session:{body['session_id']}"
+    if body.get("tasks"):
+        body = body["tasks"][0] or {}
+    prompt = (body.get("prompt") or "").lower()
+    for app_name, pattern in APP_PATTERNS.items():
+        if pattern.search(prompt):
+            return f"app:{app_name}"
+    return None
+
+
+def _relay(resp: httpx.Response) -> Response:
+    headers = {k: resp.headers[k] for k in RELAY_HEADERS if k in resp.headers}
+    if resp.headers.get("content-type", "").startswith("application/json"):
+        return JSONResponse(status_code=resp.status_code, content=resp.json(), headers=headers)
+    return Response(status_code=resp.status_code, content=resp.content,
+                    media_type=resp.headers.get("content-type"), headers=headers)
+
+
+app = FastAPI(title="Computer Use Agent Coordinator", version="1.0.0")
+pool = WorkerPool(api_key=config.WORKER_API_KEY, unhealthy_after=config.WORKER_UNHEALTHY_AFTER)
+_health_task: Optional[asyncio.Task] = None
+
+security = HTTPBearer()
+
+
+def verify_api_key(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
+    """验证 API Key"""
+    if credentials.credentials != config.API_KEY:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid API Key",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return credentials.credentials
+
+
+class WorkerRequest(BaseModel):
+    url: str = Field(..., max_length=500)
+    name: Optional[str] = Field(default=None, max_length=100)
+
+
+@app.on_event("startup")
+async def startup_event():
+    global _health_task
+    pool.client = httpx.AsyncClient(timeout=30)
+    for entry in config.WORKERS:
+        name, _, url = entry.rpartition("=")
+        pool.register(url, name or None)
+    await pool.check_all()
+    _health_task = asyncio.create_task(pool.health_loop(config.WORKER_HEALTH_INTERVAL))
+    logger.info(f"Coordinator started with {len(pool.workers)} workers")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if _health_task:
+        _health_task.cancel()
+    if pool.client:
+        await pool.client.aclose()
+
+
+@app.post("/task")
+async def create_task(request: Request, api_key: str = Depends(verify_api_key)):
+    """按粘滞会话 / 最小负载选 worker 并转发；worker 队列满或不可达时换下一个"""
+    body = await request.json()
+    return await _submit("/task", body, "task_id")
+
+
+@app.post("/tasks/batch")
+async def create_batch(request: Request, api_key: str = Depends(verify_api_key)):
+    """整个批次发给同一个 worker"""
+    body = await request.json()
+    return await _submit("/tasks/batch", body, "batch_id")
+
+
+async def _submit(path: str, body: dict, id_field: str):
+    """选 worker 提交任务或批次，记录路由（批次里的 task_id 也路由到同一 worker）"""
+    key = session_key(body)
+    tried = ()
+    last_resp = None
+    while True:
+        worker = pool.pick(key, exclude=tried)
+        if worker is None:
+            break
+        tried += (worker.name,)
+        try:
+            resp = await pool.client.post(f"{worker.url}{path}", json=body, headers=pool.headers)
+        except httpx.HTTPError as e:
+            logger.warning(f"Worker {worker.name} unreachable: {e}")
+            pool.mark_failure(worker, e)
+            continue
+        if resp.status_code == 429:
+            last_resp = resp
+            continue
+        if resp.status_code != 200:
+            return _relay(resp)
+        data = resp.json()
+        pool.assign(data[id_field], worker, key, aliases=tuple((data.get("tasks") or {}).values()))
+        logger.info(f"{path} {data[id_field]} -> worker {worker.name} (session={key}, load={worker.load})")
+        return {**data, "worker": worker.name}
+    if last_resp is not None:
+        raise HTTPException(status_code=429, detail="All workers are at queue capacity",
+                            headers={"Retry-After": last_resp.headers.get("Retry-After", "60")})
+    raise HTTPException(status_code=503, detail="No healthy workers")
+
+
+async def _proxy(method: str, task_id: str, path: str = "", request: Optional[Request] = None) -> Response:
+    """转发到任务所在 worker：查询参数和 If-None-Match 原样带上，POST 带 JSON body"""
+    worker = pool.route(task_id)
+    body = await request.json() if request is not None and method == "POST" else None
+    headers = dict(pool.headers)
+    params = None
+    if request is not None:
+        params = request.query_params
+        if "if-none-match" in request.headers:
+            headers["If-None-Match"] = request.headers["if-none-match"]
+    try:
+        resp = await pool.client.request(method, f"{worker.url}/task/{task_id}{path}",
+                                         json=body, params=params, headers=headers)
+    except httpx.HTTPError as e:
+        pool.mark_failure(worker, e)
+        raise HTTPException(status_code=502, detail=f"Worker {worker.name} unreachable: {e}")
+    return _relay(resp)
+
+
+@app.get("/tasks/batch/{batch_id}")
+async def get_batch_status(batch_id: str, api_key: str = Depends(verify_api_key)):
+    worker = pool.route(batch_id)
+    try:
+        resp = await pool.client.get(f"{worker.url}/tasks/batch/{batch_id}", headers=pool.headers)
+    except httpx.HTTPError as e:
+        pool.mark_failure(worker, e)
+        raise HTTPException(status_code=502, detail=f"Worker {worker.name} unreachable: {e}")
+    return _relay(resp)
+
+
+@app.get("/task/{task_id}")
+async def get_task_status(task_id: str, request: Request, api_key: str = Depends(verify_api_key)):
+    return await _proxy("GET", task_id, request=request)
+
+
+@app.get("/task/{task_id}/events")
+async def stream_task_events(task_id: str, last_event_id: Optional[str] = Header(default=None),
+                             api_key: str = Depends(verify_api_key)):
+    """SSE 事件流逐块转发"""
+    worker = pool.route(task_id)
+    headers = dict(pool.headers)
+    if last_event_id:
+        headers["Last-Event-ID"] = last_event_id
+    req = pool.client.build_request("GET", f"{worker.url}/task/{task_id}/events", headers=headers,
+                                    timeout=httpx.Timeout(30, read=None))
+    try:
+        resp = await pool.client.send(req, stream=True)
+    except httpx.HTTPError as e:
+        pool.mark_failure(worker, e)
+        raise HTTPException(status_code=502, detail=f"Worker {worker.name} unreachable: {e}")
+    if resp.status_code != 200:
+        await resp.aread()
+        await resp.aclose()
+        return _relay(resp)
+
+    async def relay():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        finally:
+            await resp.aclose()
+
+    return StreamingResponse(relay(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/task/{task_id}/stop")
+async def stop_task(task_id: str, api_key: str = Depends(verify_api_key)):
+    return await _proxy("POST", task_id, "/stop")
+
+
+@app.post("/task/{task_id}/confirm")
+async def confirm_task(task_id: str, request: Request, api_key: str = Depends(verify_api_key)):
+    return await _proxy("POST", task_id, "/confirm", request)
+
+
+@app.get("/task/{task_id}/screenshot")
+async def get_task_screenshot(task_id: str, request: Request, api_key: str = Depends(verify_api_key)):
+    return await _proxy("GET", task_id, "/screenshot", request)
+
+
+@app.get("/workers")
+async def list_workers(api_key: str = Depends(verify_api_key)) -> List[dict]:
+    return [w.to_dict() for w in pool.workers.values()]
+
+
+@app.post("/workers")
+async def register_worker(request: WorkerRequest, api_key: str = Depends(verify_api_key)):
+    worker = pool.register(request.url, request.name)
+    await pool.check(worker)
+    return worker.to_dict()
+
+
+@app.delete("/workers/{name}")
+async def unregister_worker(name: str, api_key: str = Depends(verify_api_key)):
+    if not pool.unregister(name):
+        raise HTTPException(status_code=404, detail="Worker not found")
+    return {"message": f"Worker {name} removed"}
+
+
+@app.get("/")
+async def root(api_key: str = Depends(verify_api_key)):
+    return {
+        "service": "Computer Use Agent Coordinator",
+        "version": "1.0.0",
+        "workers": len(pool.workers),
+        "healthy": sum(w.healthy for w in pool.workers.values()),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=config.FASTAPI_HOST, port=config.FASTAPI_PORT, log_level="info")
@@ -1,20 +1,51 @@
 param(
-    [Parameter(Mandatory=$true)]
     [string]$FilePath,
-    [switch]$AsImage
+    [switch]$AsImage,
+    # 常驻模式：从 stdin 逐行读取 JSON 请求 {"op": "files|image|text", "value": "..."}，每行回复 OK / ERR <原因>
+    [switch]$Serve
 )
 
 Add-Type -AssemblyName System.Windows.Forms
+Add-Type -AssemblyName System.Drawing
+
+function Set-ClipboardContent([string]$Op, [string]$Value) {
+    if ($Op -eq "image") {
+        $img = [System.Drawing.Image]::FromFile($Value)
+        try { [System.Windows.Forms.Clipboard]::SetImage($img) } finally { $img.Dispose() }
+    } elseif ($Op -eq "text") {
+        [System.Windows.Forms.Clipboard]::SetText($Value)
+    } else {
+        $file = New-Object System.Collections.Specialized.StringCollection
+        [void]$file.Add($Value)
+        [System.Windows.Forms.Clipboard]::SetFileDropList($file)
+    }
+}
+
+if ($Serve) {
+    [Console]::InputEncoding = [System.Text.Encoding]::UTF8
+    [Console]::OutputEncoding = [System.Text.Encoding]::UTF8
+    while ($null -ne ($line = [Console]::In.ReadLine())) {
+        try {
+            $req = $line | ConvertFrom-Json
+            Set-ClipboardContent $req.op $req.value
+            [Console]::Out.WriteLine("OK")
+        } catch {
+            [Console]::Out.WriteLine("ERR " + $_.Exception.Message)
+        }
+        [Console]::Out.Flush()
+    }
+    exit 0
+}
+
+if (-not $FilePath) {
+    Write-Error "FilePath is required"
+    exit 1
+}
 
 if ($AsImage) {
-    Add-Type -AssemblyName System.Drawing
-    $img = [System.Drawing.Image]::FromFile($FilePath)
-    [System.Windows.Forms.Clipboard]::SetImage($img)
-    $img.Dispose()
+    Set-ClipboardContent "image" $FilePath
     Write-Host "Image copied to clipboard: $FilePath"
 } else {
-    $file = New-Object System.Collections.Specialized.StringCollection
-    $file.Add($FilePath)
-    [System.Windows.Forms.Clipboard]::SetFileDropList($file)
+    Set-ClipboardContent "files" $FilePath
     Write-Host "File copied to clipboard: $FilePath"
 }
@@ -0,0 +1,149 @@
+"""动作后等待时间模型 — 按 (应用, 动作类型) 学习画面稳定所需时间
+
+每次动作后轮询灰度缩略图，直到连续两帧几乎不变，记录“画面稳定时刻”；
+下一次同类动作至少等待该组样本的滚动分位数（样本不足时用默认值），画面仍在变化则继续等到稳定或上限。
+样本持久化为 JSON，重启后继续使用。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+from cancellation import NEVER, CancelToken
+from screenshot import thumbnail_change
+
+
+class SettleDelayModel:
+    def __init__(self, path: Optional[str] = None, default_delay: float = 1.0,
+                 min_delay: float = 0.2, max_delay: float = 5.0, percentile: float = 90,
+                 window: int = 30, min_samples: int = 3, poll_interval: float = 0.1,
+                 stable_threshold: float = 0.005):
+        self.path = path
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.poll_interval = poll_interval
+        self.stable_threshold = stable_threshold  # 缩略图变化比例不超过此值视为稳定
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def _key(app: str, action_type: str) -> str:
+        return f"{app or 'unknown'}|{action_type}"
+
+    def delay(self, app: str, action_type: str) -> float:
+        """下一次该类动作的目标等待时间（秒）"""
+        with self._lock:
+            samples = list(self._samples.get(self._key(app, action_type), ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, _percentile(samples, self.percentile)))
+
+    def observe(self, app: str, action_type: str, seconds: float):
+        """记录一次观测到的稳定时间并持久化"""
+        with self._lock:
+            key = self._key(app, action_type)
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(round(seconds, 3))
+        self._save()
+
+    async def settle(self, app: str, action_type: str, frame_fn: Callable,
+                     cancel: Optional[CancelToken] = None) -> dict:
+        """
+        动作后等待画面稳定：至少等学到的延迟，之后画面仍在变化就继续轮询，最长 max_delay。
+
+        Args:
+            frame_fn: 返回灰度缩略图（numpy 数组）的无参函数，在线程池里调用
+            cancel: 取消令牌；取消时立即抛 TaskCancelled，本次观测不计入模型；
+                带截止时间时学到的延迟照常等满，预算只截断之后的继续轮询（被截断的观测不计入模型）
+
+        Returns:
+            {"target": 目标等待, "waited": 实际等待, "stable_after": 观测到的稳定时间（未稳定为 None）}
+        """
+        cancel = cancel or NEVER
+        target = self.delay(app, action_type)
+        remaining = cancel.remaining()
+        # 预算超支只记录不打断：至少等到 target，否则截到画面中途、后续效果检测全都失真
+        limit = self.max_delay if remaining is None else max(target, min(self.max_delay, remaining))
+        start = time.monotonic()
+        prev, prev_at = await cancel.run(frame_fn), 0.0
+        stable_since = None
+        while True:
+            await cancel.asleep(self.poll_interval)
+            frame = await cancel.run(frame_fn)
+            now = time.monotonic() - start
+            if thumbnail_change(prev, frame) <= self.stable_threshold:
+                if stable_since is None:
+                    stable_since = prev_at  # 上一帧起画面就没再变
+            else:
+                stable_since = None
+            prev, prev_at = frame, now
+            if (stable_since is not None and now >= target) or now >= limit:
+                break
+        waited = time.monotonic() - start
+        budget_cut = stable_since is None and limit < self.max_delay
+        if not budget_cut:
+            self.observe(app, action_type, stable_since if stable_since is not None else self.max_delay)
+        if stable_since is None:
+            logger.warning(f"Screen not stable after {waited:.2f}s ({app}/{action_type})"
+                           + (" (step budget exhausted)" if budget_cut else ""))
+        result = {"target": round(target, 3), "waited": round(waited, 3),
+                  "stable_after": None if stable_since is None else round(stable_since, 3)}
+        if budget_cut:
+            result["budget_cut"] = True
+        return result
+
+    def table(self) -> List[dict]:
+        """学到的延迟表（/settle-delays 返回）"""
+        with self._lock:
+            items = {k: list(v) for k, v in self._samples.items()}
+        rows = []
+        for key, samples in sorted(items.items()):
+            app, action_type = key.split("|", 1)
+            rows.append({
+                "app": app,
+                "action": action_type,
+                "samples": len(samples),
+                "p50": round(_percentile(samples, 50), 3),
+                f"p{self.percentile:g}": round(_percentile(samples, self.percentile), 3),
+                "delay": round(self.delay(app, action_type), 3),
+            })
+        return rows
+
+    def _load(self):
+        if not self.path or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            for key, samples in data.get("samples", {}).items():
+                self._samples[key] = deque(samples[-self.window:], maxlen=self.window)
+            logger.info(f"Loaded settle delays for {len(self._samples)} (app, action) pairs from {self.path}")
+        except Exception as e:
+            logger.warning(f"Failed to load settle delays from {self.path}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"samples": {k: list(v) for k, v in self._samples.items()}}
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save settle delays to {self.path}: {e}")
+
+
+def _percentile(samples: list, p: float) -> float:
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(round(p / 100 * (len(s) - 1))))]
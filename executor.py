@@ -4,13 +4,18 @@
 import ast
 import os
 import re
-import time
-import subprocess
-import pyautogui
-import pyperclip
-from win32_keyboard import send_hotkey as _win32_hotkey
+from collections import OrderedDict
+from types import CodeType, SimpleNamespace
+from cancellation import NEVER, CancelToken, TaskCancelled
+from screenshot import thumbnail_change
+from input_engine import VK_MAP, get_engine
+from clipboard_engine import IMAGE_EXTS
+from executor_backends import ExecutorBackend, create_backend
 from loguru import logger
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
+
+import config
+from llm.router import AgentAction, ActionType
 
 
 # pyautogui 白名单函数
@@ -32,18 +37,77 @@ ALLOWED_TIME_FUNCTIONS = {'sleep'}
 # 允许的 pyperclip 函数
 ALLOWED_PYPERCLIP_FUNCTIONS = {'copy', 'paste'}
 
+# exec 沙箱内可用的内置函数（每次执行复制一份，代码无法污染后续执行）
+SAFE_BUILTINS = {
+    # 只允许基本类型和操作
+    "int": int,
+    "float": float,
+    "str": str,
+    "bool": bool,
+    "list": list,
+    "dict": dict,
+    "tuple": tuple,
+    "range": range,
+    "len": len,
+    "min": min,
+    "max": max,
+    # 显式禁止危险函数
+    "__import__": None,
+    "eval": None,
+    "exec": None,
+    "compile": None,
+    "open": None,
+    "getattr": None,
+    "setattr": None,
+    "delattr": None,
+    "globals": None,
+    "locals": None,
+    "vars": None,
+}
+
+# 预编译的代码改写正则
+_SCROLL_RE = re.compile(r'(pyautogui\.scroll\()\s*([-+]?\d+)\s*\)')
+_HOTKEY_LIST_RE = re.compile(r"pyautogui\.hotkey\(\[([^\]]+)\]\)")
+_CTRL_V_RE = re.compile(r"pyautogui\.hotkey\(\s*['\"]ctrl['\"]\s*,\s*['\"]v['\"]\s*\)")
+_WRITE_MESSAGE_RE = re.compile(r"pyautogui\.write\(message=((?:'[^']*'|\"[^\"]*\"))\)")
+_WRITE_RE = re.compile(r"pyautogui\.(?:write|typewrite)\(((?:'[^']*'|\"[^\"]*\"))\)")
+
+
+class _PwaWrappedPyautogui:
+    """包装 pyautogui，让 hotkey/press 走 Win32 PostMessage"""
+
+    def __init__(self, executor: "SafeExecutor"):
+        self._executor = executor
+
+    def __getattr__(self, name):
+        return getattr(self._executor.backend.pyautogui, name)
+
+    def hotkey(self, *keys):
+        try:
+            self._executor._exec_pwa_hotkey(list(keys))
+            logger.info(f"hotkey via pywinauto: {keys}")
+        except Exception as e:
+            logger.warning(f"pywinauto hotkey failed ({e}), fallback")
+            self._executor.backend.pyautogui.hotkey(*keys)
+
+    def press(self, key):
+        try:
+            self._executor._exec_pwa_hotkey([key])
+        except Exception:
+            self._executor.backend.pyautogui.press(key)
+
 
 class SafeExecutor:
     """
     安全执行器，只允许执行白名单中的 pyautogui 函数
     """
 
-    def __init__(self, platform: str = "windows"):
+    def __init__(self, platform: str = "windows", backend: Optional[ExecutorBackend] = None):
         self.platform = platform.lower()
         # Windows 滚动缩放因子
         self.scroll_factor = 5 if self.platform == "windows" else 1
-        # 关闭 fail-safe（鼠标移到角落不中断）
-        pyautogui.FAILSAFE = False
+        # 桌面操作后端（默认按 CUA_EXECUTOR_BACKEND 创建；recording 不碰桌面）
+        self.backend = backend or create_backend()
         # pywinauto 前台窗口缓存
         self._pwa_app = None
         # 预加载剪贴板内容（用于中文等非ASCII文本粘贴）
@@ -56,48 +120,28 @@ class SafeExecutor:
         self._last_executed_code = None
         # 连续重复执行计数
         self._repeat_count = 0
-
-    # pyautogui key name → Win32 VK code
-    _VK_MAP = {
-        'ctrl': 0x11, 'shift': 0x10, 'alt': 0x12, 'win': 0x5B,
-        'enter': 0x0D, 'tab': 0x09, 'escape': 0x1B, 'esc': 0x1B,
-        'backspace': 0x08, 'delete': 0x2E, 'del': 0x2E, 'space': 0x20,
-        'up': 0x26, 'down': 0x28, 'left': 0x25, 'right': 0x27,
-        'home': 0x24, 'end': 0x23, 'pageup': 0x21, 'pagedown': 0x22,
-        'f1': 0x70, 'f2': 0x71, 'f3': 0x72, 'f4': 0x73, 'f5': 0x74,
-        'f6': 0x75, 'f7': 0x76, 'f8': 0x77, 'f9': 0x78, 'f10': 0x79,
-        'f11': 0x7A, 'f12': 0x7B,
-    }
+        # 已校验+编译的代码对象 LRU 缓存（key 为规范化后的代码；None 表示校验未通过）
+        self._code_cache: "OrderedDict[str, Optional[CodeType]]" = OrderedDict()
+        self._code_cache_size = config.EXECUTOR_CODE_CACHE_SIZE
+        self._code_cache_hits = 0
+        self._code_cache_misses = 0
+        self._wrapped_pyautogui = _PwaWrappedPyautogui(self)
+
+    # pyautogui key name → Win32 VK code（与输入引擎共用）
+    _VK_MAP = VK_MAP
     _MODIFIER_VKS = {0x11, 0x10, 0x12, 0x5B}  # ctrl, shift, alt, win
 
     def _win32_send_keys(self, vk_codes: list):
-        """用 AttachThreadInput + PostMessage 发键盘事件（Hyper-V VM 唯一可靠方案）"""
-        import win32gui, win32con, win32api, win32process, ctypes
-        hwnd = win32gui.GetForegroundWindow()
-        tid = win32api.GetCurrentThreadId()
-        ttid, _ = win32process.GetWindowThreadProcessId(hwnd)
-        ctypes.windll.user32.AttachThreadInput(tid, ttid, True)
-        try:
-            win32gui.SetFocus(hwnd)
-            time.sleep(0.05)
-            # key down (modifiers first, then main keys)
-            for vk in vk_codes:
-                win32api.PostMessage(hwnd, win32con.WM_KEYDOWN, vk, 0)
-            time.sleep(0.05)
-            # key up (reverse order)
-            for vk in reversed(vk_codes):
-                win32api.PostMessage(hwnd, win32con.WM_KEYUP, vk, 0)
-        finally:
-            ctypes.windll.user32.AttachThreadInput(tid, ttid, False)
+        """发键盘事件到前台窗口（输入引擎批量投递，默认 AttachThreadInput + PostMessage）"""
+        get_engine().send_keys(vk_codes)
 
     def _try_pywinauto_keyboard(self, code: str) -> Optional[Dict[str, Any]]:
         """拦截键盘操作和 win32type，绕过 _is_safe。返回 None 表示不拦截。"""
         # 匹配 win32type('text')
         m = re.match(r"^win32type\(['\"](.+)['\"]\)$", code.strip())
         if m:
-            from win32_keyboard import send_text_to_edit
             try:
-                send_text_to_edit(m.group(1))
+                self.backend.set_text(m.group(1))
                 return {"success": True, "message": f"win32type: {m.group(1)}", "error": None}
             except Exception as e:
                 return {"success": False, "message": None, "error": str(e)}
@@ -118,7 +162,7 @@ class SafeExecutor:
     def _exec_pwa_hotkey(self, keys: list) -> Dict[str, Any]:
         """用 Win32 PostMessage 发送键盘事件"""
         try:
-            _win32_hotkey(*keys)
+            self.backend.hotkey(keys)
             return {"success": True, "message": f"win32: {keys}", "error": None}
         except Exception as e:
             return {"success": False, "message": None, "error": str(e)}
@@ -129,8 +173,8 @@ class SafeExecutor:
         self._file_preload = file_preload
         self._clipboard_consumed = False
         # 立即写入系统剪贴板，确保第一次 Ctrl+V 能粘贴到正确内容
-        pyperclip.copy(text)
-        logger.info(f"Clipboard preload written to system clipboard: {text[:50]}")
+        elapsed = self.backend.set_clipboard_text(text)
+        logger.info(f"Clipboard preload written to system clipboard in {elapsed * 1000:.1f}ms: {text[:50]}")
 
     def clear_clipboard_preload(self):
         """清除预加载剪贴板内容"""
@@ -162,35 +206,18 @@ class SafeExecutor:
         return True
 
     def copy_file_to_clipboard(self, file_path: str):
-        """用 PowerShell 把图片作为 Bitmap 复制到系统剪贴板（微信可直接粘贴）"""
+        """把文件写入系统剪贴板：图片作为位图（微信可直接粘贴），其余作为文件拖放列表"""
         # 路径安全验证
         if not self._validate_file_path(file_path):
             logger.error(f"File path validation failed, skipping clipboard copy: {file_path}")
             return
 
-        # 判断是否为图片文件
-        img_exts = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.webp')
-        is_image = file_path.lower().endswith(img_exts)
-
-        # 使用 PowerShell -File 方式传参，避免命令注入
-        ps_script_path = os.path.join(os.path.dirname(__file__), 'copy_file_to_clipboard.ps1')
-
+        is_image = file_path.lower().endswith(IMAGE_EXTS)
         try:
-            if is_image:
-                result = subprocess.run(
-                    ['powershell', '-ExecutionPolicy', 'Bypass', '-File', ps_script_path, '-FilePath', file_path, '-AsImage'],
-                    capture_output=True, text=True, timeout=10
-                )
-            else:
-                result = subprocess.run(
-                    ['powershell', '-ExecutionPolicy', 'Bypass', '-File', ps_script_path, '-FilePath', file_path],
-                    capture_output=True, text=True, timeout=10
-                )
-            if result.returncode == 0:
-                mode = "as image" if is_image else "as file"
-                logger.info(f"File copied to clipboard {mode}: {file_path}")
-            else:
-                logger.error(f"Failed to copy file to clipboard: {result.stderr}")
+            # 进程内 win32clipboard 写入，失败时由常驻 PowerShell 进程兜底
+            elapsed = self.backend.copy_file(file_path, as_image=is_image)
+            mode = "as image" if is_image else "as file"
+            logger.info(f"File copied to clipboard {mode} in {elapsed * 1000:.1f}ms: {file_path}")
         except Exception as e:
             logger.error(f"Error copying file to clipboard: {e}")
 
@@ -200,16 +227,20 @@ class SafeExecutor:
             logger.info(f"Clipboard preload consumed, loading file to clipboard: {self._file_preload}")
             self.copy_file_to_clipboard(self._file_preload)
 
-    def execute(self, code: str) -> Dict[str, Any]:
+    def execute(self, code: str, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
         """
         执行 pyautogui 代码
 
         Args:
             code: pyautogui 代码字符串
+            cancel: 取消令牌；代码里的 time.sleep 可被立即打断（抛 TaskCancelled）
 
         Returns:
             执行结果字典 {"success": bool, "message": str, "error": str}
         """
+        cancel = cancel or NEVER
+        cancel.raise_if_cancelled()
+
         # 特殊命令处理
         if code == "WAIT":
             logger.info("Executing WAIT command")
@@ -224,32 +255,18 @@ class SafeExecutor:
             return {"success": False, "message": "FAIL", "error": "Task failed"}
 
         # 检测重复执行（Agent 陷入循环时跳过）
-        if code == self._last_executed_code:
-            self._repeat_count += 1
-            if self._repeat_count >= 2:
-                logger.warning(f"Skipping repeated execution (repeat #{self._repeat_count}): {code[:80]}")
-                return {"success": True, "message": "Skipped duplicate", "error": None}
-        else:
-            self._last_executed_code = code
-            self._repeat_count = 0
+        if self._is_repeated(code):
+            return {"success": True, "message": "Skipped duplicate", "error": None}
+
+        # 规范化（Windows 滚动缩放 + hotkey 列表参数），再按规范化结果查缓存校验
+        code = self._normalize(code)
 
         # 检查代码安全性
-        if not self._is_safe(code):
+        if self._compile_cached(code) is None:
             error_msg = f"Unsafe code detected: {code}"
             logger.error(error_msg)
             return {"success": False, "message": None, "error": error_msg}
 
-        # Windows 滚动缩放
-        if self.platform == "windows":
-            code = self._scale_scroll(code)
-
-        # 修正 hotkey 列表参数：hotkey(['cmd', 's']) -> hotkey('cmd', 's')
-        code = re.sub(
-            r"pyautogui\.hotkey\(\[([^\]]+)\]\)",
-            r"pyautogui.hotkey(\1)",
-            code
-        )
-
         # pywinauto 拦截：纯 hotkey/press 调用走 pywinauto（比 pyautogui 可靠）
         pwa_result = self._try_pywinauto_keyboard(code)
         if pwa_result is not None:
@@ -258,12 +275,7 @@ class SafeExecutor:
         # 如果代码里有 Ctrl+V 且 clipboard_preload 未消费，标记为已消费
         # （agent 可能直接用 hotkey 粘贴而不是 write，preload 已经在剪贴板里了）
         # 注意：file_preload 的加载要在 Ctrl+V 执行之后，否则会覆盖剪贴板
-        _needs_file_preload_after = False
-        if (self._clipboard_preload and not self._clipboard_consumed
-                and re.search(r"pyautogui\.hotkey\(\s*['\"]ctrl['\"]\s*,\s*['\"]v['\"]\s*\)", code)):
-            logger.info(f"[clipboard_consumed] Ctrl+V detected, marking preload as consumed")
-            self._clipboard_consumed = True
-            _needs_file_preload_after = bool(self._file_preload)
+        _needs_file_preload_after = bool(_CTRL_V_RE.search(code)) and self._consume_preload_on_paste()
 
         # 将所有 pyautogui.write() 替换为剪贴板粘贴
         # 原因：pyautogui.write 不支持非ASCII字符，在中文系统上不可靠
@@ -285,91 +297,275 @@ class SafeExecutor:
             # 无 preload 或已消费：仍然走剪贴板粘贴（比 write 可靠）
             return f"pyperclip.copy({text})\npyautogui.hotkey('ctrl', 'v')"
         # 匹配 pyautogui.write(message='...') 和 pyautogui.write('...')
-        code = re.sub(
-            r"pyautogui\.write\(message=((?:'[^']*'|\"[^\"]*\"))\)",
-            _replace_write_with_clipboard,
-            code
-        )
-        code = re.sub(
-            r"pyautogui\.(?:write|typewrite)\(((?:'[^']*'|\"[^\"]*\"))\)",
-            _replace_write_with_clipboard,
-            code
-        )
+        code = _WRITE_MESSAGE_RE.sub(_replace_write_with_clipboard, code)
+        code = _WRITE_RE.sub(_replace_write_with_clipboard, code)
+
+        # 剪贴板改写后的最终代码（大多数情况与上面相同，直接命中缓存）
+        compiled = self._compile_cached(code)
+        if compiled is None:
+            error_msg = f"Unsafe code detected: {code}"
+            logger.error(error_msg)
+            return {"success": False, "message": None, "error": error_msg}
 
         # 执行代码
         try:
             logger.info(f"Executing: {code}")
 
-            # 包装 pyautogui，让 hotkey/press 走 pywinauto
-            class _PwaWrappedPyautogui:
-                def __getattr__(self, name):
-                    return getattr(pyautogui, name)
-                def hotkey(self, *keys):
-                    self_outer = self  # noqa
-                    try:
-                        result = _executor_self._exec_pwa_hotkey(list(keys))
-                        logger.info(f"hotkey via pywinauto: {keys}")
-                    except Exception as e:
-                        logger.warning(f"pywinauto hotkey failed ({e}), fallback")
-                        pyautogui.hotkey(*keys)
-                def press(self, key):
-                    try:
-                        _executor_self._exec_pwa_hotkey([key])
-                    except Exception:
-                        pyautogui.press(key)
-            _executor_self = self
-            _wrapped_pyautogui = _PwaWrappedPyautogui()
-
-            from win32_keyboard import send_text_to_edit as _w32_type
             safe_globals = {
-                "pyautogui": _wrapped_pyautogui,
-                "pyperclip": pyperclip,
-                "__win32_type__": _w32_type,
-                "time": time,
-                "__builtins__": {
-                    # 只允许基本类型和操作
-                    "int": int,
-                    "float": float,
-                    "str": str,
-                    "bool": bool,
-                    "list": list,
-                    "dict": dict,
-                    "tuple": tuple,
-                    "range": range,
-                    "len": len,
-                    "min": min,
-                    "max": max,
-                    # 显式禁止危险函数
-                    "__import__": None,
-                    "eval": None,
-                    "exec": None,
-                    "compile": None,
-                    "open": None,
-                    "getattr": None,
-                    "setattr": None,
-                    "delattr": None,
-                    "globals": None,
-                    "locals": None,
-                    "vars": None,
-                }
+                "pyautogui": self._wrapped_pyautogui,
+                "pyperclip": self.backend.pyperclip,
+                "__win32_type__": self.backend.set_text,
+                "time": SimpleNamespace(sleep=cancel.sleep),
+                "__builtins__": dict(SAFE_BUILTINS),
             }
 
-            exec(code, safe_globals)
+            exec(compiled, safe_globals)
 
             # 代码执行完毕后，如果需要加载文件到剪贴板，现在执行
             # （必须在 Ctrl+V 粘贴文字之后，否则会覆盖剪贴板内容）
             # 延迟 1 秒确保 Windows 粘贴动作完成（hotkey 返回不代表粘贴完成）
             if _needs_file_preload_after:
-                time.sleep(1)
+                cancel.sleep(1)
                 self._on_clipboard_consumed()
 
             return {"success": True, "message": "Executed successfully", "error": None}
 
+        except TaskCancelled:
+            raise
+        except Exception as e:
+            error_msg = f"Execution error: {str(e)}"
+            logger.error(error_msg)
+            return {"success": False, "message": None, "error": error_msg}
+
+    def _is_repeated(self, key: str) -> bool:
+        """同一动作连续第 3 次起跳过（Agent 陷入循环）"""
+        if key == self._last_executed_code:
+            self._repeat_count += 1
+            if self._repeat_count >= 2:
+                logger.warning(f"Skipping repeated execution (repeat #{self._repeat_count}): {key[:80]}")
+                return True
+        else:
+            self._last_executed_code = key
+            self._repeat_count = 0
+        return False
+
+    def _consume_preload_on_paste(self) -> bool:
+        """Ctrl+V 时标记 clipboard_preload 已消费；返回粘贴后是否需要加载 file_preload"""
+        if self._clipboard_preload and not self._clipboard_consumed:
+            logger.info(f"[clipboard_consumed] Ctrl+V detected, marking preload as consumed")
+            self._clipboard_consumed = True
+            return bool(self._file_preload)
+        return False
+
+    def execute_action(self, action: AgentAction, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        结构化执行 AgentAction：直接分派到输入原语，不生成、解析、编译代码。
+        带 raw_code 的动作（OpenCUA）仍走 execute() 字符串路径。
+        cancel 被取消时在动作之间（以及动作内的等待中）抛 TaskCancelled。
+
+        Returns:
+            执行结果字典 {"success": bool, "message": str, "error": str}
+        """
+        cancel = cancel or NEVER
+        cancel.raise_if_cancelled()
+        if action.raw_code:
+            return self.execute(action.raw_code, cancel=cancel)
+
+        t = action.action_type
+        if t == ActionType.WAIT:
+            logger.info("Executing WAIT command")
+            return {"success": True, "message": "WAIT", "error": None}
+        if t == ActionType.DONE:
+            logger.info("Task completed successfully")
+            return {"success": True, "message": "DONE", "error": None}
+        if t == ActionType.FAIL:
+            logger.warning("Task failed")
+            return {"success": False, "message": "FAIL", "error": "Task failed"}
+
+        if t != ActionType.BATCH and t not in self._ACTION_HANDLERS:
+            error_msg = f"Unsupported action type: {t.value}"
+            logger.error(error_msg)
+            return {"success": False, "message": None, "error": error_msg}
+
+        # 与字符串路径共用重复检测，key 为动作签名（宏按整体签名）
+        if self._is_repeated(self._action_signature(action)):
+            return {"success": True, "message": "Skipped duplicate", "error": None}
+
+        if t == ActionType.BATCH:
+            return self.execute_batch(action.actions or [], cancel=cancel)
+        return self._dispatch_action(action, cancel)
+
+    def _dispatch_action(self, action: AgentAction, cancel: CancelToken = NEVER) -> Dict[str, Any]:
+        handler = self._ACTION_HANDLERS.get(action.action_type)
+        if handler is None:
+            error_msg = f"Unsupported action type: {action.action_type.value}"
+            logger.error(error_msg)
+            return {"success": False, "message": None, "error": error_msg}
+        try:
+            return handler(self, action, cancel)
+        except TaskCancelled:
+            raise
+        except ValueError as e:
+            error_msg = f"Invalid action: {e}"
+            logger.error(error_msg)
+            return {"success": False, "message": None, "error": error_msg}
         except Exception as e:
             error_msg = f"Execution error: {str(e)}"
             logger.error(error_msg)
             return {"success": False, "message": None, "error": error_msg}
 
+    def execute_batch(self, actions: list, frame_fn: Optional[Callable] = None,
+                      settle_delay: Optional[float] = None,
+                      abort_threshold: Optional[float] = None,
+                      cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """
+        按顺序执行多动作宏。每个动作（最后一个除外）后等待 settle_delay，
+        截灰度缩略图与上一张比较；变化比例超过 abort_threshold 说明界面出现了
+        预期外的变化（弹窗、窗口切换等），中止剩余动作，交给下一步重新观察。
+
+        Args:
+            actions: AgentAction 列表（不含 wait/done/fail）
+            frame_fn: 返回缩略图 numpy 数组的无参函数，默认 backend.thumbnail
+            cancel: 取消令牌；在子动作之间和稳定等待中检查
+
+        Returns:
+            执行结果字典，额外含 executed / total / aborted / change_ratios
+        """
+        if not actions:
+            return {"success": False, "message": None, "error": "Empty batch"}
+        settle_delay = config.MACRO_SETTLE_DELAY if settle_delay is None else settle_delay
+        abort_threshold = config.MACRO_ABORT_THRESHOLD if abort_threshold is None else abort_threshold
+        if frame_fn is None:
+            frame_fn = self.backend.thumbnail
+        cancel = cancel or NEVER
+
+        total = len(actions)
+        ratios = []
+        prev = frame_fn() if total > 1 else None
+        for i, action in enumerate(actions):
+            cancel.raise_if_cancelled()
+            result = self._dispatch_action(action, cancel)
+            if not result["success"]:
+                result.update(executed=i, total=total, aborted=True, change_ratios=ratios)
+                return result
+            if i == total - 1:
+                break
+            cancel.sleep(settle_delay)
+            frame = frame_fn()
+            ratio = thumbnail_change(prev, frame)
+            ratios.append(round(ratio, 4))
+            prev = frame
+            if ratio > abort_threshold:
+                logger.warning(f"Batch aborted after {i + 1}/{total}: frame change {ratio:.3f} > {abort_threshold}")
+                return {"success": True, "message": f"batch: {i + 1}/{total} (aborted, change={ratio:.3f})",
+                        "error": None, "executed": i + 1, "total": total, "aborted": True,
+                        "change_ratios": ratios}
+        logger.info(f"Batch executed {total} actions, change ratios={ratios}")
+        return {"success": True, "message": f"batch: {total}/{total}", "error": None,
+                "executed": total, "total": total, "aborted": False, "change_ratios": ratios}
+
+    @staticmethod
+    def _action_signature(action: AgentAction) -> str:
+        if action.action_type == ActionType.BATCH:
+            return "batch|" + "|".join(SafeExecutor._action_signature(a) for a in action.actions or [])
+        return (f"{action.action_type.value}|{action.key}|{action.x}|{action.y}|"
+                f"{action.direction}|{action.amount}|{action.text}")
+
+    @staticmethod
+    def _require_point(action: AgentAction):
+        if action.x is None or action.y is None:
+            raise ValueError(f"{action.action_type.value} requires x/y")
+        return int(action.x), int(action.y)
+
+    def _act_click(self, action: AgentAction, cancel: CancelToken = NEVER) -> Dict[str, Any]:
+        x, y = self._require_point(action)
+        sub = action.key  # "double_click" / "right_click" / None
+        pyautogui = self.backend.pyautogui
+        if sub == "double_click":
+            pyautogui.doubleClick(x=x, y=y)
+        elif sub == "right_click":
+            pyautogui.rightClick(x=x, y=y)
+        elif sub is None:
+            pyautogui.click(x=x, y=y)
+        else:
+            raise ValueError(f"unknown click variant: {sub}")
+        logger.info(f"Executed {sub or 'click'} at ({x}, {y})")
+        return {"success": True, "message": f"{sub or 'click'}: ({x}, {y})", "error": None}
+
+    def _act_type(self, action: AgentAction, cancel: CancelToken = NEVER) -> Dict[str, Any]:
+        # 与 win32type 相同：WM_SETTEXT 写入前台 Edit；文本原样传递，不经过引号转义
+        text = action.text or ""
+        if not text:
+            raise ValueError("type requires non-empty text")
+        self.backend.set_text(text)
+        return {"success": True, "message": f"win32type: {text}", "error": None}
+
+    def _act_hotkey(self, action: AgentAction, cancel: CancelToken = NEVER) -> Dict[str, Any]:
+        keys = [k.strip().lower() for k in (action.key or "").split("+") if k.strip()]
+        if not keys:
+            raise ValueError("hotkey requires keys")
+        unknown = [k for k in keys if k not in self._VK_MAP and len(k) != 1]
+        if unknown:
+            raise ValueError(f"unknown keys: {unknown}")
+
+        needs_file_preload_after = keys == ["ctrl", "v"] and self._consume_preload_on_paste()
+        result = self._exec_pwa_hotkey(keys)
+        if result["success"] and needs_file_preload_after:
+            # 同字符串路径：等粘贴完成后再把文件写入剪贴板
+            cancel.sleep(1)
+            self._on_clipboard_consumed()
+        return result
+
+    def _act_scroll(self, action: AgentAction, cancel: CancelToken = NEVER) -> Dict[str, Any]:
+        amount = int(action.amount or 3)
+        clicks = -amount if action.direction == "down" else amount
+        if self.platform == "windows":
+            clicks *= self.scroll_factor
+        self.backend.pyautogui.scroll(clicks)
+        logger.info(f"Executed scroll({clicks})")
+        return {"success": True, "message": f"scroll: {clicks}", "error": None}
+
+    _ACTION_HANDLERS = {
+        ActionType.CLICK: _act_click,
+        ActionType.TYPE: _act_type,
+        ActionType.HOTKEY: _act_hotkey,
+        ActionType.SCROLL: _act_scroll,
+    }
+
+    def _normalize(self, code: str) -> str:
+        """规范化代码：Windows 滚动缩放 + hotkey 列表参数展开"""
+        if self.platform == "windows":
+            code = self._scale_scroll(code)
+        # 修正 hotkey 列表参数：hotkey(['cmd', 's']) -> hotkey('cmd', 's')
+        return _HOTKEY_LIST_RE.sub(r"pyautogui.hotkey(\1)", code)
+
+    def _compile_cached(self, code: str) -> Optional[CodeType]:
+        """AST 白名单校验 + 编译，结果按代码字符串 LRU 缓存；校验不通过返回 None（同样缓存）"""
+        cache = self._code_cache
+        if code in cache:
+            cache.move_to_end(code)
+            self._code_cache_hits += 1
+            return cache[code]
+        self._code_cache_misses += 1
+        compiled = None
+        if self._is_safe(code):
+            try:
+                compiled = compile(code, "<action>", "exec")
+            except (SyntaxError, ValueError) as e:
+                logger.warning(f"Failed to compile code: {e}")
+        cache[code] = compiled
+        if len(cache) > self._code_cache_size:
+            cache.popitem(last=False)
+        return compiled
+
+    def code_cache_info(self) -> Dict[str, int]:
+        return {
+            "size": len(self._code_cache),
+            "max_size": self._code_cache_size,
+            "hits": self._code_cache_hits,
+            "misses": self._code_cache_misses,
+        }
+
     def _is_safe(self, code: str) -> bool:
         """
         使用 AST 检查代码是否安全（白名单验证）
@@ -440,10 +636,7 @@ class SafeExecutor:
         """
         Windows 平台滚动缩放
         """
-        pattern = r'(pyautogui\.scroll\()\s*([-+]?\d+)\s*\)'
-        code = re.sub(
-            pattern,
+        return _SCROLL_RE.sub(
             lambda m: f"{m.group(1)}{int(m.group(2)) * self.scroll_factor})",
             code
         )
-        return code
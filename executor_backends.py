@@ -0,0 +1,203 @@
+"""执行器后端 — 真实桌面（pyautogui + Win32）或只记录不操作的 RecordingBackend
+
+SafeExecutor 只通过后端接触桌面：
+- pyautogui / pyperclip：字符串路径 exec 时注入的模块对象，也用于结构化点击/滚动
+- hotkey(keys)：Win32 PostMessage 组合键
+- set_text(text)：WM_SETTEXT 写入前台 Edit（win32type）
+- set_clipboard_text / copy_file：剪贴板写入，返回耗时（秒）
+- thumbnail()：多动作宏稳定检查用的灰度缩略图
+
+CUA_EXECUTOR_BACKEND=recording 时不 import pyautogui/pyperclip/win32，Linux 上也可跑完整任务循环。
+"""
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import numpy as np
+from loguru import logger
+
+import config
+from input_engine import key_to_vk
+
+
+class ExecutorBackend(ABC):
+    name = "base"
+    pyautogui: Any = None
+    pyperclip: Any = None
+
+    @abstractmethod
+    def hotkey(self, keys: list) -> bool:
+        """发送组合键，返回是否成功"""
+
+    @abstractmethod
+    def set_text(self, text: str):
+        """写入前台 Edit 控件"""
+
+    @abstractmethod
+    def set_clipboard_text(self, text: str) -> float:
+        """写入剪贴板文本，返回耗时（秒）"""
+
+    @abstractmethod
+    def copy_file(self, path: str, as_image: bool) -> float:
+        """文件（或图片）写入剪贴板，返回耗时（秒）"""
+
+    @abstractmethod
+    def thumbnail(self) -> np.ndarray:
+        """灰度缩略图"""
+
+
+class DesktopBackend(ExecutorBackend):
+    """真实桌面：依赖在首次使用时才 import"""
+
+    name = "desktop"
+
+    def __init__(self):
+        import pyautogui
+        import pyperclip
+        # 关闭 fail-safe（鼠标移到角落不中断）
+        pyautogui.FAILSAFE = False
+        self.pyautogui = pyautogui
+        self.pyperclip = pyperclip
+
+    def hotkey(self, keys: list) -> bool:
+        from win32_keyboard import send_hotkey
+        return send_hotkey(*keys)
+
+    def set_text(self, text: str):
+        from win32_keyboard import send_text_to_edit
+        send_text_to_edit(text)
+
+    def set_clipboard_text(self, text: str) -> float:
+        from clipboard_engine import get_clipboard
+        return get_clipboard().set_text(text)
+
+    def copy_file(self, path: str, as_image: bool) -> float:
+        from clipboard_engine import get_clipboard
+        return get_clipboard().copy_file(path, as_image=as_image)
+
+    def thumbnail(self) -> np.ndarray:
+        from screenshot import capture_thumbnail
+        return capture_thumbnail()
+
+
+@dataclass
+class ActionRecord:
+    op: str
+    args: tuple
+    kwargs: dict = field(default_factory=dict)
+    at: float = 0.0  # time.time()
+    duration_ms: float = 0.0
+
+
+class RecordingBackend(ExecutorBackend):
+    """不操作桌面：校验参数（坐标在屏幕内、按键可识别）、计时并记录每个动作
+
+    latency_ms 模拟每个动作的输入耗时；records 只保留最近 max_records 条，stats 为全量统计。
+    """
+
+    name = "recording"
+
+    def __init__(self, screen_w: Optional[int] = None, screen_h: Optional[int] = None,
+                 latency_ms: Optional[float] = None, max_records: int = 10000):
+        self.screen_w = screen_w or config.SCREEN_WIDTH
+        self.screen_h = screen_h or config.SCREEN_HEIGHT
+        self.latency = (config.RECORDING_LATENCY_MS if latency_ms is None else latency_ms) / 1000
+        self.records: deque = deque(maxlen=max_records)
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self.clipboard = None
+        self.pyautogui = _RecordingModule(self, "pyautogui")
+        self.pyperclip = _RecordingModule(self, "pyperclip")
+
+    def record(self, op: str, args: tuple = (), kwargs: Optional[dict] = None):
+        start = time.perf_counter()
+        self._validate(op, args, kwargs or {})
+        if self.latency:
+            time.sleep(self.latency)
+        duration_ms = (time.perf_counter() - start) * 1000
+        self.records.append(ActionRecord(op, args, kwargs or {}, time.time(), duration_ms))
+        s = self.stats.setdefault(op, {"count": 0, "total_ms": 0.0})
+        s["count"] += 1
+        s["total_ms"] += duration_ms
+        return duration_ms / 1000
+
+    def _validate(self, op: str, args: tuple, kwargs: dict):
+        if op.startswith("pyautogui.") and op.split(".", 1)[1] in _POINTER_FUNCS:
+            x = kwargs.get("x", args[0] if args else None)
+            y = kwargs.get("y", args[1] if len(args) > 1 else None)
+            if x is not None and y is not None and not (
+                    0 <= x < self.screen_w and 0 <= y < self.screen_h):
+                raise ValueError(f"{op} outside screen: ({x}, {y}) not in {self.screen_w}x{self.screen_h}")
+        elif op in ("hotkey", "pyautogui.hotkey", "pyautogui.press"):
+            keys = list(args[0]) if op == "hotkey" else list(args)
+            unknown = [k for k in keys if not isinstance(k, str) or key_to_vk(k) is None]
+            if not keys or unknown:
+                raise ValueError(f"{op} unknown keys: {unknown or keys}")
+        elif op in ("set_text", "clipboard_text", "pyperclip.copy"):
+            if not args or not isinstance(args[0], str):
+                raise ValueError(f"{op} requires a string")
+
+    def hotkey(self, keys: list) -> bool:
+        self.record("hotkey", (tuple(keys),))
+        return True
+
+    def set_text(self, text: str):
+        self.record("set_text", (text,))
+
+    def set_clipboard_text(self, text: str) -> float:
+        self.clipboard = text
+        return self.record("clipboard_text", (text,))
+
+    def copy_file(self, path: str, as_image: bool) -> float:
+        self.clipboard = path
+        return self.record("clipboard_file", (path,), {"as_image": as_image})
+
+    def thumbnail(self) -> np.ndarray:
+        # 无真实画面：返回固定缩略图，宏的稳定检查恒为“无变化”
+        return _BLANK_THUMBNAIL
+
+    def summary(self) -> Dict[str, Any]:
+        return {op: {"count": s["count"], "mean_ms": round(s["total_ms"] / s["count"], 3)}
+                for op, s in sorted(self.stats.items())}
+
+
+# 需要校验坐标的 pyautogui 函数（第 1、2 个参数或 x=/y= 为屏幕坐标）
+_POINTER_FUNCS = {'click', 'doubleClick', 'tripleClick', 'rightClick', 'middleClick', 'moveTo', 'dragTo'}
+_BLANK_THUMBNAIL = np.zeros((90, 160), dtype=np.uint8)
+
+
+class _RecordingModule:
+    """冒充 pyautogui / pyperclip：任意函数调用都记为 "<模块>.<函数>"（白名单已由 AST 校验保证）"""
+
+    def __init__(self, backend: RecordingBackend, module: str):
+        self._backend = backend
+        self._module = module
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        backend, op = self._backend, f"{self._module}.{name}"
+
+        def _call(*args, **kwargs):
+            backend.record(op, args, kwargs)
+            if op == "pyautogui.size":
+                return backend.screen_w, backend.screen_h
+            if op == "pyautogui.position":
+                return 0, 0
+            if op == "pyperclip.paste":
+                return backend.clipboard or ""
+            if op == "pyperclip.copy":
+                backend.clipboard = args[0]
+            return None
+        return _call
+
+
+def create_backend(name: Optional[str] = None) -> ExecutorBackend:
+    """按名称创建后端（默认 config.EXECUTOR_BACKEND）"""
+    name = (name or config.EXECUTOR_BACKEND).lower()
+    if name == "recording":
+        return RecordingBackend()
+    if name != "desktop":
+        logger.warning(f"Unknown executor backend '{name}', using desktop")
+    return DesktopBackend()
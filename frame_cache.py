@@ -0,0 +1,89 @@
+"""最新帧缓存 — 截图流水线每截一帧就放进来，截图接口直接返回它，不额外截图
+
+- 帧：流水线已编码好的 PNG（已按 SCREENSHOT_MAX_WIDTH 缩放）+ 截图时间
+- 变体：按 (格式, 宽度, 质量) 懒生成并缓存，换帧时清空；同一帧的同一变体只编码一次
+- ETag：进程标识 + 帧序号 + 变体参数，帧没变时客户端用 If-None-Match 得到 304
+"""
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+
+FORMATS = {"png": "image/png", "jpeg": "image/jpeg"}
+
+
+@dataclass
+class Frame:
+    seq: int
+    png: bytes
+    scale: float
+    captured_at: float
+    variants: "OrderedDict[tuple, bytes]" = field(default_factory=OrderedDict)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.captured_at
+
+
+class FrameCache:
+    def __init__(self, max_variants: int = 8):
+        self.max_variants = max_variants
+        self._boot = uuid.uuid4().hex[:8]  # 重启后旧 ETag 不会误命中
+        self._seq = itertools.count(1)
+        self._frame: Optional[Frame] = None
+        self._lock = threading.Lock()
+        self.stats = {"frames": 0, "hits": 0, "encodes": 0}
+
+    def put(self, png: bytes, scale: float = 1.0, captured_at: Optional[float] = None) -> Frame:
+        """放入新帧（流水线线程调用，只保存引用，不编码）"""
+        frame = Frame(next(self._seq), png, scale, captured_at or time.time())
+        with self._lock:
+            self._frame = frame
+            self.stats["frames"] += 1
+        return frame
+
+    def latest(self, max_age: Optional[float] = None) -> Optional[Frame]:
+        """最新帧；比 max_age 秒更旧时返回 None（调用方应重新截图）"""
+        frame = self._frame
+        if frame is None or (max_age is not None and frame.age > max_age):
+            return None
+        return frame
+
+    def etag(self, frame: Frame, fmt: str = "png", width: Optional[int] = None, quality: int = 80) -> str:
+        return f'"{self._boot}-{frame.seq}-{fmt}-{width or 0}-{quality if fmt == "jpeg" else 0}"'
+
+    def render(self, frame: Frame, fmt: str = "png", width: Optional[int] = None, quality: int = 80) -> bytes:
+        """帧的指定格式/宽度版本（width 只缩小不放大）；原尺寸 PNG 直接返回流水线的字节"""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        key = (fmt, width, quality if fmt == "jpeg" else 0)
+        with self._lock:
+            data = frame.variants.get(key)
+            if data is not None:
+                frame.variants.move_to_end(key)
+                self.stats["hits"] += 1
+                return data
+        if fmt == "png" and width is None:
+            return frame.png
+        with Image.open(BytesIO(frame.png)) as img:
+            img = img.convert("RGB")
+            if width and width < img.width:
+                img = img.resize((width, max(1, int(img.height * width / img.width))), Image.BILINEAR)
+            buffer = BytesIO()
+            if fmt == "jpeg":
+                img.save(buffer, format="JPEG", quality=quality)
+            else:
+                img.save(buffer, format="PNG")
+        data = buffer.getvalue()
+        with self._lock:
+            frame.variants[key] = data
+            while len(frame.variants) > self.max_variants:
+                frame.variants.popitem(last=False)
+            self.stats["encodes"] += 1
+        return data
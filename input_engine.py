@@ -0,0 +1,270 @@
+"""键盘输入引擎 — 整段按键序列一次批量发送（PostMessage / SendInput / 空实现）
+
+- PostMessageEngine（默认）：每批只 AttachThreadInput 一次，按键消息连续投递，
+  间隔可配置（CUA_INPUT_SETTLE_MS / CUA_INPUT_HOLD_MS 默认 50ms，CUA_INPUT_SPACING_MS 默认 0）。
+  Hyper-V VM 中 SendInput 不生效，这是唯一可靠方案。
+- SendInputEngine：整段序列构造成一个 INPUT 数组，一次 SendInput 调用（物理机可用）
+- NullEngine：不发任何消息，只记录事件；Linux 测试和基准用
+
+用法: get_engine().send_keys([0x11, 0x56])  /  send_sequence([[0x11, 0x41], [0x2E]])  /  send_text("你好")
+"""
+import ctypes
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional, Sequence
+
+from loguru import logger
+
+# pyautogui key name → VK code
+VK_MAP = {
+    'ctrl': 0x11, 'shift': 0x10, 'alt': 0x12, 'win': 0x5B,
+    'enter': 0x0D, 'return': 0x0D, 'tab': 0x09,
+    'escape': 0x1B, 'esc': 0x1B,
+    'backspace': 0x08, 'delete': 0x2E, 'del': 0x2E,
+    'space': 0x20,
+    'up': 0x26, 'down': 0x28, 'left': 0x25, 'right': 0x27,
+    'home': 0x24, 'end': 0x23, 'pageup': 0x21, 'pagedown': 0x22,
+    **{f'f{i}': 0x6F + i for i in range(1, 13)},
+}
+
+WM_KEYDOWN = 0x0100
+WM_KEYUP = 0x0101
+WM_CHAR = 0x0102
+
+
+def key_to_vk(key: str) -> Optional[int]:
+    """按键名 → VK 码；单字符按大写字母/数字的 VK；未知返回 None"""
+    vk = VK_MAP.get(key.lower())
+    if vk:
+        return vk
+    if len(key) == 1:
+        return ord(key.upper())
+    return None
+
+
+class InputEngine(ABC):
+    """输入引擎基类：子类实现 _send_batch(events, hwnd)
+
+    事件为 (kind, value)：("down"/"up", vk) 或 ("char", 字符)
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.stats = {"batches": 0, "events": 0, "seconds": 0.0}
+        self._lock = threading.Lock()
+
+    def send_keys(self, vk_codes: Sequence[int], hwnd=None):
+        """组合键：依次按下，逆序抬起"""
+        self.send_sequence([vk_codes], hwnd=hwnd)
+
+    def send_sequence(self, chords: Sequence[Sequence[int]], hwnd=None):
+        """多个组合键（如 Ctrl+A、Delete）合成一批发送"""
+        events = []
+        for chord in chords:
+            events.extend(("down", vk) for vk in chord)
+            events.extend(("up", vk) for vk in reversed(chord))
+        self._run(events, hwnd)
+
+    def send_text(self, text: str, hwnd=None):
+        """逐字符输入文本（支持中文），整段一批发送"""
+        self._run([("char", ch) for ch in text], hwnd)
+
+    def _run(self, events: list, hwnd):
+        if not events:
+            return
+        start = time.perf_counter()
+        with self._lock:
+            self._send_batch(events, hwnd)
+        elapsed = time.perf_counter() - start
+        self.stats["batches"] += 1
+        self.stats["events"] += len(events)
+        self.stats["seconds"] += elapsed
+
+    @abstractmethod
+    def _send_batch(self, events: list, hwnd):
+        """在目标窗口上发送一批事件"""
+
+
+class PostMessageEngine(InputEngine):
+    """AttachThreadInput + PostMessage；一批只 attach/聚焦一次"""
+
+    name = "postmessage"
+
+    def __init__(self, settle_ms: float = 50, hold_ms: float = 50, spacing_ms: float = 0):
+        super().__init__()
+        self.settle = settle_ms / 1000  # attach+聚焦后等待
+        self.hold = hold_ms / 1000  # 组合键按下与抬起之间
+        self.spacing = spacing_ms / 1000  # 相邻消息之间
+
+    def _send_batch(self, events: list, hwnd):
+        hwnd = self._target(hwnd)
+        with self._attached(hwnd):
+            if self.settle:
+                time.sleep(self.settle)
+            prev = None
+            for kind, value in events:
+                # 组合键由 down 转为 up 时保持 hold，其余消息之间按 spacing
+                if prev == "down" and kind == "up":
+                    if self.hold:
+                        time.sleep(self.hold)
+                elif prev is not None and self.spacing:
+                    time.sleep(self.spacing)
+                if kind == "char":
+                    self._post(hwnd, WM_CHAR, ord(value), 1)
+                else:
+                    self._post(hwnd, WM_KEYDOWN if kind == "down" else WM_KEYUP, value, 0)
+                prev = kind
+
+    def _target(self, hwnd):
+        if hwnd is None:
+            import win32gui
+            hwnd = win32gui.GetForegroundWindow()
+        return hwnd
+
+    def _attached(self, hwnd):
+        return _ThreadAttachment(hwnd)
+
+    def _post(self, hwnd, msg: int, wparam: int, lparam: int):
+        import win32api
+        win32api.PostMessage(hwnd, msg, wparam, lparam)
+
+
+class _ThreadAttachment:
+    """AttachThreadInput 上下文：进入时挂接并 SetFocus，退出时解除"""
+
+    def __init__(self, hwnd):
+        self.hwnd = hwnd
+
+    def __enter__(self):
+        import win32api
+        import win32gui
+        import win32process
+        self.tid = win32api.GetCurrentThreadId()
+        self.ttid, _ = win32process.GetWindowThreadProcessId(self.hwnd)
+        ctypes.windll.user32.AttachThreadInput(self.tid, self.ttid, True)
+        try:
+            win32gui.SetFocus(self.hwnd)
+        except Exception:
+            pass  # SetFocus 可能失败，继续发消息
+        return self
+
+    def __exit__(self, *exc):
+        ctypes.windll.user32.AttachThreadInput(self.tid, self.ttid, False)
+        return False
+
+
+class NullEngine(PostMessageEngine):
+    """不发消息，只记录 (msg, wparam)；保留 PostMessageEngine 的间隔逻辑便于基准对比"""
+
+    name = "null"
+
+    def __init__(self, settle_ms: float = 0, hold_ms: float = 0, spacing_ms: float = 0,
+                 keep_events: int = 10000):
+        super().__init__(settle_ms, hold_ms, spacing_ms)
+        self.keep_events = keep_events
+        self.events: List[tuple] = []
+
+    def _target(self, hwnd):
+        return hwnd or 0
+
+    def _attached(self, hwnd):
+        return _NoAttachment()
+
+    def _post(self, hwnd, msg: int, wparam: int, lparam: int):
+        if len(self.events) < self.keep_events:
+            self.events.append((msg, wparam))
+
+
+class _NoAttachment:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class SendInputEngine(InputEngine):
+    """整段序列构造成 INPUT 数组，一次 SendInput 注入（发往前台焦点，hwnd 仅用于置前）"""
+
+    name = "sendinput"
+
+    def _send_batch(self, events: list, hwnd):
+        if hwnd is not None:
+            import win32gui
+            try:
+                win32gui.SetForegroundWindow(hwnd)
+            except Exception:
+                pass
+        inputs = []
+        for kind, value in events:
+            if kind == "char":
+                code = ord(value)
+                inputs.append(_key_input(0, code, _KEYEVENTF_UNICODE))
+                inputs.append(_key_input(0, code, _KEYEVENTF_UNICODE | _KEYEVENTF_KEYUP))
+            else:
+                inputs.append(_key_input(value, 0, 0 if kind == "down" else _KEYEVENTF_KEYUP))
+        array = (_INPUT * len(inputs))(*inputs)
+        sent = ctypes.windll.user32.SendInput(len(inputs), array, ctypes.sizeof(_INPUT))
+        if sent != len(inputs):
+            raise OSError(f"SendInput injected {sent}/{len(inputs)} events")
+
+
+# SendInput 结构体（union 需包含 MOUSEINPUT 以得到正确的 INPUT 大小）
+_INPUT_KEYBOARD = 1
+_KEYEVENTF_KEYUP = 0x0002
+_KEYEVENTF_UNICODE = 0x0004
+_ULONG_PTR = ctypes.c_size_t
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", ctypes.c_long), ("dy", ctypes.c_long), ("mouseData", ctypes.c_ulong),
+                ("dwFlags", ctypes.c_ulong), ("time", ctypes.c_ulong), ("dwExtraInfo", _ULONG_PTR)]
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", ctypes.c_ushort), ("wScan", ctypes.c_ushort), ("dwFlags", ctypes.c_ulong),
+                ("time", ctypes.c_ulong), ("dwExtraInfo", _ULONG_PTR)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", _MOUSEINPUT), ("ki", _KEYBDINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong), ("u", _INPUTUNION)]
+
+
+def _key_input(vk: int, scan: int, flags: int) -> _INPUT:
+    return _INPUT(type=_INPUT_KEYBOARD, u=_INPUTUNION(ki=_KEYBDINPUT(vk, scan, flags, 0, 0)))
+
+
+_engine: Optional[InputEngine] = None
+
+
+def create_engine(name: str) -> InputEngine:
+    """按名称创建引擎；非 Windows 一律用 NullEngine"""
+    import config
+    name = (name or "postmessage").lower()
+    if sys.platform != "win32" and name != "null":
+        logger.info(f"Input engine '{name}' unavailable on {sys.platform}, using null engine")
+        name = "null"
+    if name == "sendinput":
+        return SendInputEngine()
+    if name == "null":
+        return NullEngine()
+    if name != "postmessage":
+        logger.warning(f"Unknown input engine '{name}', using postmessage")
+    return PostMessageEngine(config.INPUT_SETTLE_MS, config.INPUT_HOLD_MS, config.INPUT_SPACING_MS)
+
+
+def get_engine() -> InputEngine:
+    """进程级单例（CUA_INPUT_ENGINE 选择）"""
+    global _engine
+    if _engine is None:
+        import config
+        _engine = create_engine(config.INPUT_ENGINE)
+        logger.info(f"Input engine: {_engine.name}")
+    return _engine
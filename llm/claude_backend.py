@@ -7,6 +7,8 @@ from typing import List, Optional
 
 import config
 from utils import encode_image
+from cancellation import CancelToken
+from metrics import timed
 
 CLAUDE_SOM_SYSTEM_PROMPT = """你是一个桌面自动化 Agent，正在操控一台 Windows 11 虚拟机。
 屏幕分辨率：{screen_w}x{screen_h}。截图已缩放到 {img_w}x{img_h}。
@@ -45,9 +47,9 @@ CLAUDE_SOM_SYSTEM_PROMPT = """你是一个桌面自动化 Agent，正在操控
 
 ### 失败
 {{"thought": "无法完成", "action": "fail"}}
-
+{macro_section}
 ## 规则
-1. 每次只输出一个 JSON 动作
+1. 每次只输出一个 JSON 动作{macro_rule}
 2. 坐标基于截图尺寸 {img_w}x{img_h}，直接看图估算位置
 3. 如果连续 3 次操作没效果，换一种方式
 4. 完成后必须输出 done，失败输出 fail
@@ -57,15 +59,37 @@ CLAUDE_SOM_SYSTEM_PROMPT = """你是一个桌面自动化 Agent，正在操控
 8. 点击坐标要瞄准目标的**正中心**"""
 
 
+# 多动作宏（config.MACRO_MAX_ACTIONS > 1 时写入 system prompt）
+MACRO_SECTION_TEMPLATE = """
+### 连续动作（最多 {max_actions} 个，按顺序执行）
+[{{"thought": "点击输入框", "action": "click", "x": 800, "y": 650}}, {{"thought": "粘贴", "action": "hotkey", "keys": ["ctrl", "v"]}}, {{"thought": "发送", "action": "press", "key": "enter"}}]
+"""
+
+MACRO_RULE = "；结果确定、中间不需要看屏幕的连续操作可合并为一个动作数组（数组内不要放 wait/done/fail）"
+
 USER_PROMPT_TEMPLATE = """# 任务：{instruction}
 
 # Step {step_idx}
-
+{som_section}
 # 历史操作：
 {history_summary}
 
 请根据截图，输出下一步动作的 JSON。坐标基于截图尺寸。"""
 
+SOM_SECTION_TEMPLATE = """
+# 当前屏幕 UI 元素（编号跨步不变，仅供参考，坐标仍以截图为准）：
+{som_text}
+{diff_section}"""
+
+# 增量模式：完整清单（锚点）作为可缓存前缀单独发送，每步只发增量
+SOM_ANCHOR_TEMPLATE = """# UI 元素锚点清单（编号跨步不变，仅供参考，坐标仍以截图为准）：
+{anchor_text}"""
+
+SOM_DELTA_SECTION_TEMPLATE = """
+# UI 元素增量（相对锚点清单；+ 新增，~ 移动/文字变化，- 消失；未列出的不变）：
+{som_text}
+{diff_section}"""
+
 
 class ClaudeBackend:
     """Claude Opus — 直接坐标模式（不依赖 OmniParser）"""
@@ -77,7 +101,7 @@ class ClaudeBackend:
         self.history = []
 
     def predict(self, instruction: str, context: dict,
-                history: list, step_idx: int):
+                history: list, step_idx: int, cancel: Optional[CancelToken] = None):
         from llm.router import AgentAction, ActionType
 
         screenshot_b64 = encode_image(context["screenshot_bytes"])
@@ -92,21 +116,63 @@ class ClaudeBackend:
         user_text = USER_PROMPT_TEMPLATE.format(
             instruction=instruction,
             step_idx=step_idx,
+            som_section=self._build_som_section(context),
             history_summary=history_summary or "（首步，无历史）",
         )
 
         # 动态填充 system prompt 的分辨率
+        macro = config.MACRO_MAX_ACTIONS > 1
         system_prompt = CLAUDE_SOM_SYSTEM_PROMPT.format(
             screen_w=config.SCREEN_WIDTH, screen_h=config.SCREEN_HEIGHT,
             img_w=img_w, img_h=img_h,
+            macro_section=MACRO_SECTION_TEMPLATE.format(max_actions=config.MACRO_MAX_ACTIONS) if macro else "",
+            macro_rule=MACRO_RULE if macro else "",
         )
 
-        messages = self._build_messages(screenshot_b64, user_text, history, step_idx)
+        messages = self._build_messages(screenshot_b64, user_text, history, step_idx,
+                                        anchor_block=self._som_anchor_block(context))
 
-        response_text = self._call_api(messages, system_prompt)
+        timings = {}
+        with timed(timings, "llm_call"):
+            response_text = self._call_api(messages, system_prompt,
+                                           timeout=cancel.timeout(120, floor=5) if cancel else 120)
+        if cancel:
+            # 请求期间任务被停止：丢弃响应
+            cancel.raise_if_cancelled()
         logger.info(f"Claude response: {response_text[:300]}")
 
-        return self._parse_response(response_text, scale)
+        with timed(timings, "parse"):
+            action = self._parse_response(response_text, scale)
+        action.timings = timings
+        if config.RECORD_DIR:
+            action.llm_request = {"model": config.LLM_MODEL, "system": system_prompt, "messages": messages}
+        return action
+
+    def _build_som_section(self, context: dict) -> str:
+        """OmniParser 元素清单 + 相对上一步的元素变化（未启用或无元素时为空）"""
+        som_text = context.get("som_text")
+        if not config.SOM_IN_PROMPT or not som_text:
+            return ""
+        diff = context.get("som_diff")
+        summary = diff.summary() if diff is not None else ""
+        diff_section = f"\n# 界面变化（相对上一步）：\n{summary}\n" if summary else ""
+        if context.get("som_anchor_text"):
+            # 锚点清单已在前缀块中；增量步只附增量，锚点步只附变化摘要
+            if context.get("som_text_mode") == "delta":
+                return SOM_DELTA_SECTION_TEMPLATE.format(som_text=som_text, diff_section=diff_section)
+            return diff_section
+        return SOM_SECTION_TEMPLATE.format(som_text=som_text, diff_section=diff_section)
+
+    def _som_anchor_block(self, context: dict) -> Optional[dict]:
+        """增量模式下的锚点清单块（cache_control：锚点不变时命中 prompt cache）"""
+        anchor_text = context.get("som_anchor_text")
+        if not config.SOM_IN_PROMPT or not anchor_text:
+            return None
+        return {
+            "type": "text",
+            "text": SOM_ANCHOR_TEMPLATE.format(anchor_text=anchor_text),
+            "cache_control": {"type": "ephemeral"},
+        }
 
     def _build_history_summary(self, history: list) -> str:
         if not history:
@@ -120,17 +186,17 @@ class ClaudeBackend:
         return "\n".join(lines)
 
     def _build_messages(self, screenshot_b64: str, user_text: str,
-                        history: list, step_idx: int) -> list:
+                        history: list, step_idx: int, anchor_block: Optional[dict] = None) -> list:
         # Only current screenshot — history is in text summary to avoid 413
-        return [{
-            "role": "user",
-            "content": [
-                {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": screenshot_b64}},
-                {"type": "text", "text": user_text},
-            ]
-        }]
-
-    def _call_api(self, messages: list, system_prompt: str = "") -> str:
+        content = [
+            {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": screenshot_b64}},
+            {"type": "text", "text": user_text},
+        ]
+        if anchor_block:
+            content.insert(0, anchor_block)
+        return [{"role": "user", "content": content}]
+
+    def _call_api(self, messages: list, system_prompt: str = "", timeout: float = 120) -> str:
         url = f"{config.LLM_BASE_URL}/v1/messages"
         body = {
             "model": config.LLM_MODEL,
@@ -143,7 +209,7 @@ class ClaudeBackend:
             "anthropic-version": "2023-06-01",
             "content-type": "application/json",
         }
-        resp = httpx.post(url, json=body, headers=headers, timeout=120)
+        resp = httpx.post(url, json=body, headers=headers, timeout=timeout)
         if resp.status_code != 200:
             raise RuntimeError(f"Anthropic API error {resp.status_code}: {resp.text[:300]}")
         data = resp.json()
@@ -181,6 +247,37 @@ class ClaudeBackend:
             logger.error(f"Failed to parse Claude JSON: {text[:200]}")
             return AgentAction(action_type=ActionType.FAIL, raw_response=response_text)
 
+        if isinstance(data, list):
+            return self._parse_batch(data, scale, response_text)
+        return self._action_from_dict(data, scale, response_text)
+
+    def _parse_batch(self, items: list, scale: float, response_text: str):
+        """动作数组 → BATCH；遇到 wait/done/fail 或无法识别的动作即截断，超出上限的丢弃"""
+        from llm.router import AgentAction, ActionType
+
+        actions = []
+        for item in items:
+            action = self._action_from_dict(item, scale, response_text) if isinstance(item, dict) else None
+            if action is None or action.action_type in (ActionType.WAIT, ActionType.DONE, ActionType.FAIL):
+                if not actions:
+                    return action or AgentAction(action_type=ActionType.FAIL, raw_response=response_text)
+                logger.warning(f"Batch truncated at non-executable item: {item}")
+                break
+            actions.append(action)
+        limit = max(1, config.MACRO_MAX_ACTIONS)
+        if len(actions) > limit:
+            logger.warning(f"Batch of {len(actions)} actions truncated to {limit}")
+            actions = actions[:limit]
+        if len(actions) == 1:
+            return actions[0]
+        return AgentAction(action_type=ActionType.BATCH, actions=actions,
+                           thought=" → ".join(a.thought or "" for a in actions),
+                           raw_response=response_text)
+
+    def _action_from_dict(self, data: dict, scale: float, response_text: str):
+        """单个 JSON 动作 → AgentAction"""
+        from llm.router import AgentAction, ActionType
+
         action_str = data.get("action", "fail")
         thought = data.get("thought", "")
 
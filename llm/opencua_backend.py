@@ -3,6 +3,7 @@ from loguru import logger
 
 import config
 from agent import OpenCUAAgent
+from metrics import timed
 
 
 class OpenCUABackend:
@@ -29,18 +30,24 @@ class OpenCUABackend:
         self.agent.reset()
 
     def predict(self, instruction: str, context: dict,
-                history: list, step_idx: int):
+                history: list, step_idx: int, cancel=None):
         from llm.router import AgentAction, ActionType
 
         obs = {
             "screenshot": context["screenshot_bytes"],
             "screenshot_scale": context.get("screenshot_scale", 1.0),
         }
-        response, actions, cot = self.agent.predict(
-            instruction=instruction, obs=obs, step_idx=step_idx,
-            recovery_hint=context.get("recovery_hint", ""),
-        )
-        return self._convert(actions, cot, response)
+        timings = {}
+        # OpenCUAAgent 内部完成请求和代码解析，整体计入 llm_call
+        with timed(timings, "llm_call"):
+            response, actions, cot = self.agent.predict(
+                instruction=instruction, obs=obs, step_idx=step_idx,
+                recovery_hint=context.get("recovery_hint", ""), cancel=cancel,
+            )
+        with timed(timings, "parse"):
+            action = self._convert(actions, cot, response)
+        action.timings = timings
+        return action
 
     def _convert(self, actions, cot, response):
         from llm.router import AgentAction, ActionType
@@ -5,6 +5,7 @@ from enum import Enum
 from loguru import logger
 
 import config
+from cancellation import CancelToken, TaskCancelled
 
 
 class ActionType(Enum):
@@ -13,6 +14,7 @@ class ActionType(Enum):
     SCROLL = "scroll"
     HOTKEY = "hotkey"
     DRAG = "drag"
+    BATCH = "batch"
     WAIT = "wait"
     DONE = "done"
     FAIL = "fail"
@@ -31,6 +33,10 @@ class AgentAction:
     thought: Optional[str] = None
     raw_response: Optional[str] = None
     raw_code: Optional[str] = None
+    actions: Optional[list] = None  # BATCH：按顺序执行的子动作（AgentAction）
+    backend: Optional[str] = None  # 产生该动作的后端（"claude" / "opencua"）
+    timings: dict = field(default_factory=dict)  # 阶段耗时（秒）：llm_call / parse
+    llm_request: Optional[dict] = None  # 会话录制开启时保存发给模型的请求（system + messages）
 
 
 class LLMRouter:
@@ -56,11 +62,33 @@ class LLMRouter:
         if self.opencua_backend:
             self.opencua_backend.reset()
 
+    @property
+    def can_speculate(self) -> bool:
+        """只有 Claude 后端无状态（历史全在参数里），预测结果可以丢弃"""
+        return self.claude_backend is not None
+
+    @staticmethod
+    def _tag(action: AgentAction, backend: str) -> AgentAction:
+        action.backend = backend
+        return action
+
+    def predict_speculative(self, instruction: str, context: dict,
+                            history: list, step_idx: int, cancel: Optional[CancelToken] = None) -> AgentAction:
+        """投机预测：只走 Claude，不回退 OpenCUA（OpenCUA 有内部状态，结果被丢弃时会污染），失败直接抛出"""
+        return self._tag(self.claude_backend.predict(instruction, context, history, step_idx, cancel=cancel), "claude")
+
     def predict(self, instruction: str, context: dict,
-                history: list, step_idx: int) -> AgentAction:
+                history: list, step_idx: int, cancel: Optional[CancelToken] = None) -> AgentAction:
+        """cancel 被取消时抛 TaskCancelled，不再回退到 OpenCUA"""
         if self.claude_backend:
             try:
-                return self.claude_backend.predict(instruction, context, history, step_idx)
+                return self._tag(self.claude_backend.predict(instruction, context, history, step_idx, cancel=cancel),
+                                 "claude")
+            except TaskCancelled:
+                raise
             except Exception as e:
                 logger.warning(f"Claude failed, falling back to OpenCUA: {e}")
-        return self.opencua_backend.predict(instruction, context, history, step_idx)
+        if cancel:
+            cancel.raise_if_cancelled()
+        return self._tag(self.opencua_backend.predict(instruction, context, history, step_idx, cancel=cancel),
+                         "opencua")
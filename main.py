@@ -6,10 +6,14 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import asyncio
+import threading
 import time
 import uuid
-from typing import Dict, Optional
-from fastapi import FastAPI, HTTPException, Security, Depends
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from fastapi import FastAPI, HTTPException, Security, Depends, Header, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, Field
 from loguru import logger
@@ -23,21 +27,57 @@ from recovery_manager import RecoveryManager
 from screenshot import capture_screenshot, get_screen_size
 from llm.router import LLMRouter, AgentAction, ActionType
 from action_retry_manager import ActionRetryManager, action_to_pyautogui
+from delay_model import SettleDelayModel
+from cancellation import CancelToken, TaskCancelled
+from task_runner import TaskRunner
+from task_queue import QueueFull, TaskQueue
+from task_store import FINISHED_STATUSES, TaskStore
+from task_events import EventBus
+from task_batch import BatchError, topo_order
+from frame_cache import FORMATS, Frame, FrameCache
+from step_budget import BudgetStats, StepBudget, parse_shares
+from metrics import PhaseHistograms, StepSpans, timed
+from recorder import SessionRecorder
 
 
 app = FastAPI(title="Computer Use Agent", version="1.0.0")
 
 # 全局实例
-context_mgr = ContextManager(use_omniparser=config.OMNIPARSER_ENABLED)
+frame_cache = FrameCache()
+context_mgr = ContextManager(use_omniparser=config.OMNIPARSER_ENABLED, frame_cache=frame_cache)
 prompt_mgr = PromptManager()
 recovery_mgr = RecoveryManager()
+delay_model = SettleDelayModel(
+    path=config.SETTLE_DELAY_PATH, default_delay=config.SETTLE_DEFAULT,
+    min_delay=config.SETTLE_MIN, max_delay=config.SETTLE_MAX, percentile=config.SETTLE_PERCENTILE,
+)
 
 # 任务存储
 tasks: Dict[str, dict] = {}
-MAX_TASKS = 50  # 最多保留任务数
+MAX_TASKS = 50  # 内存中最多保留任务数（更早的已结束任务只在任务库里）
+task_store = TaskStore(config.TASK_STORE_PATH, retention_days=config.TASK_RETENTION_DAYS,
+                       max_tasks=config.TASK_RETENTION_MAX) if config.TASK_STORE_PATH else None
 
-# 并发控制：同一时间只允许一个任务运行
-_task_lock = asyncio.Lock()
+# 批量任务：batch_id → {"order", "deps", ...}，整个批次是一个队列条目
+batches: "OrderedDict[str, dict]" = OrderedDict()
+
+# 并发控制：同一时间只允许一个队列条目（任务或批次）运行，其余排队
+ACTIVE_STATUSES = ("pending", "running", "awaiting_confirm")
+_task_lock = threading.Lock()
+_running_entry: Optional[str] = None  # 正在执行线程上运行的队列条目
+_session_preload: Optional[tuple] = None  # 当前桌面会话已设置的 (剪贴板, 文件) 预加载
+task_queue = TaskQueue(max_depth=config.QUEUE_MAX_DEPTH, default_task_seconds=config.QUEUE_DEFAULT_TASK_SECONDS)
+
+# 任务在专用线程的事件循环里执行，阻塞调用不影响 API 响应
+task_runner = TaskRunner()
+
+# 单步预算：STEP_TIMEOUT 分给各阶段，超出预算的阶段累计统计
+budget_shares = parse_shares(config.STEP_BUDGET_SHARES)
+budget_stats = BudgetStats()
+phase_metrics = PhaseHistograms()  # 各阶段耗时直方图（按后端 + 应用），GET /metrics 导出
+
+# 任务进度事件（执行线程发布，GET /task/{id}/events 以 SSE 推送）
+event_bus = EventBus(buffer_size=config.EVENT_BUFFER_SIZE, max_tasks=MAX_TASKS)
 
 # Agent 和 Executor
 agent: Optional[OpenCUAAgent] = None
@@ -67,12 +107,45 @@ class TaskRequest(BaseModel):
     clipboard_preload: Optional[str] = Field(default=None, max_length=1000)
     file_preload: Optional[str] = Field(default=None, max_length=500)
     confirm_before_send: Optional[bool] = False
+    priority: int = Field(default=0, ge=-10, le=10)  # 越大越先执行
+    client_id: Optional[str] = Field(default=None, max_length=100)  # 同优先级内按客户端轮转
 
 
 class TaskResponse(BaseModel):
     task_id: str
     status: str
     message: str
+    position: Optional[int] = None  # 排队位置（1 起），已开始为 None
+    estimated_start: Optional[float] = None  # 预计开始时间（unix 时间戳）
+
+
+class BatchTaskSpec(BaseModel):
+    key: str = Field(..., min_length=1, max_length=100)  # 批次内引用名
+    prompt: str = Field(..., max_length=10000)
+    depends_on: List[str] = Field(default_factory=list, max_length=20)
+    max_steps: Optional[int] = Field(default=config.MAX_STEPS, ge=1, le=100)
+    timeout: Optional[int] = Field(default=config.TASK_TIMEOUT, ge=10, le=600)
+    clipboard_preload: Optional[str] = Field(default=None, max_length=1000)  # 不填沿用批次共享的
+    file_preload: Optional[str] = Field(default=None, max_length=500)
+    confirm_before_send: Optional[bool] = False
+
+
+class BatchRequest(BaseModel):
+    tasks: List[BatchTaskSpec] = Field(..., min_length=1, max_length=20)
+    clipboard_preload: Optional[str] = Field(default=None, max_length=1000)  # 批次共享预加载
+    file_preload: Optional[str] = Field(default=None, max_length=500)
+    priority: int = Field(default=0, ge=-10, le=10)
+    client_id: Optional[str] = Field(default=None, max_length=100)
+    session_id: Optional[str] = Field(default=None, max_length=100)  # 协调器模式下决定批次发往哪个 worker
+
+
+class BatchResponse(BaseModel):
+    batch_id: str
+    status: str
+    tasks: Dict[str, str]  # key → task_id
+    order: List[str]  # 执行顺序（key）
+    position: Optional[int] = None
+    estimated_start: Optional[float] = None
 
 
 class TaskStatusResponse(BaseModel):
@@ -82,7 +155,10 @@ class TaskStatusResponse(BaseModel):
     steps: int
     result: Optional[str] = None
     error: Optional[str] = None
-    history: list
+    history: list  # since_step / limit / fields 过滤后的步骤
+    has_more: bool = False  # limit 截断了历史，用最后一步的 step 作为 since_step 继续取
+    position: Optional[int] = None
+    estimated_start: Optional[float] = None
 
 
 @app.on_event("startup")
@@ -126,62 +202,297 @@ async def startup_event():
     # 初始化 Executor
     executor = SafeExecutor(platform=config.PLATFORM)
 
+    if task_store:
+        interrupted = task_store.mark_interrupted()
+        if interrupted:
+            logger.warning(f"Marked {interrupted} unfinished tasks from the previous run as interrupted")
+    task_runner.start()
+
     logger.info(f"Agent initialized successfully (provider={config.LLM_PROVIDER})")
 
 
-@app.post("/task", response_model=TaskResponse)
-async def create_task(request: TaskRequest, api_key: str = Depends(verify_api_key)):
-    """创建新任务"""
-    # 并发控制：检查是否有任务在运行
-    running_tasks = [t for t in tasks.values() if t["status"] in ("pending", "running", "awaiting_confirm")]
-    if running_tasks:
-        raise HTTPException(status_code=409, detail="Another task is already running. Wait for it to finish or stop it first.")
-
-    # 任务清理：保留最近 MAX_TASKS 个
-    if len(tasks) >= MAX_TASKS:
-        sorted_tasks = sorted(tasks.items(), key=lambda x: x[1].get("created_at", 0))
-        for tid, _ in sorted_tasks[:len(tasks) - MAX_TASKS + 1]:
-            if tasks[tid]["status"] not in ("pending", "running", "awaiting_confirm"):
-                del tasks[tid]
-
-    task_id = str(uuid.uuid4())
-
-    tasks[task_id] = {
-        "task_id": task_id,
-        "status": "pending",
-        "prompt": request.prompt,
-        "max_steps": request.max_steps,
-        "timeout": request.timeout,
-        "clipboard_preload": request.clipboard_preload,
-        "file_preload": request.file_preload,
-        "confirm_before_send": request.confirm_before_send,
-        "confirm_event": asyncio.Event() if request.confirm_before_send else None,
+@app.on_event("shutdown")
+async def shutdown_event():
+    """停止时取消进行中的任务并关闭任务执行线程"""
+    for task in tasks.values():
+        if task["status"] in ACTIVE_STATUSES or task["status"] == "queued":
+            task["cancel"].cancel("Server shutting down")
+    task_runner.stop()
+    if task_store:
+        task_store.close()
+
+
+def _new_task(spec, priority: int, client_id: Optional[str], **extra) -> dict:
+    """按 TaskRequest / BatchTaskSpec 生成排队中的任务"""
+    return {
+        "task_id": str(uuid.uuid4()),
+        "status": "queued",
+        "priority": priority,
+        "client_id": client_id,
+        "prompt": spec.prompt,
+        "max_steps": spec.max_steps,
+        "timeout": spec.timeout,
+        "clipboard_preload": spec.clipboard_preload,
+        "file_preload": spec.file_preload,
+        "confirm_before_send": spec.confirm_before_send,
+        "confirm_event": asyncio.Event() if spec.confirm_before_send else None,
+        "cancel": CancelToken(),  # /stop 时取消，打断进行中的 LLM 调用、截图解析、动作和等待
         "confirm_result": None,  # "yes" or "no"
         "pending_code": None,  # 等待确认时暂存的代码
         "steps": 0,
         "result": None,
         "error": None,
         "history": [],
-        "created_at": time.time()
+        "revision": 0,  # 历史记录每次新增或修改时递增，参与 GET /task 的 ETag
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        **extra,
     }
 
-    # 异步执行任务
-    asyncio.create_task(execute_task(task_id))
 
+@app.post("/task", response_model=TaskResponse)
+async def create_task(request: TaskRequest, api_key: str = Depends(verify_api_key)):
+    """创建新任务：有任务在运行时排队，队列满返回 429"""
+    task = _new_task(request, request.priority, request.client_id)
+    task_id = task["task_id"]
+
+    # 先登记再入队，且都在锁内：执行线程出队时任务一定已在 tasks 里
+    with _task_lock:
+        tasks[task_id] = task
+        try:
+            task_queue.push(task_id, priority=request.priority, client=request.client_id)
+        except QueueFull as e:
+            del tasks[task_id]
+            raise HTTPException(status_code=429, detail=str(e),
+                                headers={"Retry-After": str(int(task_queue.avg_task_seconds))})
+        _evict_finished()
+    _persist(task)
+    _emit_status(task, position=task_queue.position(task_id))
+    _dispatch_next()
+
+    if task["status"] != "queued":
+        return TaskResponse(task_id=task_id, status=task["status"], message="Task created successfully")
+    position, estimated_start = _queue_eta(task_id)
     return TaskResponse(
         task_id=task_id,
-        status="pending",
-        message="Task created successfully"
+        status="queued",
+        message=f"Task queued (position {position})" if position else "Task queued",
+        position=position,
+        estimated_start=estimated_start,
     )
 
 
-@app.get("/task/{task_id}", response_model=TaskStatusResponse)
-async def get_task_status(task_id: str, api_key: str = Depends(verify_api_key)):
-    """查询任务状态"""
-    if task_id not in tasks:
+@app.post("/tasks/batch", response_model=BatchResponse)
+async def create_batch(request: BatchRequest, api_key: str = Depends(verify_api_key)):
+    """提交一组带依赖的任务：整个批次占一个队列位置，在同一桌面会话上按拓扑顺序连续执行，
+    只做一次窗口准备；依赖没有成功完成的任务跳过（skipped）。依赖无效或有环返回 422"""
+    keys = [spec.key for spec in request.tasks]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=422, detail="Duplicate task keys in batch")
+    try:
+        order = topo_order({spec.key: list(spec.depends_on) for spec in request.tasks})
+    except BatchError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    batch_id = str(uuid.uuid4())
+    specs = {spec.key: spec for spec in request.tasks}
+    by_key = {}
+    for key in order:
+        spec = specs[key]
+        by_key[key] = _new_task(spec, request.priority, request.client_id, batch_id=batch_id, batch_key=key,
+                                clipboard_preload=spec.clipboard_preload or request.clipboard_preload,
+                                file_preload=spec.file_preload or request.file_preload)
+    batch = {
+        "batch_id": batch_id,
+        "order": [by_key[key]["task_id"] for key in order],
+        "deps": {by_key[key]["task_id"]: [by_key[d]["task_id"] for d in specs[key].depends_on] for key in order},
+        "keys": {t["task_id"]: key for key, t in by_key.items()},
+        "created_at": time.time(),
+    }
+
+    # 先登记批次和任务再入队，且都在锁内：执行线程出队时批次一定已在 batches 里
+    with _task_lock:
+        batches[batch_id] = batch
+        for task in by_key.values():
+            tasks[task["task_id"]] = task
+        try:
+            task_queue.push(batch_id, priority=request.priority, client=request.client_id)
+        except QueueFull as e:
+            del batches[batch_id]
+            for task in by_key.values():
+                del tasks[task["task_id"]]
+            raise HTTPException(status_code=429, detail=str(e),
+                                headers={"Retry-After": str(int(task_queue.avg_task_seconds))})
+        position = task_queue.position(batch_id)
+        _evict_finished()
+    for task in by_key.values():
+        _persist(task)
+        _emit_status(task, position=position, batch_id=batch_id)
+    logger.info(f"Batch {batch_id} queued: {' -> '.join(order)}")
+    _dispatch_next()
+
+    position, estimated_start = _queue_eta(batch_id)
+    return BatchResponse(
+        batch_id=batch_id,
+        status="queued" if position else "running",
+        tasks={key: t["task_id"] for key, t in by_key.items()},
+        order=order,
+        position=position,
+        estimated_start=estimated_start,
+    )
+
+
+@app.get("/tasks/batch/{batch_id}")
+async def get_batch_status(batch_id: str, api_key: str = Depends(verify_api_key)):
+    """批次内各任务状态（按执行顺序）"""
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    rows = []
+    for tid in batch["order"]:
+        task = tasks.get(tid) or (task_store.get(tid) if task_store else None) or {}
+        rows.append({"key": batch["keys"][tid], "task_id": tid, "status": task.get("status"),
+                     "steps": task.get("steps"), "result": task.get("result"), "error": task.get("error"),
+                     "depends_on": [batch["keys"][d] for d in batch["deps"][tid]]})
+    position, estimated_start = _queue_eta(batch_id)
+    return {"batch_id": batch_id, "position": position, "estimated_start": estimated_start, "tasks": rows}
+
+
+def _evict_finished():
+    """内存只保留 MAX_TASKS 个任务：按创建顺序移出最早的已结束任务（调用方持 _task_lock）"""
+    excess = len(tasks) - MAX_TASKS
+    if excess > 0:
+        # 运行中或排队中批次的任务不移出：批次执行时要按 task_id 读它们（依赖状态）
+        active_batches = {bid for bid in batches if bid == _running_entry or bid in task_queue}
+        for tid in [tid for tid, t in tasks.items()
+                    if t["status"] in FINISHED_STATUSES and t.get("batch_id") not in active_batches][:excess]:
+            del tasks[tid]
+    # 批次只保留最近 MAX_TASKS 个（任务本身仍可按 task_id 从任务库查询）
+    while len(batches) > MAX_TASKS:
+        oldest = next(iter(batches))
+        if oldest == _running_entry or oldest in task_queue:
+            break
+        del batches[oldest]
+
+
+def _persist(task: dict):
+    """任务元数据和新增的历史步骤放进任务库写队列（不等磁盘）"""
+    if task_store is None:
+        return
+    history = task["history"]
+    for seq in range(task.get("_persisted_steps", 0), len(history)):
+        task_store.append_history(task["task_id"], seq, dict(history[seq]))
+    task["_persisted_steps"] = len(history)
+    task_store.save_task(task)
+
+
+def _touch(task: dict):
+    """历史记录有新增或修改（步骤定稿后补写 batch/settle/budget 等）"""
+    task["revision"] = task.get("revision", 0) + 1
+
+
+def _emit_status(task: dict, **extra):
+    """状态变化时发布 status 事件（结束状态附带结果）"""
+    if task.get("_emitted_status") == task["status"]:
+        return
+    task["_emitted_status"] = task["status"]
+    event_bus.publish(task["task_id"], "status", status=task["status"], steps=task["steps"],
+                      result=task["result"], error=task["error"], **extra)
+
+
+def _find_task(task_id: str) -> dict:
+    """内存中的任务，或任务库里已移出内存的任务（不含 history，需要时再加载）"""
+    task = tasks.get(task_id)
+    if task is None and task_store:
+        task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+def _running_elapsed() -> Optional[float]:
+    """当前运行任务已运行的秒数，没有任务运行返回 None"""
+    for t in tasks.values():
+        if t["status"] in ACTIVE_STATUSES:
+            return time.time() - (t.get("started_at") or t["created_at"])
+    return None
+
+
+def _queue_eta(task_id: str):
+    """(排队位置, 预计开始时间)，不在队列中为 (None, None)"""
+    position = task_queue.position(task_id)
+    if position is None:
+        return None, None
+    return position, task_queue.estimate_start(position, _running_elapsed())
+
+
+def _dispatch_next() -> Optional[str]:
+    """没有条目在运行时从队列取下一个（任务或批次）投递到执行线程（API 线程和执行线程都会调用）"""
+    global _running_entry
+    with _task_lock:
+        if _running_entry is not None:
+            return None
+        entry_id = task_queue.pop()
+        if entry_id is None:
+            return None
+        _running_entry = entry_id
+        if entry_id in tasks:
+            tasks[entry_id]["status"] = "pending"
+    if entry_id in tasks:
+        _emit_status(tasks[entry_id])
+    task_runner.submit(entry_id, _run_entry(entry_id))
+    return entry_id
+
+
+async def _run_entry(entry_id: str):
+    """在执行线程上运行一个队列条目，结束后投递下一个"""
+    global _running_entry
+    try:
+        if entry_id in batches:
+            await execute_batch(entry_id)
+        else:
+            await execute_task(entry_id)
+    finally:
+        with _task_lock:
+            _running_entry = None
+        _dispatch_next()
 
-    task = tasks[task_id]
+
+@app.get("/task/{task_id}", response_model=TaskStatusResponse)
+async def get_task_status(task_id: str, response: Response,
+                          since_step: Optional[int] = None, limit: Optional[int] = None,
+                          fields: Optional[str] = None,
+                          if_none_match: Optional[str] = Header(default=None),
+                          api_key: str = Depends(verify_api_key)):
+    """查询任务状态
+
+    - since_step: 只返回 step 大于它的历史记录（增量轮询）
+    - limit: 最多返回多少条历史，截断时 has_more=True
+    - fields: 历史记录保留的字段，逗号分隔（例如 step,action,thought 省掉 raw response）
+    - ETag 由状态、步数、历史修订号和查询参数决定，If-None-Match 命中返回 304（无 body）
+    """
+    task = _find_task(task_id)
+    position, estimated_start = (_queue_eta(task.get("batch_id") or task_id) if task["status"] == "queued"
+                                 else (None, None))
+    query = zlib.crc32(f"{since_step}|{limit}|{fields}".encode())
+    etag = f'W/"{task["steps"]}-{task["status"]}-{position or 0}-{task.get("revision", 0)}-{query:08x}"'
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    fetch = None if limit is None else max(0, limit) + 1  # 多取一条判断 has_more
+    if "history" in task:
+        history = [r for r in task["history"] if since_step is None or r["step"] > since_step]
+        history = history[:fetch] if fetch is not None else history
+    else:
+        history = await asyncio.to_thread(task_store.history, task_id, limit=fetch, since_step=since_step)
+    has_more = fetch is not None and len(history) == fetch
+    if has_more:
+        history = history[:-1]
+    if fields:
+        keep = {f.strip() for f in fields.split(",")}
+        history = [{k: v for k, v in r.items() if k in keep} for r in history]
     return TaskStatusResponse(
         task_id=task["task_id"],
         status=task["status"],
@@ -189,24 +500,58 @@ async def get_task_status(task_id: str, api_key: str = Depends(verify_api_key)):
         steps=task["steps"],
         result=task["result"],
         error=task["error"],
-        history=task["history"]
+        history=history,
+        has_more=has_more,
+        position=position,
+        estimated_start=estimated_start,
+    )
+
+
+@app.get("/task/{task_id}/events")
+async def stream_task_events(task_id: str, last_event_id: Optional[int] = Header(default=None),
+                             api_key: str = Depends(verify_api_key)):
+    """任务进度 SSE 流：step_started / action / executed / effect / status 事件，任务结束后关闭。
+
+    断线重连时带 Last-Event-ID 请求头，从缓冲区补发之后的事件。
+    """
+    task = _find_task(task_id)
+    final = ({k: task[k] for k in ("status", "steps", "result", "error")}
+             if task["status"] in FINISHED_STATUSES else None)
+    return StreamingResponse(
+        event_bus.stream(task_id, last_id=last_event_id or 0, heartbeat=config.SSE_HEARTBEAT, final=final),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 @app.post("/task/{task_id}/stop")
 async def stop_task(task_id: str, api_key: str = Depends(verify_api_key)):
     """停止任务"""
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    task = tasks[task_id]
-    if task["status"] in ("running", "awaiting_confirm"):
+    task = _find_task(task_id)
+    if task["status"] == "queued" and task_queue.remove(task_id):
+        task["status"] = "stopped"
+        task["error"] = "Task cancelled while queued"
+        task["cancel"].cancel("Task cancelled while queued")
+        _persist(task)
+        _emit_status(task)
+        return {"message": "Queued task cancelled"}
+    if task["status"] == "queued" and task.get("batch_id"):
+        # 批次中尚未开始的任务：批次执行到它时直接结束，依赖它的任务跳过
+        task["status"] = "stopped"
+        task["error"] = "Task cancelled while queued"
+        task["finished_at"] = time.time()
+        task["cancel"].cancel("Task cancelled while queued")
+        _persist(task)
+        _emit_status(task)
+        return {"message": "Queued batch task cancelled (dependent tasks will be skipped)"}
+    if task["status"] in ACTIVE_STATUSES:
         task["status"] = "stopped"
         task["error"] = "Task stopped by user"
+        task["cancel"].cancel("Task stopped by user")
         # 如果在等待确认，释放事件
         if task.get("confirm_event"):
             task["confirm_result"] = "no"
-            task["confirm_event"].set()
+            task_runner.call_soon(task["confirm_event"].set)
         return {"message": "Task stopped successfully"}
     else:
         return {"message": f"Task is not running (status: {task['status']})"}
@@ -219,54 +564,126 @@ class ConfirmRequest(BaseModel):
 @app.post("/task/{task_id}/confirm")
 async def confirm_task(task_id: str, request: ConfirmRequest, api_key: str = Depends(verify_api_key)):
     """确认或拒绝待确认的发送操作"""
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
-
-    task = tasks[task_id]
+    task = _find_task(task_id)
     if task["status"] != "awaiting_confirm":
         return {"message": f"Task is not awaiting confirmation (status: {task['status']})"}
 
     task["confirm_result"] = "yes" if request.confirm else "no"
-    task["confirm_event"].set()
+    # confirm_event 属于任务执行线程的事件循环，只能在那里 set
+    task_runner.call_soon(task["confirm_event"].set)
     action = "confirmed" if request.confirm else "rejected"
     return {"message": f"Task {action} successfully"}
 
 
-@app.get("/task/{task_id}/screenshot")
-async def get_task_screenshot(task_id: str, api_key: str = Depends(verify_api_key)):
-    """获取任务当前截图（用于确认前查看）"""
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="Task not found")
-
+_capture_lock = asyncio.Lock()
+
+
+async def _latest_frame(max_age: Optional[float]) -> Frame:
+    """截图流水线的最新帧（并发请求只截一次）：
+    有任务在执行时不论帧龄都用流水线的帧（不和任务循环抢截图），max_age=0 除外；
+    空闲时帧龄超过 max_age 秒才重新截图"""
+    if max_age != 0 and _running_entry is not None:
+        frame = frame_cache.latest()
+        if frame is not None:
+            return frame
+    max_age = config.FRAME_MAX_AGE if max_age is None else max_age
+    frame = frame_cache.latest(max_age)
+    if frame is not None:
+        return frame
+    async with _capture_lock:
+        frame = frame_cache.latest(max_age)
+        if frame is None:
+            start = time.time()
+            png, scale = await asyncio.to_thread(capture_screenshot, max_width=config.SCREENSHOT_MAX_WIDTH)
+            frame = frame_cache.put(png, scale, start)
+    return frame
+
+
+async def _frame_response(fmt: str, width: Optional[int], max_age: Optional[float],
+                          if_none_match: Optional[str], headers: Optional[dict] = None) -> Response:
+    """最新帧的二进制响应（PNG/JPEG，可缩略），支持 ETag/If-None-Match"""
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {list(FORMATS)}")
+    if width is not None and not 16 <= width <= 4096:
+        raise HTTPException(status_code=422, detail="width must be between 16 and 4096")
     try:
-        screenshot_bytes, _ = capture_screenshot()
-        from utils import encode_image
-        screenshot_base64 = encode_image(screenshot_bytes)
-        return {
-            "success": True,
-            "task_id": task_id,
-            "status": tasks[task_id]["status"],
-            "screenshot": f"data:image/png;base64,{screenshot_base64}"
-        }
+        frame = await _latest_frame(max_age)
     except Exception as e:
         logger.error(f"Failed to capture screenshot: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    quality = config.FRAME_JPEG_QUALITY
+    etag = frame_cache.etag(frame, fmt, width, quality)
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache",
+               "X-Captured-At": f"{frame.captured_at:.3f}"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    data = await asyncio.to_thread(frame_cache.render, frame, fmt, width, quality)
+    return Response(content=data, media_type=FORMATS[fmt], headers=headers)
+
+
+@app.get("/task/{task_id}/screenshot")
+async def get_task_screenshot(task_id: str, fmt: str = Query(default="png", alias="format"),
+                              width: Optional[int] = None,
+                              max_age: Optional[float] = None,
+                              if_none_match: Optional[str] = Header(default=None),
+                              api_key: str = Depends(verify_api_key)):
+    """任务当前画面（用于确认前查看）：返回截图流水线的最新帧，任务状态在 X-Task-Status 头里"""
+    task = _find_task(task_id)
+    return await _frame_response(fmt, width, max_age, if_none_match,
+                                 headers={"X-Task-Status": task["status"]})
 
 
 @app.get("/screenshot")
-async def get_screenshot(api_key: str = Depends(verify_api_key)):
-    """获取当前截图（调试用）"""
-    try:
-        screenshot_bytes = capture_screenshot()
-        from utils import encode_image
-        screenshot_base64 = encode_image(screenshot_bytes)
-        return {
-            "success": True,
-            "screenshot": f"data:image/png;base64,{screenshot_base64}"
-        }
-    except Exception as e:
-        logger.error(f"Failed to capture screenshot: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_screenshot(fmt: str = Query(default="png", alias="format"), width: Optional[int] = None,
+                         max_age: Optional[float] = None,
+                         if_none_match: Optional[str] = Header(default=None),
+                         api_key: str = Depends(verify_api_key)):
+    """当前画面（最新帧；format=png|jpeg，width 缩略，max_age 空闲时可接受的帧龄，0 强制重新截图）"""
+    return await _frame_response(fmt, width, max_age, if_none_match)
+
+
+@app.get("/tasks")
+async def list_tasks(status: Optional[str] = None, limit: int = 50, api_key: str = Depends(verify_api_key)):
+    """最近的任务（不含历史）：有任务库时从库里查，否则只列内存中的任务"""
+    limit = max(1, min(limit, 500))
+    if task_store:
+        return await asyncio.to_thread(task_store.list, status, limit)
+    rows = [{k: t.get(k) for k in ("task_id", "status", "prompt", "steps", "created_at", "finished_at")}
+            for t in tasks.values() if status is None or t["status"] == status]
+    return sorted(rows, key=lambda r: r["created_at"], reverse=True)[:limit]
+
+
+@app.get("/queue")
+async def get_queue(api_key: str = Depends(verify_api_key)):
+    """排队中的任务（按出队顺序）及预计开始时间"""
+    # 批次两个任务之间没有活跃任务，用批次 ID 表示 worker 仍被占用
+    running = next((t["task_id"] for t in tasks.values() if t["status"] in ACTIVE_STATUSES), None) or _running_entry
+    return {
+        "running": running,
+        "depth": len(task_queue),
+        "max_depth": task_queue.max_depth,
+        "avg_task_seconds": round(task_queue.avg_task_seconds, 1),
+        "queued": task_queue.snapshot(_running_elapsed()),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(api_key: str = Depends(verify_api_key)):
+    """各阶段耗时直方图（Prometheus 文本格式，按 phase / backend / app 标签）"""
+    return PlainTextResponse(phase_metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/step-budget")
+async def get_step_budget(api_key: str = Depends(verify_api_key)):
+    """单步预算配置和各阶段超出预算的累计统计"""
+    return {"step_timeout": config.STEP_TIMEOUT, "shares": budget_shares, "phases": budget_stats.snapshot()}
+
+
+@app.get("/settle-delays")
+async def get_settle_delays(api_key: str = Depends(verify_api_key)):
+    """学到的动作后等待时间表（按应用 + 动作类型）"""
+    return {"adaptive": config.SETTLE_ADAPTIVE, "default": config.SETTLE_DEFAULT,
+            "delays": delay_model.table()}
 
 
 async def _desktop_rename(instruction: str, task: dict) -> bool:
@@ -291,15 +708,114 @@ async def _desktop_rename(instruction: str, task: dict) -> bool:
     return True
 
 
-async def execute_task(task_id: str):
-    """执行任务（后台异步）"""
+async def _settle_after_action(app: Optional[str], action: AgentAction,
+                               cancel: CancelToken) -> Optional[dict]:
+    """动作后等待：自适应模式轮询缩略图直到画面稳定，并把观测结果计入延迟模型"""
+    if not config.SETTLE_ADAPTIVE:
+        await cancel.asleep(config.SETTLE_DEFAULT)
+        return None
+    return await delay_model.settle(app or "unknown", action.action_type.value,
+                                    executor.backend.thumbnail, cancel=cancel)
+
+
+def _finish_budget(budget: Optional[StepBudget], record: Optional[dict]):
+    """结束本步预算：写进步骤记录并计入累计统计，超出预算的阶段打日志"""
+    if budget is None:
+        return
+    budget.finish()
+    summary = budget.summary()
+    budget_stats.record(budget)
+    if record is not None:
+        record["budget"] = summary
+    if summary["overruns"]:
+        phases = ", ".join(f"{name} +{budget.phases[name]['overrun']:.2f}s" for name in summary["overruns"])
+        logger.warning(f"Step budget overrun ({budget.total:g}s): {phases}")
+
+
+def _finish_spans(spans: Optional[StepSpans], record: Optional[dict]):
+    """本步阶段耗时写进步骤记录（毫秒），并按后端 + 应用计入直方图；模型还没给出动作的步骤不计"""
+    if spans is None or record is None:
+        return
+    record["spans"] = spans.to_dict()
+    phase_metrics.observe_step(spans, record.get("backend"), record.get("app"))
+
+
+async def _apply_preload(clipboard_text: Optional[str], file_preload: Optional[str], cancel: CancelToken):
+    """设置剪贴板/文件预加载（用于中文等非ASCII文本），记为当前会话的预加载"""
+    global _session_preload
+    if clipboard_text:
+        await cancel.run(executor.set_clipboard_preload, clipboard_text, file_preload=file_preload)
+        logger.info(f"Clipboard preload set: {clipboard_text[:50]}...")
+        if file_preload:
+            logger.info(f"File preload set: {file_preload}")
+    else:
+        executor.clear_clipboard_preload()
+        # 如果只有 file_preload 没有 clipboard_preload，直接把文件复制到剪贴板
+        if file_preload:
+            await cancel.run(executor.copy_file_to_clipboard, file_preload)
+            logger.info(f"File copied to clipboard: {file_preload}")
+    _session_preload = (clipboard_text, file_preload)
+
+
+def _skip_batch_task(batch: dict, task: dict, reason: str):
+    task["status"] = "skipped"
+    task["error"] = reason
+    task["finished_at"] = time.time()
+    logger.info(f"Batch {task['batch_id']}: task {batch['keys'][task['task_id']]} skipped ({reason})")
+    _persist(task)
+    _emit_status(task)
+
+
+async def execute_batch(batch_id: str):
+    """按拓扑顺序连续执行批次任务：第一个真正开始的任务做窗口准备和重置，之后沿用同一会话"""
+    batch = batches[batch_id]
+    logger.info(f"Starting batch {batch_id} ({len(batch['order'])} tasks)")
+    prepared = False
+    try:
+        for task_id in batch["order"]:
+            task = tasks[task_id]
+            failed = [batch["keys"][d] for d in batch["deps"][task_id] if tasks[d]["status"] != "completed"]
+            if failed and not task["cancel"].cancelled:
+                _skip_batch_task(batch, task, f"Dependency not completed: {', '.join(failed)}")
+                continue
+            await execute_task(task_id, session_prepared=prepared)
+            prepared = prepared or task["started_at"] is not None
+    finally:
+        # 批次中途异常退出时，没轮到的任务不能一直停在 queued
+        for task_id in batch["order"]:
+            if tasks[task_id]["status"] == "queued":
+                _skip_batch_task(batch, tasks[task_id], "Batch aborted before this task ran")
+    outcome = ", ".join(f"{batch['keys'][tid]}={tasks[tid]['status']}" for tid in batch["order"])
+    logger.info(f"Batch {batch_id} finished: {outcome}")
+
+
+async def execute_task(task_id: str, session_prepared: bool = False):
+    """执行任务（后台异步）；session_prepared=True 为批次里的后续任务：沿用上一个任务的窗口和元素跟踪状态"""
     task = tasks[task_id]
+    cancel: CancelToken = task["cancel"]
+    if cancel.cancelled:
+        _emit_status(task)
+        return
     task["status"] = "running"
 
     start_time = time.time()
+    task["started_at"] = start_time
+    _persist(task)
+    _emit_status(task)
     max_steps = task["max_steps"]
     timeout = task["timeout"]
     confirm_before_send = task.get("confirm_before_send", False)
+    # 投机规划：(下一步上下文, 进行中的预测)，效果检测确认动作生效后才采用
+    speculation = None
+    # 当前步的预算、阶段耗时和步骤记录（下一步开始或任务结束时定稿）
+    budget, spans, step_record = None, None, None
+    # 会话录制（CUA_RECORD_DIR）：每步的帧、上下文、LLM 请求/响应和动作；目录不可写时不录制
+    recorder = None
+    if config.RECORD_DIR:
+        try:
+            recorder = SessionRecorder.start(task)
+        except OSError as e:
+            logger.warning(f"Session recording disabled: {e}")
 
     # 发送相关关键词（仅匹配 action 文本中明确的发送按钮点击）
     SEND_ACTION_PATTERNS = [
@@ -318,72 +834,72 @@ async def execute_task(task_id: str):
         return False
 
     try:
-        # 重置 Agent
+        # 重置 Agent（模型对话历史每个任务独立；批次后续任务保留元素跟踪状态）
         agent.reset()
         llm_router.reset()
+        if not session_prepared:
+            context_mgr.reset()
         task_history = []  # LLMRouter 用的历史
 
-        # 预加载剪贴板内容（用于中文等非ASCII文本）
-        clipboard_text = task.get("clipboard_preload")
-        file_preload = task.get("file_preload")
-        if clipboard_text:
-            executor.set_clipboard_preload(clipboard_text, file_preload=file_preload)
-            logger.info(f"Clipboard preload set: {clipboard_text[:50]}...")
-            if file_preload:
-                logger.info(f"File preload set: {file_preload}")
-        else:
-            executor.clear_clipboard_preload()
-            # 如果只有 file_preload 没有 clipboard_preload，直接把文件复制到剪贴板
-            if file_preload:
-                executor.copy_file_to_clipboard(file_preload)
-                logger.info(f"File copied to clipboard: {file_preload}")
+        # 预加载剪贴板内容（批次内与上一个任务相同则不重复设置）
+        preload = (task.get("clipboard_preload"), task.get("file_preload"))
+        if not session_prepared or preload != _session_preload:
+            await _apply_preload(*preload, cancel)
 
         instruction = task["prompt"]
         logger.info(f"Starting task {task_id}: {instruction}")
 
-        # 任务开始前：激活目标应用并最大化
-        try:
-            from window_manager import WindowManager
-            import win32gui, win32con
-            wm = WindowManager()
-            current_app = wm.detect_app()
-            prompt_lower = instruction.lower()
-            needs_wechat = "微信" in prompt_lower or "wechat" in prompt_lower
-            # 只有桌面文件操作（rename/delete/move 桌面上的文件）才最小化窗口
-            _desktop_ops = any(k in prompt_lower for k in ["rename", "重命名", "delete", "删除"])
-            needs_desktop = ("desktop" in prompt_lower or "桌面" in prompt_lower) and _desktop_ops
-
-            if needs_desktop:
-                # 最小化所有窗口，露出桌面
-                import win32gui, win32con as _wc
-                def _min_all(hwnd, _):
-                    if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
-                        cls = win32gui.GetClassName(hwnd)
-                        if cls not in ('Progman', 'WorkerW', 'Shell_TrayWnd', 'Shell_SecondaryTrayWnd'):
-                            try: win32gui.ShowWindow(hwnd, _wc.SW_MINIMIZE)
-                            except: pass
-                    return True
-                win32gui.EnumWindows(_min_all, None)
-                await asyncio.sleep(1)
-            elif needs_wechat and current_app != "wechat":
-                for w in wm.list_windows():
-                    if any(kw in w["process_name"].lower() for kw in ["powershell", "cmd", "windowsterminal"]):
-                        try:
-                            win32gui.ShowWindow(w["hwnd"], win32con.SW_MINIMIZE)
-                        except:
-                            pass
-                await asyncio.sleep(0.5)
-                wm.activate_window("微信")
-                await asyncio.sleep(1)
-            else:
-                wm.maximize_window()
-            await asyncio.sleep(0.5)
-            logger.info(f"Window prepared: app={wm.detect_app()}")
-        except Exception as e:
-            logger.warning(f"Failed to prepare window: {e}")
+        prompt_lower = instruction.lower()
+        needs_wechat = "微信" in prompt_lower or "wechat" in prompt_lower
+        # 只有桌面文件操作（rename/delete/move 桌面上的文件）才最小化窗口
+        _desktop_ops = any(k in prompt_lower for k in ["rename", "重命名", "delete", "删除"])
+        needs_desktop = ("desktop" in prompt_lower or "桌面" in prompt_lower) and _desktop_ops
+
+        # 任务开始前：激活目标应用并最大化（回放模式没有真实窗口、批次后续任务沿用当前窗口，跳过）
+        if session_prepared:
+            logger.info("Batch: reusing prepared session, skipping window preparation")
+        elif config.HEADLESS:
+            logger.info("Headless replay: skipping window preparation")
+        else:
+            try:
+                from window_manager import WindowManager
+                import win32gui, win32con
+                wm = WindowManager()
+                current_app = wm.detect_app()
+
+                if needs_desktop:
+                    # 最小化所有窗口，露出桌面
+                    import win32gui, win32con as _wc
+                    def _min_all(hwnd, _):
+                        if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
+                            cls = win32gui.GetClassName(hwnd)
+                            if cls not in ('Progman', 'WorkerW', 'Shell_TrayWnd', 'Shell_SecondaryTrayWnd'):
+                                try: win32gui.ShowWindow(hwnd, _wc.SW_MINIMIZE)
+                                except: pass
+                        return True
+                    win32gui.EnumWindows(_min_all, None)
+                    await cancel.asleep(1)
+                elif needs_wechat and current_app != "wechat":
+                    for w in wm.list_windows():
+                        if any(kw in w["process_name"].lower() for kw in ["powershell", "cmd", "windowsterminal"]):
+                            try:
+                                win32gui.ShowWindow(w["hwnd"], win32con.SW_MINIMIZE)
+                            except:
+                                pass
+                    await cancel.asleep(0.5)
+                    wm.activate_window("微信")
+                    await cancel.asleep(1)
+                else:
+                    wm.maximize_window()
+                await cancel.asleep(0.5)
+                logger.info(f"Window prepared: app={wm.detect_app()}")
+            except TaskCancelled:
+                raise
+            except Exception as e:
+                logger.warning(f"Failed to prepare window: {e}")
 
         # 桌面重命名快捷路径：直接用 Win32 API，跳过 agent 循环
-        if needs_desktop and "rename" in prompt_lower:
+        if needs_desktop and "rename" in prompt_lower and not config.HEADLESS:
             try:
                 result = await _desktop_rename(instruction, task)
                 if result:
@@ -391,6 +907,27 @@ async def execute_task(task_id: str):
             except Exception as e:
                 logger.warning(f"Desktop rename shortcut failed: {e}, falling back to agent")
 
+        async def _next_context(step: int, pending, budget: Optional[StepBudget] = None) -> dict:
+            """下一步的上下文（优先复用动作后预取的帧）+ 错误恢复检查；阻塞调用放到线程里，/stop 时立即返回。
+            budget 给出时截图计入 context 阶段、等待 OmniParser 解析计入 omniparser 阶段（超出预算按无元素继续）"""
+            if pending is None:
+                if budget:
+                    budget.enter("context")
+                pending = await cancel.run(context_mgr.prefetch)
+            token = budget.enter("omniparser") if budget else cancel
+            ctx = await cancel.run(context_mgr.resolve, pending, cancel=token)
+            if budget:
+                budget.finish()
+            with timed(ctx["timings"], "recovery"):
+                recovery = recovery_mgr.check_and_recover(step, "", ctx)
+            if recovery["recovery_hint"]:
+                logger.info(f"Recovery: {recovery['recovery_hint']}")
+                ctx["recovery_hint"] = recovery["recovery_hint"]
+            return ctx
+
+        # 上一步动作后预取的上下文（截图已完成，OmniParser 在后台解析）
+        pending_ctx = None
+
         for step in range(1, max_steps + 1):
             # 检查超时
             if time.time() - start_time > timeout:
@@ -400,29 +937,50 @@ async def execute_task(task_id: str):
                 break
 
             # 检查是否被停止
-            if task["status"] == "stopped":
-                logger.info(f"Task {task_id} stopped by user")
-                break
-
-            # 获取上下文（截图+窗口信息+SoM）
-            ctx = context_mgr.get_context()
+            cancel.raise_if_cancelled()
+
+            # 上一步的记录已定稿，写入任务库
+            _finish_budget(budget, step_record)
+            _finish_spans(spans, step_record)
+            _touch(task)
+            step_record = None
+            _persist(task)
+            event_bus.publish(task_id, "step_started", step=step)
+            budget = StepBudget(config.STEP_TIMEOUT, budget_shares, cancel)
+            spans = StepSpans()
+
+            # 获取上下文（截图+窗口信息+SoM）；上一步已投机预测时直接用它的上下文和结果
+            agent_action = None
+            if speculation is not None:
+                (ctx, spec), speculation = speculation, None
+                try:
+                    budget.enter("llm")  # 只计剩余的等待
+                    agent_action = await spec
+                except TaskCancelled:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Speculative prediction failed, predicting again: {e}")
+            else:
+                ctx = await _next_context(step, pending_ctx, budget)
+                pending_ctx = None
             screenshot_bytes = ctx["screenshot_bytes"]
 
-            # 错误恢复检查
-            recovery = recovery_mgr.check_and_recover(step, "", ctx)
-            if recovery["recovery_hint"]:
-                logger.info(f"Recovery: {recovery['recovery_hint']}")
-                ctx["recovery_hint"] = recovery["recovery_hint"]
-
             # LLMRouter 预测（Claude 优先，OpenCUA 兜底）
-            agent_action = llm_router.predict(
-                instruction=instruction,
-                context=ctx,
-                history=task_history,
-                step_idx=step,
-            )
-
-            # 转为可执行代码
+            speculative = agent_action is not None
+            if agent_action is None:
+                agent_action = await cancel.run(
+                    llm_router.predict,
+                    instruction=instruction,
+                    context=ctx,
+                    history=task_history,
+                    step_idx=step,
+                    cancel=budget.enter("llm"),
+                )
+            budget.finish()
+            spans.merge(ctx.get("timings"))  # 截图/编码/窗口/OmniParser/SoM/恢复检查（预取帧在本步使用时计入）
+            spans.merge(agent_action.timings)
+
+            # 代码形式只用于历史记录和发送判断，执行走结构化路径
             action_code = action_to_pyautogui(agent_action)
 
             # 记录历史
@@ -434,14 +992,26 @@ async def execute_task(task_id: str):
                 "raw_response": agent_action.raw_response,
                 "screenshot_b64": _enc(screenshot_bytes),
             })
-            task["history"].append({
+            step_record = {
                 "step": step,
                 "action": action_code,
                 "thought": agent_action.thought,
                 "code": action_code,
                 "response": agent_action.raw_response,
-            })
+                "backend": agent_action.backend,
+                "app": ctx.get("active_app"),
+            }
+            if ctx.get("som_diff") is not None:
+                step_record["element_diff"] = ctx["som_diff"].to_dict()
+            if speculative:
+                step_record["speculative"] = True
+            task["history"].append(step_record)
+            _touch(task)
+            if recorder:
+                recorder.record_step(step, ctx, agent_action, step_record)
             task["steps"] = step
+            event_bus.publish(task_id, "action", step=step, action_type=agent_action.action_type.value,
+                              action=action_code, thought=agent_action.thought)
 
             # 终止动作
             if agent_action.action_type == ActionType.DONE:
@@ -458,7 +1028,7 @@ async def execute_task(task_id: str):
 
             if agent_action.action_type == ActionType.WAIT:
                 logger.info("Waiting 20 seconds...")
-                await asyncio.sleep(20)
+                await cancel.asleep(20)
                 continue
 
             # 发送前确认机制
@@ -467,15 +1037,17 @@ async def execute_task(task_id: str):
                 task["status"] = "awaiting_confirm"
                 task["pending_code"] = action_code
                 task["confirm_event"].clear()
+                _emit_status(task, pending_code=action_code)
 
                 # 等待确认（最多等 5 分钟）
                 try:
-                    await asyncio.wait_for(task["confirm_event"].wait(), timeout=300)
+                    await cancel.wait_event(task["confirm_event"], timeout=300)
                 except asyncio.TimeoutError:
                     task["status"] = "timeout"
                     task["error"] = "Confirmation timeout (5 min)"
                     logger.warning(f"Task {task_id} confirmation timeout")
                     break
+                cancel.raise_if_cancelled()  # /stop 也会释放确认事件
 
                 if task["confirm_result"] != "yes":
                     task["status"] = "cancelled"
@@ -485,10 +1057,14 @@ async def execute_task(task_id: str):
 
                 # 确认通过，继续执行
                 task["status"] = "running"
+                _emit_status(task)
                 logger.info(f"Task {task_id} confirmed, executing send action")
 
-                # 执行发送动作
-                exec_result = executor.execute(action_code)
+                # 执行发送动作（等待人工确认的时间不计入本步预算）
+                with spans.span("execute"):
+                    exec_result = await cancel.run(executor.execute_action, agent_action, cancel)
+                event_bus.publish(task_id, "executed", step=step, success=exec_result["success"],
+                                  error=exec_result.get("error"))
                 if not exec_result["success"]:
                     task["status"] = "failed"
                     task["error"] = exec_result.get("error", "Task failed")
@@ -499,9 +1075,10 @@ async def execute_task(task_id: str):
                 # 重试最多 3 次，每次间隔 3 秒
                 send_verified = False
                 for retry in range(3):
-                    await asyncio.sleep(3)
-                    verify_ctx = context_mgr.get_context()
-                    verify_action = llm_router.predict(
+                    await cancel.asleep(3)
+                    verify_ctx = await cancel.run(context_mgr.get_context, cancel=cancel)
+                    verify_action = await cancel.run(
+                        llm_router.predict,
                         instruction=(
                             "请检查当前屏幕：发送是否成功？\n"
                             "判断标准：聊天输入框/预览区域中没有待发送的图片或文件，"
@@ -512,6 +1089,7 @@ async def execute_task(task_id: str):
                         context=verify_ctx,
                         history=task_history,
                         step_idx=step + retry + 1,
+                        cancel=cancel,
                     )
                     verify_code = action_to_pyautogui(verify_action)
 
@@ -523,7 +1101,11 @@ async def execute_task(task_id: str):
                         "response": verify_action.raw_response,
                         "verify_retry": retry
                     })
+                    _touch(task)
                     task["steps"] = step + retry + 1
+                    event_bus.publish(task_id, "action", step=step + retry + 1,
+                                      action_type=verify_action.action_type.value,
+                                      action=verify_code, thought=verify_action.thought, verify_retry=retry)
                     logger.info(f"Send verify retry {retry}: code={verify_code}")
 
                     if verify_action.action_type == ActionType.DONE:
@@ -534,7 +1116,7 @@ async def execute_task(task_id: str):
                         logger.warning(f"Task {task_id}: send verification reports failure")
                         break
                     else:
-                        executor.execute(verify_code)
+                        await cancel.run(executor.execute_action, verify_action, cancel)
 
                 if send_verified:
                     task["status"] = "completed"
@@ -546,9 +1128,20 @@ async def execute_task(task_id: str):
                     logger.error(f"Task {task_id}: send verification failed")
                 break  # 发送流程结束，退出主循环
 
-            # 执行
+            # 执行（动作、等待稳定、预取、效果检测和重试共用 execute 阶段预算）
             before_screenshot = screenshot_bytes
-            exec_result = executor.execute(action_code)
+            exec_token = budget.enter("execute")
+            with spans.span("execute"):
+                exec_result = await cancel.run(executor.execute_action, agent_action, exec_token)
+            if agent_action.action_type == ActionType.BATCH and "executed" in exec_result:
+                step_record["batch"] = {k: exec_result[k] for k in ("executed", "total", "aborted", "change_ratios")}
+                _touch(task)
+                if exec_result["aborted"]:
+                    # 让模型下一步知道宏只执行了一部分
+                    task_history[-1]["thought"] = (
+                        f"（宏中止于 {exec_result['executed']}/{exec_result['total']}）{agent_action.thought}")
+            event_bus.publish(task_id, "executed", step=step, success=exec_result["success"],
+                              error=exec_result.get("error"), batch=step_record.get("batch"))
 
             if not exec_result["success"]:
                 task["status"] = "failed"
@@ -556,31 +1149,82 @@ async def execute_task(task_id: str):
                 logger.error(f"Task {task_id} failed: {task['error']}")
                 break
 
-            # 短暂延迟
-            await asyncio.sleep(1)
+            # 等待画面稳定（按应用+动作类型学习的延迟）
+            with spans.span("settle"):
+                settle = await _settle_after_action(ctx.get("active_app"), agent_action, exec_token)
+            if settle:
+                step_record["settle"] = settle
+                _touch(task)
+
+            # 动作后只截一次图：OmniParser 在后台解析，同时做效果检测，结果直接作为下一步的上下文
+            pending_ctx = await cancel.run(context_mgr.prefetch)
 
             # 动作效果验证 + 自动重试
             if retry_mgr and agent_action.action_type in (ActionType.CLICK, ActionType.SCROLL):
                 import random
-                after_ctx = context_mgr.get_context()
-                effect = retry_mgr.check_action_effect(
-                    before_screenshot, after_ctx["screenshot_bytes"], agent_action)
+                # 元素变化相对动作前的帧计算、不推进跟踪状态；只在像素变化不足时才等待解析结果
+                pending = pending_ctx
+                element_diff = lambda: context_mgr.peek_element_diff(pending, cancel)
+                if config.SPECULATIVE_PLANNING and llm_router.can_speculate and step < max_steps:
+                    # 画面已稳定：下一步上下文现在定稿，下一步预测与效果检测并行；
+                    # 定稿上下文里的 som_diff 就是相对上一步的元素变化
+                    next_ctx = await _next_context(step + 1, pending_ctx)
+                    pending_ctx = None
+                    speculation = (next_ctx, asyncio.ensure_future(cancel.run(
+                        llm_router.predict_speculative,
+                        instruction=instruction,
+                        context=next_ctx,
+                        history=task_history,
+                        step_idx=step + 1,
+                        cancel=cancel,
+                    )))
+                    element_diff = lambda: next_ctx.get("som_diff")
+                with spans.span("effect"):
+                    effect = await cancel.run(
+                        retry_mgr.check_action_effect,
+                        before_screenshot, pending.frame["screenshot_bytes"], agent_action,
+                        element_diff=element_diff)
                 task_history[-1]["changed"] = effect["changed"]
+                event_bus.publish(task_id, "effect", step=step, changed=effect["changed"],
+                                  change_ratio=effect["change_ratio"], retry=0)
                 if not effect["changed"]:
-                    # 最多重试 1 次，避免点空白区域时死循环
+                    # 最多重试 1 次，避免点空白区域时死循环；本步预算已用完时不重试
                     max_retry = min(retry_mgr.max_retries, 1)
+                    if max_retry and exec_token.remaining() <= 0:
+                        logger.warning(f"No effect (ratio={effect['change_ratio']:.4f}), "
+                                       f"retry skipped: step budget exhausted")
+                        step_record["retry_skipped"] = "step budget exhausted"
+                        _touch(task)
+                        max_retry = 0
+                    if max_retry and speculation is not None:
+                        # 要重试：预测基于的画面作废（跟踪状态已推进到该帧，但它与动作前几乎相同）；
+                        # 不重试时保留已定稿的下一步上下文和预测，与动作生效时相同
+                        speculation[1].cancel()
+                        speculation = None
+                        logger.info(f"Task {task_id} step {step}: speculative prediction discarded")
                     for r in range(max_retry):
                         logger.warning(f"No effect (ratio={effect['change_ratio']:.4f}), retry {r+1}")
-                        if effect["suggestion"] == "retry" and agent_action.x and agent_action.y:
-                            agent_action.x += random.choice([-3, 0, 3])
-                            agent_action.y += random.choice([-3, 0, 3])
-                            executor.execute(action_to_pyautogui(agent_action))
-                        elif effect["suggestion"] == "scroll_down":
-                            executor.execute("pyautogui.scroll(-3)")
-                        await asyncio.sleep(1)
-                        after_ctx2 = context_mgr.get_context()
-                        effect = retry_mgr.check_action_effect(
-                            before_screenshot, after_ctx2["screenshot_bytes"], agent_action)
+                        with spans.span("execute"):
+                            if effect["suggestion"] == "retry" and agent_action.x and agent_action.y:
+                                agent_action.x += random.choice([-3, 0, 3])
+                                agent_action.y += random.choice([-3, 0, 3])
+                                await cancel.run(executor.execute_action, agent_action, exec_token)
+                            elif effect["suggestion"] == "scroll_down":
+                                await cancel.run(executor.execute_action, AgentAction(
+                                    action_type=ActionType.SCROLL, direction="down", amount=3), exec_token)
+                        with spans.span("settle"):
+                            await _settle_after_action(ctx.get("active_app"), agent_action, exec_token)
+                        # 重试后之前预取的帧已过期，重新预取
+                        if pending_ctx is not None:
+                            pending_ctx.discard()
+                        pending_ctx = pending = await cancel.run(context_mgr.prefetch)
+                        with spans.span("effect"):
+                            effect = await cancel.run(
+                                retry_mgr.check_action_effect,
+                                before_screenshot, pending.frame["screenshot_bytes"], agent_action,
+                                element_diff=lambda: context_mgr.peek_element_diff(pending, cancel))
+                        event_bus.publish(task_id, "effect", step=step, changed=effect["changed"],
+                                          change_ratio=effect["change_ratio"], retry=r + 1)
                         if effect["changed"]:
                             break
 
@@ -589,14 +1233,39 @@ async def execute_task(task_id: str):
             task["status"] = "failed"
             task["error"] = f"Reached maximum steps ({max_steps})"
 
+    except TaskCancelled as e:
+        # /stop 已把状态置为 stopped；这里只记录从取消到协程退出的耗时
+        lag_ms = (time.time() - cancel.cancelled_at) * 1000 if cancel.cancelled_at else 0.0
+        task["status"] = "stopped"
+        task["error"] = task["error"] or str(e) or "Task stopped"
+        logger.info(f"Task {task_id} stopped: in-flight work abandoned {lag_ms:.0f}ms after cancel")
+
     except Exception as e:
         logger.error(f"Task {task_id} error: {e}")
         task["status"] = "error"
         task["error"] = str(e)
 
     finally:
-        elapsed = time.time() - start_time
+        if speculation is not None and not speculation[1].cancel():
+            speculation[1].exception()  # 已结束的预测：取走异常，避免 "never retrieved" 警告
+        if cancel.cancelled:
+            # 被丢弃的线程调用可能还在解析截图或操作桌面：结束后才释放执行线程给下一个任务
+            still_running = await cancel.drain(config.STOP_DRAIN_TIMEOUT)
+            if still_running:
+                logger.warning(f"Task {task_id}: {still_running} abandoned call(s) still running after "
+                               f"{config.STOP_DRAIN_TIMEOUT:.0f}s")
+        _finish_budget(budget, step_record)
+        _finish_spans(spans, step_record)
+        _touch(task)
+        if recorder:
+            await asyncio.to_thread(recorder.close)
+        task["finished_at"] = time.time()
+        elapsed = task["finished_at"] - start_time
         logger.info(f"Task {task_id} finished in {elapsed:.2f}s with status: {task['status']}")
+        if task["status"] != "stopped":
+            task_queue.record_duration(elapsed)
+        _persist(task)
+        _emit_status(task)
 
 
 @app.get("/")
@@ -611,6 +1280,9 @@ async def root(api_key: str = Depends(verify_api_key)):
 
 if __name__ == "__main__":
     import uvicorn
+    if config.MODE == "coordinator":
+        # 协调器模式：不驱动本机桌面，只把任务分发给 CUA_WORKERS
+        from coordinator import app
     uvicorn.run(
         app,
         host=config.FASTAPI_HOST,
@@ -0,0 +1,95 @@
+"""阶段耗时 — execute_task 每步各阶段的 span 记进步骤历史，并按 后端 + 应用 汇总成直方图（GET /metrics）
+
+耗时跟着数据走：截图/编码/窗口枚举记在帧里、OmniParser/SoM 记在上下文里、模型调用/解析记在 AgentAction 上，
+这样动作后预取、后台解析的帧也算在真正使用它的那一步。导出为 Prometheus 文本格式。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# 一步内的阶段（按发生顺序）
+PHASES = ("capture", "encode", "windows", "omniparser", "som", "recovery",
+          "llm_call", "parse", "execute", "settle", "effect")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+@contextmanager
+def timed(timings: Optional[dict], name: str):
+    """把代码块耗时（秒）累加到 timings[name]；timings 为 None 时不计时"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class StepSpans:
+    """一步内各阶段耗时（秒），同一阶段多次发生（重试）时累加"""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    def span(self, name: str):
+        return timed(self.seconds, name)
+
+    def merge(self, timings: Optional[dict]):
+        for name, seconds in (timings or {}).items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        """{阶段: 毫秒}，按 PHASES 顺序"""
+        order = {name: i for i, name in enumerate(PHASES)}
+        return {name: round(s * 1000, 1)
+                for name, s in sorted(self.seconds.items(), key=lambda kv: order.get(kv[0], len(order)))}
+
+
+class PhaseHistograms:
+    """按 (阶段, 后端, 应用) 分桶的耗时直方图"""
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: Dict[tuple, dict] = {}
+        self.steps = 0
+
+    def observe_step(self, spans: StepSpans, backend: Optional[str], app: Optional[str]):
+        labels = (backend or "unknown", app or "unknown")
+        with self._lock:
+            self.steps += 1
+            for name, seconds in spans.seconds.items():
+                series = self._series.setdefault((name, *labels),
+                                                 {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        series["counts"][i] += 1
+                series["sum"] += seconds
+                series["count"] += 1
+
+    def render(self) -> str:
+        """Prometheus 文本格式（cua_step_phase_seconds 直方图 + cua_steps_total 计数）"""
+        lines = [
+            "# HELP cua_step_phase_seconds Time spent per execute_task step phase.",
+            "# TYPE cua_step_phase_seconds histogram",
+        ]
+        with self._lock:
+            for (phase, backend, app), series in sorted(self._series.items()):
+                labels = f'phase="{phase}",backend="{_escape(backend)}",app="{_escape(app)}"'
+                for bound, count in zip(self.buckets, series["counts"]):
+                    lines.append(f'cua_step_phase_seconds_bucket{{{labels},le="{bound:g}"}} {count}')
+                lines.append(f'cua_step_phase_seconds_bucket{{{labels},le="+Inf"}} {series["count"]}')
+                lines.append(f"cua_step_phase_seconds_sum{{{labels}}} {series['sum']:.6f}")
+                lines.append(f"cua_step_phase_seconds_count{{{labels}}} {series['count']}")
+            lines += [
+                "# HELP cua_steps_total Completed execute_task steps.",
+                "# TYPE cua_steps_total counter",
+                f"cua_steps_total {self.steps}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -12,14 +12,14 @@ class OmniParserService:
         self.base_url = base_url
         self.timeout = timeout
 
-    def parse(self, screenshot_bytes: bytes) -> list[dict]:
-        """解析截图，返回UI元素列表 [{"type","bbox","content","interactivity"}]"""
+    def parse(self, screenshot_bytes: bytes, timeout: Optional[float] = None) -> list[dict]:
+        """解析截图，返回UI元素列表 [{"type","bbox","content","interactivity"}]；timeout 默认 self.timeout"""
         b64 = base64.b64encode(screenshot_bytes).decode()
         try:
             r = httpx.post(
                 f"{self.base_url}/parse/",
                 json={"base64_image": b64},
-                timeout=self.timeout,
+                timeout=timeout or self.timeout,
             )
             r.raise_for_status()
             data = r.json()
@@ -32,19 +32,19 @@ class OmniParserService:
             return []
 
     def format_for_prompt(self, elements: list[dict], screen_w: int = 1366, screen_h: int = 768) -> str:
-        """将元素列表格式化为 agent 可读的文本，只保留交互元素"""
+        """将元素列表格式化为 agent 可读的文本，只保留交互元素
+        （增量清单只做在 SoM 上：那里的锚点清单随上下文一起发给模型）"""
         if not elements:
             return ""
         lines = ["Detected interactive UI elements:"]
         count = 0
-        for i, el in enumerate(elements):
-            interactive = el.get("interactivity", False)
-            if not interactive:
+        for el in elements:
+            if not el.get("interactivity", False):
                 continue
             bbox = el.get("bbox", [0, 0, 0, 0])
             cx = int((bbox[0] + bbox[2]) / 2 * screen_w)
             cy = int((bbox[1] + bbox[3]) / 2 * screen_h)
-            content = el.get("content", "").strip()
+            content = (el.get("content") or "").strip()
             el_type = el.get("type", "unknown")
             label = f'"{content}" ' if content else ""
             lines.append(f"  [{count}] {el_type}: {label}at ({cx},{cy})")
@@ -0,0 +1,149 @@
+"""本地 OmniParser 替身服务 — 不依赖 GPU 主机即可调用 /parse/
+
+元素来源（按优先级）：
+1. 录制目录中按帧哈希命中的响应（<sha1>.json，内容即 /parse/ 的响应体）
+2. --upstream 指定时转发到真实 OmniParser，并把响应写入录制目录
+3. 启发式检测：灰度图分块，按块内方差找出有内容的区域，同行相邻块合并成元素
+
+用法: python omniparser_stub.py --port 8001 [--recordings DIR] [--upstream http://10.0.0.1:8001] [--latency-ms 300]
+"""
+import argparse
+import base64
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Optional
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, HTTPException
+from loguru import logger
+from PIL import Image
+from pydantic import BaseModel
+
+
+class ParseRequest(BaseModel):
+    base64_image: str
+
+
+def frame_hash(image_bytes: bytes) -> str:
+    return hashlib.sha1(image_bytes).hexdigest()
+
+
+def detect_elements(image_bytes: bytes, tile: int = 16, std_threshold: float = 12.0,
+                    max_elements: int = 200) -> list:
+    """启发式元素检测：返回 OmniParser 格式的元素列表（bbox 为归一化坐标）"""
+    img = Image.open(io.BytesIO(image_bytes)).convert("L")
+    w, h = img.size
+    arr = np.asarray(img, dtype=np.float32)
+    rows, cols = h // tile, w // tile
+    if rows == 0 or cols == 0:
+        return []
+    blocks = arr[:rows * tile, :cols * tile].reshape(rows, tile, cols, tile)
+    busy = blocks.std(axis=(1, 3)) > std_threshold  # (rows, cols) 有内容的块
+
+    elements = []
+    for r in range(rows):
+        line = busy[r]
+        if not line.any():
+            continue
+        # 同行连续的有内容块合并为一个元素
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], line.astype(np.int8), [0]))))
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            width = end - start
+            elements.append({
+                "type": "text" if width >= 3 else "icon",
+                "bbox": [start * tile / w, r * tile / h, end * tile / w, (r + 1) * tile / h],
+                "interactivity": width < 3,
+                "content": "",
+                "source": "stub_heuristic",
+            })
+            if len(elements) >= max_elements:
+                return elements
+    return elements
+
+
+class OmniParserStub:
+    def __init__(self, recordings_dir: Optional[str] = None, upstream: Optional[str] = None,
+                 latency_ms: float = 0.0):
+        self.recordings_dir = recordings_dir
+        self.upstream = upstream
+        self.latency_ms = latency_ms
+        self.stats = {"requests": 0, "recorded_hits": 0, "upstream": 0, "heuristic": 0}
+        if recordings_dir:
+            os.makedirs(recordings_dir, exist_ok=True)
+
+    def _recording_path(self, digest: str) -> Optional[str]:
+        if not self.recordings_dir:
+            return None
+        return os.path.join(self.recordings_dir, f"{digest}.json")
+
+    def parse(self, base64_image: str) -> dict:
+        start = time.time()
+        self.stats["requests"] += 1
+        image_bytes = base64.b64decode(base64_image)
+        digest = frame_hash(image_bytes)
+        path = self._recording_path(digest)
+
+        if path and os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.stats["recorded_hits"] += 1
+        elif self.upstream:
+            r = httpx.post(f"{self.upstream}/parse/", json={"base64_image": base64_image}, timeout=60)
+            r.raise_for_status()
+            data = r.json()
+            self.stats["upstream"] += 1
+            if path:
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+        else:
+            data = {"parsed_content_list": detect_elements(image_bytes)}
+            self.stats["heuristic"] += 1
+
+        # 模拟 GPU 推理延迟
+        remaining = self.latency_ms / 1000 - (time.time() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+        data = dict(data)
+        data["latency"] = round(time.time() - start, 4)
+        return data
+
+
+def create_app(stub: OmniParserStub) -> FastAPI:
+    app = FastAPI(title="OmniParser Stub", version="1.0.0")
+
+    # 同步 def：FastAPI 放到线程池执行，模拟延迟不阻塞事件循环
+    @app.post("/parse/")
+    def parse(request: ParseRequest):
+        try:
+            return stub.parse(request.base64_image)
+        except Exception as e:
+            logger.error(f"Stub parse failed: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/probe/")
+    def probe():
+        return {"message": "OmniParser stub is ready", "stats": stub.stats}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OmniParser 替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--recordings", default=None, help="录制响应目录（<帧sha1>.json）")
+    parser.add_argument("--upstream", default=None, help="真实 OmniParser 地址；未命中录制时转发并录制")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="模拟推理延迟（毫秒）")
+    args = parser.parse_args()
+
+    import uvicorn
+    stub = OmniParserStub(args.recordings, args.upstream, args.latency_ms)
+    uvicorn.run(create_app(stub), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
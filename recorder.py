@@ -0,0 +1,117 @@
+"""会话录制 — 把任务每步模型看到的帧、上下文、LLM 请求/响应和动作写到会话目录，供 benchmarks.replay 回放
+
+目录结构（CUA_RECORD_DIR 下每个任务一个会话）：
+    <时间>-<task_id 前 8 位>/
+        task.json           任务参数 + 录制时的屏幕/模型配置
+        frames/0001.png     第 N 步模型看到的截图（流水线编码后的 PNG）
+        steps/0001.json     第 N 步的上下文（窗口、OmniParser 元素、SoM 文本）、LLM 请求/响应、动作
+请求里的截图不重复保存（替换为帧文件引用）。写盘在后台线程进行，不阻塞任务循环。
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from loguru import logger
+
+import config
+
+# 上下文里写进 steps/NNNN.json 的字段（截图字节单独存帧文件，SoM 表可由元素重建）
+CONTEXT_FIELDS = ("active_app", "active_window", "window_list", "screenshot_scale", "omniparser_elements",
+                  "omniparser_text", "som_text", "som_text_mode", "recovery_hint")
+
+
+def _without_images(messages: list, frame: str) -> list:
+    """messages 中的 base64 截图替换为帧文件引用"""
+    out = []
+    for msg in messages:
+        content = msg.get("content")
+        if isinstance(content, list):
+            content = [{"type": "image", "frame": frame} if block.get("type") == "image" else block
+                       for block in content]
+        out.append({**msg, "content": content})
+    return out
+
+
+class SessionRecorder:
+    def __init__(self, session_dir: str):
+        self.session_dir = session_dir
+        os.makedirs(os.path.join(session_dir, "frames"), exist_ok=True)
+        os.makedirs(os.path.join(session_dir, "steps"), exist_ok=True)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="recorder")
+        self.steps = 0
+
+    @classmethod
+    def start(cls, task: dict, root: Optional[str] = None) -> "SessionRecorder":
+        """为任务新建会话目录并写 task.json"""
+        root = root or config.RECORD_DIR
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{task['task_id'][:8]}"
+        recorder = cls(os.path.join(root, name))
+        meta = {k: task.get(k) for k in ("task_id", "prompt", "max_steps", "timeout", "clipboard_preload",
+                                         "file_preload", "confirm_before_send")}
+        meta.update(recorded_at=time.time(), screen=[config.SCREEN_WIDTH, config.SCREEN_HEIGHT],
+                    screenshot_max_width=config.SCREENSHOT_MAX_WIDTH, llm_model=config.LLM_MODEL)
+        recorder._submit(recorder._write_json, "task.json", meta)
+        logger.info(f"Recording session to {recorder.session_dir}")
+        return recorder
+
+    def record_step(self, step: int, ctx: dict, action, record: dict):
+        """保存一步：帧、上下文、LLM 请求/响应、动作（record 为步骤历史记录）"""
+        self.steps += 1
+        frame = f"frames/{step:04d}.png"
+        data = {
+            "step": step,
+            "frame": frame,
+            "context": {k: ctx.get(k) for k in CONTEXT_FIELDS},
+            "llm": {
+                "backend": action.backend,
+                "request": ({**action.llm_request, "messages": _without_images(action.llm_request["messages"], frame)}
+                            if action.llm_request else None),
+                "response": action.raw_response,
+                "seconds": action.timings.get("llm_call"),
+            },
+            "action": {
+                "type": action.action_type.value,
+                "code": record.get("code"),
+                "thought": action.thought,
+                **{k: getattr(action, k) for k in ("x", "y", "text", "key", "direction", "amount")
+                   if getattr(action, k) is not None},
+            },
+        }
+        self._submit(self._write_bytes, frame, ctx["screenshot_bytes"])
+        self._submit(self._write_json, f"steps/{step:04d}.json", data)
+
+    def close(self):
+        """等待写盘完成"""
+        self._pool.shutdown(wait=True)
+        logger.info(f"Recorded {self.steps} steps to {self.session_dir}")
+
+    def _submit(self, fn, *args):
+        self._pool.submit(fn, *args).add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(future):
+        if future.exception() is not None:
+            logger.warning(f"Session recording write failed: {future.exception()}")
+
+    def _write_bytes(self, name: str, data: bytes):
+        with open(os.path.join(self.session_dir, name), "wb") as f:
+            f.write(data)
+
+    def _write_json(self, name: str, data: dict):
+        with open(os.path.join(self.session_dir, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+
+def load_session(session_dir: str) -> dict:
+    """读取会话：{"task": task.json, "steps": [steps/*.json 按步号]}"""
+    with open(os.path.join(session_dir, "task.json"), encoding="utf-8") as f:
+        task = json.load(f)
+    steps = []
+    steps_dir = os.path.join(session_dir, "steps")
+    for name in sorted(os.listdir(steps_dir)):
+        if name.endswith(".json"):
+            with open(os.path.join(steps_dir, name), encoding="utf-8") as f:
+                steps.append(json.load(f))
+    return {"task": task, "steps": steps}
@@ -1,12 +1,12 @@
 """错误恢复管理器 - 检测常见错误并提供恢复策略"""
 import time
 from loguru import logger
-from window_manager import WindowManager
+from window_manager import create_window_manager
 
 
 class RecoveryManager:
     def __init__(self):
-        self.wm = WindowManager()
+        self.wm = create_window_manager()
         self.checkpoints = []
 
     def save_checkpoint(self, step: int, screenshot: bytes):
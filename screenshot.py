@@ -1,48 +1,136 @@
 """
 截图模块（使用 mss）
 """
+import glob
+import os
 import mss
 from io import BytesIO
+from typing import Optional
 from PIL import Image
 from loguru import logger
 
+import config
+from metrics import timed
 
-def capture_screenshot(max_width: int = 1366) -> tuple:
+
+class ReplayScreen:
+    """
+    无桌面回放：按文件名顺序循环回放目录下的 PNG，每次截图前进一帧。
+    缩放规则与实时截图相同，结果按 (帧, max_width) 缓存。
+    """
+
+    def __init__(self, frames_dir: str):
+        self.paths = sorted(glob.glob(os.path.join(frames_dir, "*.png")))
+        if not self.paths:
+            raise FileNotFoundError(f"No PNG frames in {frames_dir}")
+        with Image.open(self.paths[0]) as img:
+            self.size = img.size
+        self.index = -1
+        self._cache = {}
+        logger.info(f"Replaying {len(self.paths)} frames from {frames_dir}")
+
+    def capture(self, max_width: int, timings: Optional[dict] = None) -> tuple:
+        self.index = (self.index + 1) % len(self.paths)
+        key = (self.index, max_width)
+        if key not in self._cache:
+            with timed(timings, "capture"), Image.open(self.paths[self.index]) as img:
+                img = img.convert('RGB')
+            with timed(timings, "encode"):
+                self._cache[key] = _encode(img, max_width)
+        return self._cache[key]
+
+    def thumbnail(self, width: int):
+        import numpy as np
+        with Image.open(self.paths[max(self.index, 0)]) as img:
+            gray = img.convert('L')
+        height = max(1, int(gray.height * width / gray.width))
+        return np.asarray(gray.resize((width, height), Image.BILINEAR))
+
+
+_replay: Optional[ReplayScreen] = None
+
+
+def _replay_screen() -> ReplayScreen:
+    global _replay
+    if _replay is None:
+        _replay = ReplayScreen(config.REPLAY_FRAMES_DIR)
+    return _replay
+
+
+def rewind_replay():
+    """回放模式：下一次截图从第一帧开始（录制会话重复回放时每轮对齐）"""
+    if config.HEADLESS:
+        _replay_screen().index = -1
+
+
+def _encode(img: Image.Image, max_width: int) -> tuple:
+    """等比缩放到 max_width 以内并编码 PNG，返回 (PNG字节, 缩放比例)"""
+    scale = 1.0
+    if img.width > max_width:
+        scale = img.width / max_width  # e.g. 1920/1080 = 1.778
+        new_size = (max_width, int(img.height / scale))
+        logger.info(f"Screenshot resized: {img.size} -> {new_size}, scale={scale:.3f}")
+        img = img.resize(new_size, Image.LANCZOS)
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue(), scale
+
+
+def capture_screenshot(max_width: int = 1366, timings: Optional[dict] = None) -> tuple:
     """
     使用 mss 捕获主显示器截图，返回 (PNG字节, 缩放比例)。
     如果截图宽度超过 max_width，会等比缩放以减少 token 消耗。
     缩放比例用于将模型输出的坐标映射回原始屏幕坐标。
+    回放模式（CUA_REPLAY_FRAMES）下返回回放帧。
+    timings 给出时把截图、缩放编码耗时（秒）分别累加到 "capture"、"encode"。
     """
+    if config.HEADLESS:
+        return _replay_screen().capture(max_width, timings)
     try:
         with mss.mss() as sct:
             # 捕获主显示器（monitor 1）
-            monitor = sct.monitors[1]
-            screenshot = sct.grab(monitor)
-
-            # 转换为 PIL Image
-            img = Image.frombytes('RGB', screenshot.size, screenshot.rgb)
-
-            # 等比缩放（减少发给模型的 token 数）
-            scale = 1.0
-            if img.width > max_width:
-                scale = img.width / max_width  # e.g. 1920/1080 = 1.778
-                new_size = (max_width, int(img.height / scale))
-                img = img.resize(new_size, Image.LANCZOS)
-                logger.info(f"Screenshot resized: {screenshot.size} -> {new_size}, scale={scale:.3f}")
-
-            # 转换为 PNG 字节
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            return buffer.getvalue(), scale
+            with timed(timings, "capture"):
+                monitor = sct.monitors[1]
+                screenshot = sct.grab(monitor)
+
+            # 转换为 PIL Image，等比缩放（减少发给模型的 token 数）并编码 PNG
+            with timed(timings, "encode"):
+                img = Image.frombytes('RGB', screenshot.size, screenshot.rgb)
+                return _encode(img, max_width)
     except Exception as e:
         logger.error(f"Failed to capture screenshot: {e}")
         raise
 
 
+def capture_thumbnail(width: int = 160):
+    """
+    低成本灰度缩略图（numpy uint8 数组），用于动作间的稳定检查；不编码 PNG。
+    """
+    if config.HEADLESS:
+        return _replay_screen().thumbnail(width)
+    import numpy as np
+    with mss.mss() as sct:
+        shot = sct.grab(sct.monitors[1])
+        img = Image.frombytes('RGB', shot.size, shot.rgb).convert('L')
+    height = max(1, int(img.height * width / img.width))
+    return np.asarray(img.resize((width, height), Image.BILINEAR))
+
+
+def thumbnail_change(a, b, pixel_threshold: int = 15) -> float:
+    """两张灰度缩略图的像素变化比例（同 ActionRetryManager 的阈值）；尺寸不同视为全变"""
+    import numpy as np
+    if a is None or b is None or a.shape != b.shape:
+        return 1.0
+    diff = np.abs(a.astype(np.int16) - b.astype(np.int16))
+    return float(np.count_nonzero(diff > pixel_threshold)) / diff.size
+
+
 def get_screen_size() -> tuple:
     """
-    获取主显示器的分辨率
+    获取主显示器的分辨率（回放模式下为回放帧尺寸）
     """
+    if config.HEADLESS:
+        return _replay_screen().size
     try:
         with mss.mss() as sct:
             monitor = sct.monitors[1]
@@ -1,6 +1,9 @@
 """SoM 转换器 — OmniParser JSON → 标准化元素清单 + 坐标校正"""
-from dataclasses import dataclass
-from typing import List, Tuple
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
 
 
 def detect_dpi_scale() -> float:
@@ -29,40 +32,376 @@ class SoMElement:
     center_y: int
 
 
+# 元素类型码（SoMTable.type_codes 的取值）
+TYPE_NAMES = ("button", "text_field", "link", "icon", "control", "label")
+TYPE_CODES = {name: code for code, name in enumerate(TYPE_NAMES)}
+
+# (原始 type, interactivity) → 类型码；OmniParser 的 type 取值很少，缓存避免逐元素字符串扫描
+_CLASSIFY_CACHE: Dict[Tuple[str, bool], int] = {}
+_CLASSIFY_CACHE_MAX = 1024
+
+# 行分组高度（像素）：同一行内按 x 排序
+ROW_BAND = 50
+
+# 屏幕三等分位置描述（与 _describe_position 一致）
+_THIRDS_H = ("左", "中", "右")
+_THIRDS_V = ("上", "中", "下")
+
+
+def _classify_code(raw_type: str, interactive: bool) -> int:
+    key = (raw_type, interactive)
+    code = _CLASSIFY_CACHE.get(key)
+    if code is not None:
+        return code
+    t = raw_type.lower()
+    if "button" in t:
+        name = "button"
+    elif "input" in t or ("text" in t and interactive):
+        name = "text_field"
+    elif "link" in t:
+        name = "link"
+    elif "icon" in t or "image" in t:
+        name = "icon"
+    elif interactive:
+        name = "control"
+    else:
+        name = "label"
+    if len(_CLASSIFY_CACHE) >= _CLASSIFY_CACHE_MAX:
+        _CLASSIFY_CACHE.clear()
+    code = _CLASSIFY_CACHE[key] = TYPE_CODES[name]
+    return code
+
+
+class SoMTable:
+    """SoM 元素表（列式存储）
+
+    bboxes: (N, 4) float64 归一化坐标；centers: (N, 2) int64 像素中心（DPI 校正后）；
+    type_codes: (N,) int8；interactable / has_content: (N,) bool；contents: 驻留字符串列表；
+    ids: (N,) int64。按行取出时返回 SoMElement，兼容原有 API。
+    """
+
+    __slots__ = ("bboxes", "centers", "type_codes", "interactable", "has_content", "contents", "ids")
+
+    def __init__(self, bboxes: np.ndarray, centers: np.ndarray, type_codes: np.ndarray,
+                 interactable: np.ndarray, contents: List[str], ids: np.ndarray = None,
+                 has_content: np.ndarray = None):
+        self.bboxes = bboxes
+        self.centers = centers
+        self.type_codes = type_codes
+        self.interactable = interactable
+        self.contents = contents
+        if has_content is None:
+            has_content = np.fromiter((bool(c) for c in contents), dtype=bool, count=len(contents))
+        self.has_content = has_content
+        self.ids = ids if ids is not None else np.arange(len(contents), dtype=np.int64)
+
+    @classmethod
+    def empty(cls) -> "SoMTable":
+        return cls(
+            bboxes=np.zeros((0, 4), dtype=np.float64),
+            centers=np.zeros((0, 2), dtype=np.int64),
+            type_codes=np.zeros(0, dtype=np.int8),
+            interactable=np.zeros(0, dtype=bool),
+            contents=[],
+        )
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def __getitem__(self, i: int) -> SoMElement:
+        b = self.bboxes[i]
+        return SoMElement(
+            id=int(self.ids[i]),
+            type=TYPE_NAMES[self.type_codes[i]],
+            content=self.contents[i],
+            bbox=(float(b[0]), float(b[1]), float(b[2]), float(b[3])),
+            interactable=bool(self.interactable[i]),
+            center_x=int(self.centers[i, 0]),
+            center_y=int(self.centers[i, 1]),
+        )
+
+    def __iter__(self) -> Iterator[SoMElement]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_elements(self) -> List[SoMElement]:
+        # 整列 tolist() 一次转换，避免逐元素 numpy 标量开销
+        return [
+            SoMElement(id=i, type=TYPE_NAMES[t], content=c, bbox=tuple(b),
+                       interactable=a, center_x=xy[0], center_y=xy[1])
+            for i, t, c, b, a, xy in zip(
+                self.ids.tolist(), self.type_codes.tolist(), self.contents,
+                self.bboxes.tolist(), self.interactable.tolist(), self.centers.tolist(),
+            )
+        ]
+
+    def take(self, index: np.ndarray) -> "SoMTable":
+        """按索引数组（或布尔掩码）取子表"""
+        index = np.asarray(index)
+        if index.dtype == bool:
+            index = np.flatnonzero(index)
+        return SoMTable(
+            bboxes=self.bboxes[index],
+            centers=self.centers[index],
+            type_codes=self.type_codes[index],
+            interactable=self.interactable[index],
+            contents=[self.contents[i] for i in index],
+            ids=self.ids[index],
+            has_content=self.has_content[index],
+        )
+
+    def listable_mask(self) -> np.ndarray:
+        """可进入 prompt 清单的元素：可交互或带文字"""
+        return self.interactable | self.has_content
+
+
+@dataclass
+class ElementDiff:
+    """相邻两帧的元素变化（元素 id 为跨帧持久 id）"""
+    appeared: List[int] = field(default_factory=list)
+    disappeared: List[int] = field(default_factory=list)
+    moved: List[int] = field(default_factory=list)
+    changed: List[int] = field(default_factory=list)  # 位置不变、文字变化
+    labels: Dict[int, str] = field(default_factory=dict)  # id → 简短描述（含已消失元素）
+    first_frame: bool = False
+
+    @property
+    def any(self) -> bool:
+        return bool(self.appeared or self.disappeared or self.moved or self.changed)
+
+    def to_dict(self) -> dict:
+        return {
+            "appeared": self.appeared,
+            "disappeared": self.disappeared,
+            "moved": self.moved,
+            "changed": self.changed,
+        }
+
+    def summary(self, max_items: int = 8) -> str:
+        """生成给模型看的变化摘要"""
+        if self.first_frame:
+            return ""
+        if not self.any:
+            return "界面元素无变化"
+
+        def _fmt(ids: List[int]) -> str:
+            items = [f"[{i}] {self.labels.get(i, '')}".rstrip() for i in ids[:max_items]]
+            if len(ids) > max_items:
+                items.append(f"…等 {len(ids)} 个")
+            return "; ".join(items)
+
+        parts = []
+        if self.appeared:
+            parts.append(f"新增: {_fmt(self.appeared)}")
+        if self.disappeared:
+            parts.append(f"消失: {_fmt(self.disappeared)}")
+        if self.moved:
+            parts.append(f"移动: {_fmt(self.moved)}")
+        if self.changed:
+            parts.append(f"文字变化: {_fmt(self.changed)}")
+        return "\n".join(parts)
+
+
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 4) × (M, 4) → (N, M) IoU"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def _label(table: SoMTable, i: int) -> str:
+    content = table.contents[i]
+    name = TYPE_NAMES[table.type_codes[i]]
+    return f'{name} "{content[:20]}"' if content else name
+
+
+class ElementTracker:
+    """跨帧元素跟踪 — IoU + 文字匹配，为元素分配持久 id"""
+
+    def __init__(self, iou_threshold: float = 0.5, move_px: int = 10):
+        self.iou_threshold = iou_threshold
+        self.move_px = move_px
+        self.prev: Optional[SoMTable] = None
+        self._next_id = 0
+
+    def reset(self):
+        self.prev = None
+        self._next_id = 0
+
+    def update(self, table: SoMTable) -> ElementDiff:
+        """与上一帧匹配，给 table 写入持久 id，并把它作为新的上一帧"""
+        ids, diff = self._match(table)
+        table.ids = ids
+        self._next_id += len(diff.appeared)
+        self.prev = table
+        return diff
+
+    def compare(self, table: SoMTable) -> ElementDiff:
+        """只计算变化，不改 table、不推进跟踪状态（用于动作效果检测）"""
+        return self._match(table)[1]
+
+    def _match(self, table: SoMTable) -> Tuple[np.ndarray, ElementDiff]:
+        n = len(table)
+        prev = self.prev
+        if prev is None or len(prev) == 0 or n == 0:
+            ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+            diff = ElementDiff(appeared=ids.tolist(), first_frame=prev is None)
+            if prev is not None:
+                diff.disappeared = prev.ids.tolist()
+                diff.labels.update((int(prev.ids[j]), _label(prev, j)) for j in range(len(prev)))
+            diff.labels.update((int(ids[i]), _label(table, i)) for i in range(n))
+            return ids, diff
+
+        # 文字编码成整数，用广播比较
+        vocab: Dict[str, int] = {}
+        cur_codes = np.array([vocab.setdefault(c, len(vocab)) for c in table.contents])
+        prev_codes = np.array([vocab.setdefault(c, len(vocab)) for c in prev.contents])
+
+        iou = _iou_matrix(table.bboxes, prev.bboxes)
+        same_type = table.type_codes[:, None] == prev.type_codes[None, :]
+        same_content = (cur_codes[:, None] == prev_codes[None, :]) & table.has_content[:, None]
+        delta = table.centers[:, None, :] - prev.centers[None, :, :]
+        dist = np.hypot(delta[..., 0], delta[..., 1])
+
+        # 候选：同类型且（位置重叠 或 文字相同）；得分优先文字相同、重叠大、距离近
+        candidate = same_type & ((iou >= self.iou_threshold) | same_content)
+        rows, cols = np.nonzero(candidate)
+        score = iou[rows, cols] + same_content[rows, cols] - dist[rows, cols] / max(dist.max(), 1.0) * 0.5
+        order = np.argsort(-score, kind="stable")
+
+        # 贪心分配：按得分从高到低，两边都未被占用才配对
+        match = [-1] * n
+        used = [False] * len(prev)
+        remaining = min(n, len(prev))
+        for i, j in zip(rows[order].tolist(), cols[order].tolist()):
+            if match[i] < 0 and not used[j]:
+                match[i] = j
+                used[j] = True
+                remaining -= 1
+                if remaining == 0:
+                    break
+        matched_prev = np.array(match, dtype=np.int64)
+        used_prev = np.array(used, dtype=bool)
+
+        ids = np.empty(n, dtype=np.int64)
+        hit = matched_prev >= 0
+        ids[hit] = prev.ids[matched_prev[hit]]
+        new_idx = np.flatnonzero(~hit)
+        ids[new_idx] = np.arange(self._next_id, self._next_id + len(new_idx))
+
+        hit_idx = np.flatnonzero(hit)
+        hit_prev = matched_prev[hit_idx]
+        moved = dist[hit_idx, hit_prev] > self.move_px
+        changed = cur_codes[hit_idx] != prev_codes[hit_prev]
+        gone = np.flatnonzero(~used_prev)
+
+        diff = ElementDiff(
+            appeared=ids[new_idx].tolist(),
+            disappeared=prev.ids[gone].tolist(),
+            moved=ids[hit_idx[moved]].tolist(),
+            changed=ids[hit_idx[changed & ~moved]].tolist(),
+        )
+        for i in np.concatenate([new_idx, hit_idx[moved | changed]]).tolist():
+            diff.labels[int(ids[i])] = _label(table, i)
+        for j in gone.tolist():
+            diff.labels[int(prev.ids[j])] = _label(prev, j)
+        return ids, diff
+
+
 class SoMConverter:
-    def __init__(self, screen_w: int, screen_h: int, dpi_scale: float = 1.0):
+    def __init__(self, screen_w: int, screen_h: int, dpi_scale: float = 1.0, track: bool = False,
+                 delta_anchor_every: int = 0):
         self.screen_w = screen_w
         self.screen_h = screen_h
         self.dpi_scale = dpi_scale
+        # 跨帧持久 id（关闭时每帧按位置重新编号）
+        self.tracker = ElementTracker() if track else None
+        # 增量清单：每隔 delta_anchor_every 步重新发送完整清单（锚点），0 = 关闭
+        self.delta_anchor_every = delta_anchor_every
+        self.anchor_text = ""
+        self.last_format_mode = "full"
+        self._anchor: Optional[SoMTable] = None
+        self._anchor_age = 0
+
+    def reset(self):
+        """新任务开始时清空跨帧状态"""
+        if self.tracker:
+            self.tracker.reset()
+        self.anchor_text = ""
+        self.last_format_mode = "full"
+        self._anchor = None
+        self._anchor_age = 0
+
+    @property
+    def delta_enabled(self) -> bool:
+        return bool(self.tracker) and self.delta_anchor_every > 0
+
+    def track(self, table: SoMTable, commit: bool = True) -> Optional[ElementDiff]:
+        """为 table 分配持久 id 并返回相对上一帧的变化；commit=False 只比较不推进状态"""
+        if not self.tracker:
+            return None
+        return self.tracker.update(table) if commit else self.tracker.compare(table)
 
     def convert(self, omniparser_elements: list, max_elements: int = 40) -> List[SoMElement]:
-        elements = []
-        for el in omniparser_elements:
-            if len(elements) >= max_elements:
-                break
-            bbox = el.get("bbox", [0, 0, 0, 0])
-            cx, cy = self.bbox_to_pixel(bbox)
-            elements.append(SoMElement(
-                id=len(elements),
-                type=self._classify_type(el),
-                content=el.get("content", "").strip(),
-                bbox=tuple(bbox),
-                interactable=el.get("interactivity", False),
-                center_x=cx,
-                center_y=cy,
-            ))
-        elements.sort(key=lambda e: (e.center_y // 50, e.center_x))
-        # Re-assign IDs after sorting
-        for i, el in enumerate(elements):
-            el.id = i
-        return elements
+        return self.convert_table(omniparser_elements, max_elements).to_elements()
+
+    def convert_table(self, omniparser_elements: list, max_elements: int = 40) -> SoMTable:
+        """OmniParser 输出 → SoMTable（向量化中心点/DPI 换算 + 行分组排序）"""
+        raw = omniparser_elements[:max_elements]
+        n = len(raw)
+        if n == 0:
+            return SoMTable.empty()
+
+        # 单次遍历取出各列，再整体转为数组
+        bbox_col, inter_col, type_col, content_col = [], [], [], []
+        intern = sys.intern
+        for el in raw:
+            interactive = bool(el.get("interactivity", False))
+            bbox_col.append(el.get("bbox", (0, 0, 0, 0)))
+            inter_col.append(interactive)
+            type_col.append(_classify_code(el.get("type", ""), interactive))
+            content_col.append(intern((el.get("content") or "").strip()))
+        bboxes = np.array(bbox_col, dtype=np.float64).reshape(n, 4)
+        interactable = np.array(inter_col, dtype=bool)
+        type_codes = np.array(type_col, dtype=np.int8)
+        contents = content_col
+        centers = self.bboxes_to_pixels(bboxes)
+
+        # 从上到下（按 ROW_BAND 分行）、同行从左到右；lexsort 稳定，与原 list.sort 结果一致
+        order = np.lexsort((centers[:, 0], centers[:, 1] // ROW_BAND))
+        table = SoMTable(bboxes, centers, type_codes, interactable, contents).take(order)
+        table.ids = np.arange(n, dtype=np.int64)
+        return table
 
     def bbox_to_pixel(self, bbox: list) -> Tuple[int, int]:
         raw_x = (bbox[0] + bbox[2]) / 2 * self.screen_w
         raw_y = (bbox[1] + bbox[3]) / 2 * self.screen_h
         return int(raw_x / self.dpi_scale), int(raw_y / self.dpi_scale)
 
-    def format_for_claude(self, elements: List[SoMElement]) -> str:
+    def bboxes_to_pixels(self, bboxes: np.ndarray) -> np.ndarray:
+        """bbox_to_pixel 的向量化版本：(N, 4) → (N, 2) int64"""
+        raw_x = (bboxes[:, 0] + bboxes[:, 2]) / 2 * self.screen_w
+        raw_y = (bboxes[:, 1] + bboxes[:, 3]) / 2 * self.screen_h
+        centers = np.empty((len(bboxes), 2), dtype=np.int64)
+        centers[:, 0] = np.trunc(raw_x / self.dpi_scale)
+        centers[:, 1] = np.trunc(raw_y / self.dpi_scale)
+        return centers
+
+    def format_for_claude(self, elements, delta: bool = False) -> str:
+        """元素清单文本。delta=True（需开启跟踪）时只输出相对锚点清单的新增/变化/消失元素，
+        锚点文本见 self.anchor_text，本次模式见 self.last_format_mode（"full" / "delta"）"""
+        if isinstance(elements, SoMTable):
+            if delta and self.delta_enabled:
+                return self._format_delta(elements)
+            self.last_format_mode = "full"
+            return "\n".join(self._table_lines(elements, np.flatnonzero(elements.listable_mask())))
+        self.last_format_mode = "full"
         lines = []
         for el in elements:
             if not el.interactable and not el.content:
@@ -73,19 +412,70 @@ class SoMConverter:
             lines.append(f"  [{el.id}] {tag} {el.type} | {content_str} | {pos}")
         return "\n".join(lines)
 
+    def _table_lines(self, table: SoMTable, idx: np.ndarray, prefix: str = "  ") -> List[str]:
+        """表模式的清单行：向量化位置描述，不实例化 SoMElement"""
+        if len(idx) == 0:
+            return []
+        centers = table.centers[idx]
+        cols = np.digitize(centers[:, 0], (self.screen_w * 0.33, self.screen_w * 0.66), right=False)
+        rows = np.digitize(centers[:, 1], (self.screen_h * 0.33, self.screen_h * 0.66), right=False)
+        lines = []
+        for i, el_id, code, inter, r, c in zip(
+                idx.tolist(), table.ids[idx].tolist(), table.type_codes[idx].tolist(),
+                table.interactable[idx].tolist(), rows.tolist(), cols.tolist()):
+            content = table.contents[i]
+            tag = "\U0001f518" if inter else "\U0001f4dd"
+            content_str = f'"{content}"' if content else "(无文字)"
+            lines.append(f"{prefix}[{el_id}] {tag} {TYPE_NAMES[code]} | {content_str} | 屏幕{_THIRDS_V[r]}{_THIRDS_H[c]}")
+        return lines
+
+    def _format_delta(self, table: SoMTable) -> str:
+        """相对锚点清单的增量：+ 新增，~ 移动/文字变化，- 消失。
+
+        Claude 每次请求都是无状态的，所以增量以锚点（最近一次完整清单）为基准，
+        锚点文本随请求一起发送（作为可缓存的前缀），而不是以上一步为基准。
+        """
+        listable = table.take(table.listable_mask())
+        full_lines = self._table_lines(listable, np.arange(len(listable)))
+        anchor = self._anchor
+        if anchor is None or self._anchor_age >= self.delta_anchor_every:
+            return self._set_anchor(listable, full_lines)
+
+        pos = {el_id: k for k, el_id in enumerate(anchor.ids.tolist())}
+        added, changed = [], []
+        for i, el_id in enumerate(listable.ids.tolist()):
+            k = pos.pop(el_id, None)
+            if k is None:
+                added.append(i)
+            elif (listable.contents[i] != anchor.contents[k]
+                  or np.abs(listable.centers[i] - anchor.centers[k]).max() > self.tracker.move_px):
+                changed.append(i)
+        removed = sorted(pos)
+
+        n_delta = len(added) + len(changed) + len(removed)
+        # 变化太多时增量不比完整清单省，直接重新锚定
+        if n_delta > len(full_lines) * 0.6:
+            return self._set_anchor(listable, full_lines)
+
+        self._anchor_age += 1
+        self.last_format_mode = "delta"
+        if n_delta == 0:
+            return "  （与锚点清单相同）"
+        lines = self._table_lines(listable, np.array(added, dtype=np.int64), prefix="  + ")
+        lines += self._table_lines(listable, np.array(changed, dtype=np.int64), prefix="  ~ ")
+        if removed:
+            lines.append("  - 已消失: " + ", ".join(f"[{el_id}]" for el_id in removed))
+        return "\n".join(lines)
+
+    def _set_anchor(self, listable: SoMTable, full_lines: List[str]) -> str:
+        self._anchor = listable
+        self._anchor_age = 0
+        self.anchor_text = "\n".join(full_lines)
+        self.last_format_mode = "full"
+        return self.anchor_text
+
     def _classify_type(self, el: dict) -> str:
-        t = el.get("type", "").lower()
-        if "button" in t:
-            return "button"
-        if "input" in t or ("text" in t and el.get("interactivity")):
-            return "text_field"
-        if "link" in t:
-            return "link"
-        if "icon" in t or "image" in t:
-            return "icon"
-        if el.get("interactivity"):
-            return "control"
-        return "label"
+        return TYPE_NAMES[_classify_code(el.get("type", ""), bool(el.get("interactivity")))]
 
     def _describe_position(self, x: int, y: int) -> str:
         h = "左" if x < self.screen_w * 0.33 else "中" if x < self.screen_w * 0.66 else "右"
@@ -0,0 +1,92 @@
+"""单步时间预算 — STEP_TIMEOUT 按比例分给上下文截图、OmniParser、LLM、执行各阶段
+
+每进入一个阶段，从本步剩余时间里按该阶段与其后各阶段的份额比例划出它的预算（前面阶段省下的时间顺延给后面），
+返回带截止时间的 CancelToken 视图；组件按剩余预算设置 httpx 超时、决定是否重试、截短等待。
+阶段超出预算只记录，不中止任务。
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+from cancellation import CancelToken
+
+PHASES = ("context", "omniparser", "llm", "execute")
+
+
+def parse_shares(spec: str) -> Dict[str, float]:
+    """"context=0.1,llm=0.5" → {"context": 0.1, "llm": 0.5}"""
+    shares = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if not name:
+            continue
+        if name not in PHASES:
+            raise ValueError(f"Unknown step phase: {name} (expected one of {PHASES})")
+        shares[name] = float(value)
+    return shares
+
+
+class StepBudget:
+    def __init__(self, total: float, shares: Dict[str, float], cancel: CancelToken):
+        self.total = total
+        self.shares = shares
+        self.cancel = cancel
+        self.deadline = time.monotonic() + total
+        self.phases: Dict[str, dict] = {}
+        self._current: Optional[str] = None
+        self._started = 0.0
+
+    def enter(self, name: str) -> CancelToken:
+        """结束当前阶段并进入 name，返回其截止时间令牌"""
+        self.finish()
+        later = [p for p in self.shares if p not in self.phases or p == name]
+        share = self.shares.get(name, 0.0)
+        weight = sum(self.shares[p] for p in later) or 1.0
+        left = max(0.0, self.deadline - time.monotonic())
+        allotted = left * share / weight
+        # 同一阶段多次进入（例如确认后再次执行）时累加
+        record = self.phases.setdefault(name, {"allotted": 0.0, "elapsed": 0.0, "overrun": 0.0})
+        record["allotted"] = round(record["allotted"] + allotted, 3)
+        self._current, self._started = name, time.monotonic()
+        return self.cancel.scoped(allotted)
+
+    def finish(self):
+        """结束当前阶段，记录耗时和超出预算的部分"""
+        if self._current is None:
+            return
+        record = self.phases[self._current]
+        record["elapsed"] = round(record["elapsed"] + time.monotonic() - self._started, 3)
+        record["overrun"] = round(max(0.0, record["elapsed"] - record["allotted"]), 2)  # 10ms 以内不算超出
+        self._current = None
+
+    def summary(self) -> dict:
+        return {
+            "total": self.total,
+            "elapsed": round(sum(r["elapsed"] for r in self.phases.values()), 3),
+            "phases": self.phases,
+            "overruns": [name for name, r in self.phases.items() if r["overrun"] > 0],
+        }
+
+
+class BudgetStats:
+    """各阶段超出预算的累计统计（GET /step-budget 返回）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, dict] = {}
+
+    def record(self, budget: StepBudget):
+        with self._lock:
+            for name, r in budget.phases.items():
+                s = self._phases.setdefault(name, {"steps": 0, "overruns": 0, "overrun_seconds": 0.0,
+                                                   "max_overrun": 0.0})
+                s["steps"] += 1
+                if r["overrun"] > 0:
+                    s["overruns"] += 1
+                    s["overrun_seconds"] = round(s["overrun_seconds"] + r["overrun"], 3)
+                    s["max_overrun"] = max(s["max_overrun"], r["overrun"])
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._phases.items()}
@@ -0,0 +1,36 @@
+"""批量任务 — 依赖图校验和执行顺序
+
+POST /tasks/batch 提交一组带依赖（depends_on 引用同批任务的 key）的任务，整个批次作为一个队列条目，
+在同一桌面会话上按拓扑顺序连续执行；依赖未成功完成的任务标记为 skipped。
+"""
+from typing import Dict, List
+
+
+class BatchError(ValueError):
+    """批次定义无效（key 重复、依赖不存在、有环）"""
+
+
+def topo_order(deps: Dict[str, List[str]]) -> List[str]:
+    """按依赖拓扑排序（Kahn）；没有先后约束的任务保持提交顺序。
+
+    Args:
+        deps: key → 依赖的 key 列表（按提交顺序）
+    """
+    for key, required in deps.items():
+        for dep in required:
+            if dep not in deps:
+                raise BatchError(f"Task '{key}' depends on unknown task '{dep}'")
+            if dep == key:
+                raise BatchError(f"Task '{key}' depends on itself")
+    waiting = {key: set(required) for key, required in deps.items()}
+    order: List[str] = []
+    while waiting:
+        ready = [key for key, required in waiting.items() if not required]
+        if not ready:
+            raise BatchError(f"Dependency cycle among tasks: {sorted(waiting)}")
+        key = ready[0]  # dict 保持提交顺序
+        order.append(key)
+        del waiting[key]
+        for required in waiting.values():
+            required.discard(key)
+    return order
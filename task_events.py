@@ -0,0 +1,117 @@
+"""任务进度事件 — 每个任务一个环形缓冲区 + 订阅者队列，供 GET /task/{id}/events（SSE）推送
+
+事件由任务执行线程发布（publish 线程安全），订阅者在 API 事件循环里消费。
+每个任务的事件 id 从 1 递增；客户端断线重连带 Last-Event-ID，从缓冲区补发之后的事件。
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from task_store import FINISHED_STATUSES
+
+
+class _Channel:
+    def __init__(self, buffer_size: int):
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.next_id = 1
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 256, max_tasks: int = 100):
+        self.buffer_size = buffer_size
+        self.max_tasks = max_tasks
+        self._channels: "OrderedDict[str, _Channel]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _channel(self, task_id: str) -> _Channel:
+        ch = self._channels.get(task_id)
+        if ch is None:
+            ch = self._channels[task_id] = _Channel(self.buffer_size)
+            # 只保留最近 max_tasks 个任务的缓冲区（有订阅者的不删）
+            for tid in list(self._channels)[:max(0, len(self._channels) - self.max_tasks)]:
+                if not self._channels[tid].subscribers:
+                    del self._channels[tid]
+        return ch
+
+    def publish(self, task_id: str, event_type: str, **data) -> dict:
+        """发布事件（任意线程）"""
+        with self._lock:
+            ch = self._channel(task_id)
+            event = {"id": ch.next_id, "type": event_type, "task_id": task_id, "ts": time.time(), **data}
+            ch.next_id += 1
+            ch.buffer.append(event)
+            subscribers = list(ch.subscribers)
+        for loop, q in subscribers:
+            try:
+                loop.call_soon_threadsafe(q.put_nowait, event)
+            except RuntimeError:
+                pass  # 订阅者所在循环已关闭
+        return event
+
+    def replay(self, task_id: str, after_id: int = 0) -> List[dict]:
+        """缓冲区里 id 大于 after_id 的事件"""
+        with self._lock:
+            ch = self._channels.get(task_id)
+            return [e for e in ch.buffer if e["id"] > after_id] if ch else []
+
+    def subscribe(self, task_id: str) -> asyncio.Queue:
+        """在当前事件循环里订阅（必须在协程里调用）"""
+        q: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._channel(task_id).subscribers.append((asyncio.get_running_loop(), q))
+        return q
+
+    def unsubscribe(self, task_id: str, q: asyncio.Queue):
+        with self._lock:
+            ch = self._channels.get(task_id)
+            if ch:
+                ch.subscribers = [(l, s) for l, s in ch.subscribers if s is not q]
+
+    def subscriber_count(self) -> Dict[str, int]:
+        with self._lock:
+            return {tid: len(ch.subscribers) for tid, ch in self._channels.items() if ch.subscribers}
+
+    async def stream(self, task_id: str, last_id: int = 0, heartbeat: float = 15.0,
+                     final: Optional[dict] = None):
+        """SSE 文本流：先补发缓冲区，再推送新事件；任务结束事件发出后结束。
+
+        final 为已结束任务的状态字段：缓冲区里没有结束事件（例如服务重启后）时直接发一条 status 事件。
+        """
+        q = self.subscribe(task_id)
+        try:
+            for event in self.replay(task_id, last_id):
+                last_id = event["id"]
+                yield format_sse(event)
+                if _is_terminal(event):
+                    return
+            if final and not self.replay(task_id, last_id):
+                yield format_sse({"id": last_id, "type": "status", "task_id": task_id,
+                                  "ts": time.time(), **final})
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] <= last_id:
+                    continue  # 补发时已发送
+                last_id = event["id"]
+                yield format_sse(event)
+                if _is_terminal(event):
+                    return
+        finally:
+            self.unsubscribe(task_id, q)
+
+
+def _is_terminal(event: dict) -> bool:
+    return event["type"] == "status" and event.get("status") in FINISHED_STATUSES
+
+
+def format_sse(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
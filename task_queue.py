@@ -0,0 +1,123 @@
+"""任务队列 — 优先级 + 按客户端轮转，有界深度，给出排队位置和预计开始时间
+
+出队顺序：优先级高的先出；同一优先级内按客户端轮转（每轮每个客户端出一个），
+刚被服务过的客户端排到本轮最后，一个客户端的突发请求不会把其他客户端挤到后面，
+已告知的排队位置在出队后也不会被突发请求往后推。
+预计开始时间 = 当前任务剩余时间 + 前面每个任务的平均耗时（已完成任务耗时的指数滑动平均）。
+"""
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+class QueueFull(Exception):
+    """队列已满"""
+
+
+@dataclass
+class QueueEntry:
+    task_id: str
+    priority: int
+    client: str
+    seq: int
+    enqueued_at: float
+
+
+class TaskQueue:
+    def __init__(self, max_depth: int = 20, default_task_seconds: float = 60.0, ema_alpha: float = 0.3):
+        self.max_depth = max_depth
+        self.avg_task_seconds = default_task_seconds
+        self.ema_alpha = ema_alpha
+        self._entries: Dict[str, QueueEntry] = {}
+        self._seq = itertools.count()
+        # 轮转状态：(优先级, 客户端) -> 最近一次出队时的序号（与入队序号同一计数器）
+        self._served: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._entries
+
+    def push(self, task_id: str, priority: int = 0, client: Optional[str] = None) -> int:
+        """入队，返回排队位置（1 起）；队列满抛 QueueFull"""
+        with self._lock:
+            if len(self._entries) >= self.max_depth:
+                raise QueueFull(f"Task queue full ({self.max_depth})")
+            self._entries[task_id] = QueueEntry(task_id, priority, client or "default",
+                                                next(self._seq), time.time())
+            return self._order().index(task_id) + 1
+
+    def pop(self) -> Optional[str]:
+        """取出下一个要执行的任务，队列为空返回 None"""
+        with self._lock:
+            order = self._order()
+            if not order:
+                return None
+            entry = self._entries.pop(order[0])
+            self._served[(entry.priority, entry.client)] = next(self._seq)
+            self._forget_idle(entry)
+            return entry.task_id
+
+    def remove(self, task_id: str) -> bool:
+        """取消排队中的任务"""
+        with self._lock:
+            entry = self._entries.pop(task_id, None)
+            if entry is None:
+                return False
+            self._forget_idle(entry)
+            return True
+
+    def _forget_idle(self, entry: QueueEntry):
+        """客户端在该优先级已无排队任务时丢弃其轮转状态（再入队时按入队序号排，等同新客户端）"""
+        key = (entry.priority, entry.client)
+        if not any((e.priority, e.client) == key for e in self._entries.values()):
+            self._served.pop(key, None)
+
+    def position(self, task_id: str) -> Optional[int]:
+        with self._lock:
+            if task_id not in self._entries:
+                return None
+            return self._order().index(task_id) + 1
+
+    def record_duration(self, seconds: float):
+        """任务结束后更新平均耗时"""
+        self.avg_task_seconds += self.ema_alpha * (seconds - self.avg_task_seconds)
+
+    def estimate_start(self, position: int, running_elapsed: Optional[float] = None) -> float:
+        """第 position 位任务的预计开始时间（unix 时间戳）；running_elapsed 为当前任务已运行秒数，无任务运行为 None"""
+        wait = (position - 1) * self.avg_task_seconds
+        if running_elapsed is not None:
+            wait += max(0.0, self.avg_task_seconds - running_elapsed)
+        return time.time() + wait
+
+    def snapshot(self, running_elapsed: Optional[float] = None) -> List[dict]:
+        """按出队顺序列出排队任务"""
+        with self._lock:
+            entries = [self._entries[tid] for tid in self._order()]
+        return [{
+            "task_id": e.task_id,
+            "priority": e.priority,
+            "client": e.client,
+            "position": i + 1,
+            "enqueued_at": e.enqueued_at,
+            "estimated_start": self.estimate_start(i + 1, running_elapsed),
+        } for i, e in enumerate(entries)]
+
+    def _order(self) -> List[str]:
+        """出队顺序（调用方持锁）：优先级降序；同优先级内客户端轮转"""
+        by_priority: Dict[int, Dict[str, List[QueueEntry]]] = {}
+        for e in sorted(self._entries.values(), key=lambda e: e.seq):
+            by_priority.setdefault(e.priority, {}).setdefault(e.client, []).append(e)
+        order = []
+        for priority in sorted(by_priority, reverse=True):
+            # 客户端按轮转位置排序：最近出队时的序号，没出过队（或之后才入队）的按最早入队序号；
+            # 第 k 轮取每个客户端的第 k 个任务
+            clients = sorted(by_priority[priority].values(),
+                             key=lambda q: max(q[0].seq, self._served.get((priority, q[0].client), -1)))
+            for k in range(max(len(q) for q in clients)):
+                order.extend(q[k].task_id for q in clients if k < len(q))
+        return order
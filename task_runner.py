@@ -0,0 +1,97 @@
+"""任务执行线程 — 任务在专用线程的独立事件循环里跑，FastAPI 事件循环只处理请求
+
+execute_task 里仍有不少阻塞调用（恢复检查、截图编码、Win32 窗口操作、延迟模型落盘等），
+放在 API 的事件循环里会拖慢 GET /task/{id}。TaskRunner 把任务协程投递到自己的循环：
+- submit(key, coro)：从任意线程投递协程，返回 concurrent Future
+- wait(key)：在调用方事件循环里 await 任务结束
+- call_soon(fn, *args)：在执行循环里调用 fn（设置 asyncio.Event 等只能在所属循环里做的操作）
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Coroutine, Dict, Optional
+
+from loguru import logger
+
+
+class TaskRunner:
+    def __init__(self, name: str = "task-runner"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        logger.info(f"Task runner thread '{self.name}' started")
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(loop)
+            for t in pending:
+                t.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+    def stop(self, timeout: float = 5.0):
+        """停止执行循环（未完成的任务协程会被取消）"""
+        if not self.running:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        logger.info(f"Task runner thread '{self.name}' stopped")
+
+    def submit(self, key: str, coro: Coroutine) -> Future:
+        """投递任务协程（线程安全），同一 key 只保留最新的 Future"""
+        if not self.running:
+            self.start()
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        with self._lock:
+            self._futures[key] = future
+        future.add_done_callback(lambda f: self._forget(key, f))
+        return future
+
+    def _forget(self, key: str, future: Future):
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Task runner job {key} raised: {future.exception()}")
+
+    def is_active(self, key: str) -> bool:
+        with self._lock:
+            return key in self._futures
+
+    async def wait(self, key: str, timeout: Optional[float] = None):
+        """在调用方事件循环里等待任务协程结束（已结束则立即返回）"""
+        with self._lock:
+            future = self._futures.get(key)
+        if future is None:
+            return None
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def call_soon(self, fn: Callable, *args):
+        """在执行循环线程里调用 fn（线程安全）"""
+        if self.running:
+            self._loop.call_soon_threadsafe(fn, *args)
+        else:
+            fn(*args)
@@ -0,0 +1,206 @@
+"""任务持久化 — SQLite（WAL），历史步骤单独成行、按需加载，写入走后台线程
+
+- tasks 表：任务元数据，status / created_at 建索引
+- task_history 表：每步一行（JSON），查询单个任务时才加载
+- 写入：save_task / append_history 只把快照放进队列立即返回，后台线程批量提交，步骤循环不等磁盘
+- 保留策略：定期删除超过 retention_days 的已结束任务，并只保留最近 max_tasks 个
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+from loguru import logger
+
+# 持久化的任务字段（其余如 cancel / confirm_event 为运行时对象）
+TASK_FIELDS = ("task_id", "status", "prompt", "priority", "client_id", "max_steps", "steps",
+               "result", "error", "created_at", "started_at", "finished_at")
+FINISHED_STATUSES = ("completed", "failed", "error", "timeout", "stopped", "cancelled", "skipped")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    prompt TEXT,
+    priority INTEGER DEFAULT 0,
+    client_id TEXT,
+    max_steps INTEGER,
+    steps INTEGER DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+CREATE TABLE IF NOT EXISTS task_history (
+    task_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (task_id, seq)
+);
+"""
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class TaskStore:
+    def __init__(self, path: str, retention_days: float = 30, max_tasks: int = 10000,
+                 prune_interval: float = 600, batch_size: int = 200):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_tasks = max_tasks
+        self.prune_interval = prune_interval
+        self.batch_size = batch_size
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 读连接给 API 线程用；写连接只在后台线程里用
+        self._read = self._connect()
+        self._read.executescript(_SCHEMA)
+        self._read_lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self.stats = {"writes": 0, "batches": 0, "pruned": 0}
+        self._writer = threading.Thread(target=self._write_loop, name="task-store", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------- 写（非阻塞） ----------
+
+    def save_task(self, task: dict):
+        """保存任务元数据快照（放进写队列立即返回）"""
+        self._queue.put(("task", {k: task.get(k) for k in TASK_FIELDS}))
+
+    def append_history(self, task_id: str, seq: int, record: dict):
+        """保存一步历史（record 应为调用方不再修改的副本）"""
+        self._queue.put(("history", task_id, seq, record))
+
+    def flush(self, timeout: float = 10) -> bool:
+        """等待队列里已有的写入落盘"""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10):
+        self._queue.put((_CLOSE,))
+        self._writer.join(timeout)
+        with self._read_lock:
+            self._read.close()
+
+    def _write_loop(self):
+        conn = self._connect()
+        next_prune = time.time() + self.prune_interval
+        closing = False
+        while not closing:
+            try:
+                ops = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                ops = []
+            while ops and len(ops) < self.batch_size:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = []
+            try:
+                with conn:
+                    for op in ops:
+                        if op[0] is _FLUSH:
+                            waiters.append(op[1])
+                        elif op[0] is _CLOSE:
+                            closing = True
+                        else:
+                            self._apply(conn, op)
+                if ops:
+                    self.stats["batches"] += 1
+            except Exception as e:
+                logger.error(f"Task store write failed ({len(ops)} ops dropped): {e}")
+            for w in waiters:
+                w.set()
+            if time.time() >= next_prune:
+                next_prune = time.time() + self.prune_interval
+                self._prune(conn)
+        conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, op: tuple):
+        if op[0] == "task":
+            row = op[1]
+            cols = ", ".join(TASK_FIELDS)
+            marks = ", ".join("?" for _ in TASK_FIELDS)
+            updates = ", ".join(f"{c}=excluded.{c}" for c in TASK_FIELDS[1:])
+            conn.execute(f"INSERT INTO tasks ({cols}) VALUES ({marks}) "
+                         f"ON CONFLICT(task_id) DO UPDATE SET {updates}",
+                         [row[c] for c in TASK_FIELDS])
+        else:
+            _, task_id, seq, record = op
+            conn.execute("INSERT OR REPLACE INTO task_history (task_id, seq, data) VALUES (?, ?, ?)",
+                         (task_id, seq, json.dumps(record, ensure_ascii=False, default=str)))
+        self.stats["writes"] += 1
+
+    def _prune(self, conn: sqlite3.Connection):
+        """保留策略：删除过期的已结束任务，并只保留最近 max_tasks 个已结束任务"""
+        marks = ", ".join("?" for _ in FINISHED_STATUSES)
+        cutoff = time.time() - self.retention_days * 86400
+        try:
+            with conn:
+                ids = [r[0] for r in conn.execute(
+                    f"SELECT task_id FROM tasks WHERE status IN ({marks}) AND "
+                    f"(created_at < ? OR task_id NOT IN (SELECT task_id FROM tasks "
+                    f"WHERE status IN ({marks}) ORDER BY created_at DESC LIMIT ?))",
+                    (*FINISHED_STATUSES, cutoff, *FINISHED_STATUSES, self.max_tasks))]
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    q = ", ".join("?" for _ in chunk)
+                    conn.execute(f"DELETE FROM task_history WHERE task_id IN ({q})", chunk)
+                    conn.execute(f"DELETE FROM tasks WHERE task_id IN ({q})", chunk)
+            if ids:
+                self.stats["pruned"] += len(ids)
+                logger.info(f"Task store pruned {len(ids)} tasks")
+        except Exception as e:
+            logger.warning(f"Task store prune failed: {e}")
+
+    # ---------- 读 ----------
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """任务元数据（不含历史）"""
+        with self._read_lock:
+            row = self._read.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def history(self, task_id: str, offset: int = 0, limit: Optional[int] = None,
+                since_step: Optional[int] = None) -> List[dict]:
+        """按需加载任务历史（按 seq 顺序）；since_step 只取 step 大于它的记录"""
+        sql, args = "SELECT data FROM task_history WHERE task_id = ? AND seq >= ?", [task_id, offset]
+        if since_step is not None:
+            sql, args = sql + " AND json_extract(data, '$.step') > ?", args + [since_step]
+        with self._read_lock:
+            rows = self._read.execute(sql + " ORDER BY seq LIMIT ?",
+                                      (*args, -1 if limit is None else limit)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[dict]:
+        """最近的任务（按 created_at 倒序）"""
+        sql, args = "SELECT * FROM tasks", []
+        if status:
+            sql, args = sql + " WHERE status = ?", [status]
+        with self._read_lock:
+            rows = self._read.execute(sql + " ORDER BY created_at DESC LIMIT ?", (*args, limit)).fetchall()
+        return [dict(r) for r in rows]
+
+    def mark_interrupted(self) -> int:
+        """启动时把上次进程遗留的未结束任务标记为 error（进程重启后无法继续）"""
+        marks = ", ".join("?" for _ in FINISHED_STATUSES)
+        with self._read_lock, self._read:
+            cur = self._read.execute(
+                f"UPDATE tasks SET status = 'error', error = 'Interrupted by service restart', "
+                f"finished_at = ? WHERE status NOT IN ({marks})", (time.time(), *FINISHED_STATUSES))
+        return cur.rowcount
@@ -4,30 +4,23 @@
 """
 import argparse
 import time
-import subprocess
 import sys
 import pyautogui
 import pyperclip
 
+from clipboard_engine import get_clipboard
+
 pyautogui.FAILSAFE = False
 
 
 def copy_file_to_clipboard(file_path: str):
-    """用 PowerShell 把文件复制到系统剪贴板"""
-    ps_script = f'''
-Add-Type -AssemblyName System.Windows.Forms
-$file = New-Object System.Collections.Specialized.StringCollection
-$file.Add('{file_path}')
-[System.Windows.Forms.Clipboard]::SetFileDropList($file)
-'''
-    result = subprocess.run(
-        ['powershell', '-ExecutionPolicy', 'Bypass', '-Command', ps_script],
-        capture_output=True, text=True, timeout=10
-    )
-    if result.returncode != 0:
-        print(f"ERROR: Failed to copy file to clipboard: {result.stderr}")
+    """把文件（拖放列表）复制到系统剪贴板"""
+    try:
+        elapsed = get_clipboard().set_files(file_path)
+    except Exception as e:
+        print(f"ERROR: Failed to copy file to clipboard: {e}")
         sys.exit(1)
-    print(f"File copied to clipboard: {file_path}")
+    print(f"File copied to clipboard in {elapsed * 1000:.0f}ms: {file_path}")
 
 
 def main():
@@ -1,23 +1,9 @@
 """Win32 API 键盘操作 — Hyper-V VM 唯一可靠方案"""
-import time
-import ctypes
 import win32gui
 import win32con
-import win32api
-import win32process
 from loguru import logger
 
-# pyautogui key name → VK code
-VK_MAP = {
-    'ctrl': 0x11, 'shift': 0x10, 'alt': 0x12, 'win': 0x5B,
-    'enter': 0x0D, 'return': 0x0D, 'tab': 0x09,
-    'escape': 0x1B, 'esc': 0x1B,
-    'backspace': 0x08, 'delete': 0x2E, 'del': 0x2E,
-    'space': 0x20,
-    'up': 0x26, 'down': 0x28, 'left': 0x25, 'right': 0x27,
-    'home': 0x24, 'end': 0x23, 'pageup': 0x21, 'pagedown': 0x22,
-    **{f'f{i}': 0x6F + i for i in range(1, 13)},
-}
+from input_engine import VK_MAP, get_engine, key_to_vk
 
 
 def _resolve_hwnd(hwnd):
@@ -42,31 +28,14 @@ def send_hotkey(*keys, hwnd=None):
 
     vk_codes = []
     for k in keys:
-        vk = VK_MAP.get(k.lower())
-        if vk:
-            vk_codes.append(vk)
-        elif len(k) == 1:
-            vk_codes.append(ord(k.upper()))
-        else:
+        vk = key_to_vk(k)
+        if vk is None:
             logger.warning(f"Unknown key: {k}")
             return False
+        vk_codes.append(vk)
 
-    tid = win32api.GetCurrentThreadId()
-    ttid, _ = win32process.GetWindowThreadProcessId(hwnd)
-    ctypes.windll.user32.AttachThreadInput(tid, ttid, True)
-    try:
-        try:
-            win32gui.SetFocus(hwnd)
-        except Exception:
-            pass  # SetFocus 可能失败，继续发消息
-        time.sleep(0.05)
-        for vk in vk_codes:
-            win32api.PostMessage(hwnd, win32con.WM_KEYDOWN, vk, 0)
-        time.sleep(0.05)
-        for vk in reversed(vk_codes):
-            win32api.PostMessage(hwnd, win32con.WM_KEYUP, vk, 0)
-    finally:
-        ctypes.windll.user32.AttachThreadInput(tid, ttid, False)
+    # 输入引擎一次 attach、批量投递（间隔见 config.INPUT_*_MS）
+    get_engine().send_keys(vk_codes, hwnd=hwnd)
 
     logger.info(f"win32 hotkey: {keys} -> {[hex(v) for v in vk_codes]}")
     return True
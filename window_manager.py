@@ -1,11 +1,17 @@
 """Windows 窗口管理模块"""
-import win32gui
-import win32process
-import win32con
 import psutil
 from loguru import logger
 from typing import Optional
 
+try:
+    import win32gui
+    import win32process
+    import win32con
+except ImportError:  # 非 Windows：只能用 HeadlessWindowManager
+    win32gui = win32process = win32con = None
+
+import config
+
 
 APP_MAPPING = {
     "wechat.exe": "wechat",
@@ -112,3 +118,38 @@ class WindowManager:
         except Exception as e:
             logger.error(f"Failed to maximize window: {e}")
             return False
+
+
+class HeadlessWindowManager:
+    """无桌面回放用：固定的前台窗口（应用名取 CUA_REPLAY_APP），窗口操作全部为空操作"""
+
+    def __init__(self, app: Optional[str] = None):
+        self.app = app or config.REPLAY_APP
+        process_name = next((p for p, a in APP_MAPPING.items() if a == self.app), "unknown")
+        self._window = {
+            "hwnd": 0, "title": f"replay:{self.app}", "process_name": process_name, "pid": 0,
+            "rect": (0, 0, config.SCREEN_WIDTH, config.SCREEN_HEIGHT),
+        }
+
+    def get_active_window(self) -> dict:
+        return dict(self._window)
+
+    def detect_app(self) -> str:
+        return self.app
+
+    def activate_window(self, title_pattern: str) -> bool:
+        return False
+
+    def list_windows(self) -> list:
+        w = self._window
+        return [{"hwnd": w["hwnd"], "title": w["title"], "process_name": w["process_name"]}]
+
+    def maximize_window(self, hwnd: Optional[int] = None) -> bool:
+        return True
+
+
+def create_window_manager():
+    """回放模式或没有 pywin32 时返回 HeadlessWindowManager"""
+    if config.HEADLESS or win32gui is None:
+        return HeadlessWindowManager()
+    return WindowManager()